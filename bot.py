@@ -4,37 +4,56 @@
 # ============================================
 
 import os
+import asyncio
 import logging
 from threading import Thread
 from datetime import time as dt_time
-from flask import Flask
+from flask import Flask, request
 
 from telegram import Update
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ExtBot,
     filters
 )
+from telegram.request import HTTPXRequest
 
 # Конфигурация
-from config import BOT_TOKEN, TIMEZONE_OFFSET, ADMIN_IDS, TIMEZONE
+from config import BOT_TOKEN, ADMIN_IDS, TIMEZONE, DB_POOL_MAX, LEADERBOARD_PAGE_SIZE
 
 # Database
 from database.db_manager import (
     init_connection_pool,
     test_connection,
-    get_table_stats,
+    get_cached_table_stats,
+    refresh_table_stats,
+    get_pool_stats,
     close_connection_pool
 )
+from database.query_stats import get_top_queries
+from database.geo_buffer import init_geo_buffer, close_geo_buffer, flush_geolocation, get_geo_buffer_stats
+from database.invalidation import init_invalidation_bus, close_invalidation_bus, get_invalidation_stats
+from database.resilience import DatabaseUnavailable, classify_error, get_resilience_stats
+from database.workloads import get_workload_stats
+from database.prepared import get_prepared_stats
+from database.rank_ladder import reload_rank_ladder
+from database.leaderboard import reload_leaderboard, get_leaderboard_stats
 from database.models import (
-    init_database,
+    init_database, get_auth_cache_stats, get_profile_cache_stats, get_active_event_cache_stats
+)
+from database.async_db import (
+    init_async_pool, close_async_pool, run_sync, unit_of_work_async, checkpoint_unit_of_work,
+)
+from database.unit_of_work import current_unit_of_work
+from database.async_models import (
     is_user_registered,
     create_user,
     is_user_admin,
-    get_user_profile,
-    get_all_users_status
+    promote_admins
 )
 
 # Handlers
@@ -68,14 +87,16 @@ from handlers.admin_panel import (
 
 # Features
 from features.ranks import (
-    get_leaderboard,
+    get_leaderboard_page,
     get_user_rank_info
 )
 from features.export_data import export_presence_data
 from features.posts_scheduler import check_scheduled_posts
+from features.broadcast import get_broadcast_stats
 
 # Utils
-from utils.keyboards import get_main_keyboard
+from utils.keyboards import get_main_keyboard, get_leaderboard_keyboard
+from utils.view_cache import get_view_cache_stats
 
 # Логирование
 logging.basicConfig(
@@ -94,15 +115,34 @@ def home():
 @app.route('/health')
 def health():
     try:
-        stats = get_table_stats()
+        stats = get_cached_table_stats()
         return {
             "status": "ok",
             "version": "2.0",
-            "database": stats
+            "database": stats,
+            "pool": get_pool_stats(),
+            "geo_buffer": get_geo_buffer_stats(),
+            "resilience": get_resilience_stats(),
+            "workloads": get_workload_stats(),
+            "prepared": get_prepared_stats(),
+            "auth_cache": get_auth_cache_stats(),
+            "profile_cache": get_profile_cache_stats(),
+            "active_event_cache": get_active_event_cache_stats(),
+            "view_cache": get_view_cache_stats(),
+            "leaderboard": get_leaderboard_stats(),
+            "invalidation": get_invalidation_stats(),
+            "broadcast": get_broadcast_stats()
         }
     except:
         return {"status": "ok", "version": "2.0"}
 
+@app.route('/stats/queries')
+def query_stats():
+    """Топ-N самых дорогих SQL-запросов (?limit=10&order=total_ms|p95_ms|count)"""
+    limit = request.args.get('limit', default=10, type=int)
+    order_by = request.args.get('order', default='total_ms')
+    return {"queries": get_top_queries(limit=limit, order_by=order_by)}
+
 def run_flask():
     """Запуск Flask в отдельном потоке"""
     port = int(os.getenv("PORT", 10000))
@@ -118,25 +158,21 @@ async def start(update: Update, context):
     user = update.effective_user
     user_id = user.id
     
-    create_user(user_id, user.username or "Без username", user.full_name)
+    await create_user(user_id, user.username or "Без username", user.full_name)
 
     
     # Гарантируем, что админ сразу видит админ‑кнопку, даже если его записи не было при старте бота
     from config import ADMIN_IDS
     if user_id in ADMIN_IDS:
         try:
-            from database.db_manager import get_db
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute('UPDATE users SET is_admin = TRUE WHERE user_id = %s', (user_id,))
-                conn.commit()
+            await promote_admins([user_id])
         except Exception:
             pass
             
-    if not is_user_registered(user_id):
+    if not await is_user_registered(user_id):
         return await start_registration(update, context)
     
-    is_admin = is_user_admin(user_id)
+    is_admin = await is_user_admin(user_id)
     
     welcome_text = f"""
 👋 Добро пожаловать, {user.first_name}!
@@ -187,7 +223,7 @@ async def help_command(update: Update, context):
 
 async def status_command(update: Update, context):
     """Команда /status - показать статус"""
-    if not is_user_registered(update.effective_user.id):
+    if not await is_user_registered(update.effective_user.id):
         await update.message.reply_text("❌ Сначала пройдите регистрацию. Отправьте /start")
         return
     
@@ -196,42 +232,62 @@ async def status_command(update: Update, context):
 
 async def leaderboard_command(update: Update, context):
     """Команда /leaderboard - таблица лидеров"""
-    if not is_user_registered(update.effective_user.id):
+    if not await is_user_registered(update.effective_user.id):
         await update.message.reply_text("❌ Сначала пройдите регистрацию. Отправьте /start")
         return
     
-    leaders = get_leaderboard(limit=10)
+    text, keyboard = await render_leaderboard(update.effective_user.id, page=0)
+    if keyboard is None:
+        keyboard = get_main_keyboard()
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+
+async def handle_leaderboard_callback(update: Update, context):
+    """Листание таблицы лидеров (leaderboard_page_N)"""
+    query = update.callback_query
+    await query.answer()
+    page = int(query.data.replace('leaderboard_page_', ''))
+    text, keyboard = await render_leaderboard(query.from_user.id, page)
+    await query.edit_message_text(text, reply_markup=keyboard)
+
+
+async def render_leaderboard(user_id: int, page: int):
+    """Текст страницы таблицы лидеров и клавиатура листания"""
+    board = await run_sync(
+        get_leaderboard_page, page * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE, user_id
+    )
+    leaders = board['leaders']
     
     if not leaders:
-        await update.message.reply_text(
-            "📊 Таблица лидеров пока пуста.",
-            reply_markup=get_main_keyboard()
-        )
-        return
+        return "📊 Таблица лидеров пока пуста.", None
     
+    pages = (board['total'] + LEADERBOARD_PAGE_SIZE - 1) // LEADERBOARD_PAGE_SIZE
     text = "🏆 **Таблица лидеров**\n\n"
-    text += "Топ-10 участников по рангам:\n\n"
+    text += f"Места {leaders[0]['position']}–{leaders[-1]['position']} из {board['total']}:\n\n"
     
-    for i, leader in enumerate(leaders, 1):
+    for leader in leaders:
         emoji = leader['emoji']
         name = f"{leader['first_name']} {leader['last_name']}"
         checkins = leader['total_checkins']
         rank = leader['current_rank']
         
-        text += f"{i}. {emoji} {name}\n"
+        text += f"{leader['position']}. {emoji} {name}\n"
         text += f"   └ {rank} • {checkins} отметок\n\n"
     
-    await update.message.reply_text(text, reply_markup=get_main_keyboard())
+    if board['position']:
+        text += f"📍 Ваше место: {board['position']} из {board['total']}"
+    
+    return text, get_leaderboard_keyboard(page, pages)
 
 
 async def rank_info_command(update: Update, context):
     """Команда /rank - информация о ранге"""
-    if not is_user_registered(update.effective_user.id):
+    if not await is_user_registered(update.effective_user.id):
         await update.message.reply_text("❌ Сначала пройдите регистрацию. Отправьте /start")
         return
     
     user_id = update.effective_user.id
-    rank_info = get_user_rank_info(user_id)
+    rank_info = await run_sync(get_user_rank_info, user_id)
     
     if not rank_info:
         await update.message.reply_text("❌ Ошибка получения информации о ранге")
@@ -263,11 +319,11 @@ async def handle_text_commands(update: Update, context):
     text = update.message.text
     user_id = update.effective_user.id
     
-    if not is_user_registered(user_id):
+    if not await is_user_registered(user_id):
         await update.message.reply_text("❌ Сначала пройдите регистрацию. Отправьте /start")
         return
     
-    is_admin = is_user_admin(user_id)
+    is_admin = await is_user_admin(user_id)
     
     if text == "📍 Я в кампусе":
         await request_checkin_location(update, context)
@@ -341,6 +397,10 @@ async def handle_callbacks(update: Update, context):
             event_id = int(data.replace('export_event_', ''))
             await export_presence_data(update, context, 'event', event_id)
 
+    # Таблица лидеров
+    elif data.startswith('leaderboard_page_'):
+        await handle_leaderboard_callback(update, context)
+
     # Конкурс фото (пользовательские действия)
     elif data.startswith('contest_'):
         from handlers.contests import handle_contest_callback
@@ -349,19 +409,116 @@ async def handle_callbacks(update: Update, context):
     else:
         await query.answer()
 
+# ============================================
+# ЕДИНИЦА РАБОТЫ НА АПДЕЙТ
+# ============================================
+
+class CampusBot(ExtBot):
+    """Бот, фиксирующий транзакцию апдейта перед каждым запросом к Telegram"""
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        # «✅» уходит только после COMMIT, а соединение не ждёт ответа Telegram
+        if endpoint != 'getUpdates':
+            await checkpoint_unit_of_work()
+        return await super()._do_post(endpoint, data, **kwargs)
+
+
+class CampusApplication(Application):
+    """Application, обрабатывающий каждый апдейт в одной единице работы БД"""
+
+    async def process_update(self, update: object) -> None:
+        # Один checkout и один COMMIT на DB-фазу апдейта вместо отдельных на каждый
+        # запрос; перед ответом пользователю транзакция фиксируется (CampusBot)
+        async with unit_of_work_async():
+            await super().process_update(update)
+
+    async def process_error(self, update, error, job=None, coroutine=None) -> bool:
+        # PTB ловит исключения handler'а сам — помечаем транзакцию на откат
+        uow = current_unit_of_work.get()
+        if uow is not None:
+            uow.failed = True
+        return await super().process_error(update, error, job=job, coroutine=coroutine)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Апдейты разных чатов — параллельно, одного чата — строго по порядку
+
+    ConversationHandler (регистрация, админка) хранит состояние по
+    (чат, пользователь): два быстрых апдейта одного пользователя не
+    должны обрабатываться одновременно
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}  # чат -> [asyncio.Lock, апдейтов в работе и в очереди]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = _update_order_key(update)
+        if key is None:
+            await coroutine
+            return
+        entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # Lock отдаётся ожидающим в порядке очереди — порядке получения апдейтов
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def _update_order_key(update):
+    """Чат (или пользователь) апдейта; None — порядок не важен"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return ('chat', update.effective_chat.id)
+    if update.effective_user is not None:
+        return ('user', update.effective_user.id)
+    return None
+
 # ============================================
 # ГЛОБАЛЬНЫЕ ОБРАБОТЧИКИ ОШИБОК
 # ============================================
 
 async def global_error_handler(update: Update, context):
-    logger.error("Unhandled error in handler", exc_info=context.error)
+    # Недоступность БД — ожидаемая ситуация: без трейсбека, с понятным текстом
+    db_down = isinstance(context.error, DatabaseUnavailable) or classify_error(context.error) is not None
+    if db_down:
+        logger.warning(f"БД недоступна при обработке апдейта: {context.error}")
+        text = "⏳ Сервис временно недоступен. Попробуйте через минуту."
+    else:
+        logger.error("Unhandled error in handler", exc_info=context.error)
+        text = "❌ Произошла ошибка. Мы уже разбираемся."
     try:
         if update and getattr(update, 'effective_chat', None):
             # Мягкое уведомление админу/пользователю (без падения приложения)
-            await context.bot.send_message(chat_id=update.effective_chat.id, text="❌ Произошла ошибка. Мы уже разбираемся.")
+            await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
     except Exception:
         pass
 
+async def post_stop(application: Application):
+    """
+    Остановка приложения (SIGTERM/SIGINT при деплое): записать буфер геолокации
+
+    Вызывается PTB после обработки последних апдейтов, пока пул соединений жив
+    """
+    try:
+        written = await run_sync(flush_geolocation)
+        if written:
+            logger.info(f"✅ Буфер геолокации: записано {written} точек при остановке")
+    except Exception as e:
+        logger.error(f"❌ Не удалось записать буфер геолокации при остановке: {e}")
+
 # ============================================
 # ГЛАВНАЯ ФУНКЦИЯ
 # ============================================
@@ -380,10 +537,16 @@ def main():
     
     # Инициализация пула соединений
     try:
-        init_connection_pool(minconn=2, maxconn=10)
+        init_connection_pool()
     except Exception as e:
         logger.warning(f"⚠️ Пул соединений не создан: {e}")
     
+    # Асинхронный слой БД: запросы из handlers выполняются вне event loop
+    init_async_pool(max_workers=DB_POOL_MAX)
+    
+    # Пакетная запись геолокации
+    init_geo_buffer()
+    
     # Тестирование подключения к БД
     if not test_connection():
         logger.error("❌ Не удалось подключиться к БД!")
@@ -394,11 +557,20 @@ def main():
         init_database()
         logger.info("✅ База данных инициализирована")
         
-        # Статистика таблиц
-        stats = get_table_stats()
-        logger.info("📊 Статистика БД:")
+        # Сброс кэшей по записям других процессов бота (LISTEN/NOTIFY) —
+        # до загрузки кэшей, чтобы не пропустить записи между загрузкой и LISTEN
+        init_invalidation_bus()
+        
+        # Статистика таблиц (оценка по каталогу, заодно прогревает кэш /health)
+        stats = refresh_table_stats()
+        logger.info("📊 Статистика БД (оценка):")
         for table, count in stats.items():
-            logger.info(f"   {table}: {count} записей")
+            logger.info(f"   {table}: ~{count} записей")
+        
+        # Лестница рангов в память: check-in и экраны статуса не читают ranks
+        reload_rank_ladder()
+        # Таблица лидеров в память: дальше обновляется check-in'ами
+        reload_leaderboard()
         
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации БД: {e}")
@@ -406,16 +578,9 @@ def main():
     
     # Добавляем админов
     if ADMIN_IDS:
-        from database.db_manager import get_db
+        from database import models
         try:
-            with get_db() as conn:
-                cursor = conn.cursor()
-                for admin_id in ADMIN_IDS:
-                    cursor.execute(
-                        'UPDATE users SET is_admin = TRUE WHERE user_id = %s',
-                        (admin_id,)
-                    )
-                conn.commit()
+            models.promote_admins(ADMIN_IDS)
             logger.info(f"✅ Добавлено {len(ADMIN_IDS)} администраторов")
         except Exception as e:
             logger.warning(f"⚠️ Ошибка добавления админов: {e}")
@@ -426,9 +591,20 @@ def main():
     logger.info("✅ Flask запущен для Render")
     
      # Telegram Application (with job queue enabled)
+    # Апдейты разных чатов обрабатываются параллельно: медленный запрос одного
+    # пользователя не задерживает остальных; апдейты одного чата — по порядку
     application = (
         Application.builder()
-        .token(BOT_TOKEN)
+        .application_class(CampusApplication)
+        # Те же размеры пулов HTTP, что ApplicationBuilder задаёт по умолчанию
+        .bot(CampusBot(
+            BOT_TOKEN,
+            request=HTTPXRequest(connection_pool_size=256),
+            get_updates_request=HTTPXRequest(),
+        ))
+        # 256 одновременных апдейтов — как у concurrent_updates(True)
+        .concurrent_updates(PerChatUpdateProcessor(256))
+        .post_stop(post_stop)
         .build()
     )
     
@@ -446,7 +622,7 @@ def main():
     
         # План: автоматическое завершение фотоконкурса ежедневно в заданное время
         try:
-            from config import CONTEST_END_TIME, TIMEZONE
+            from config import CONTEST_END_TIME
             hh, mm = [int(x) for x in CONTEST_END_TIME.split(':')]
             application.job_queue.run_daily(
                 end_photo_contest,
@@ -506,12 +682,16 @@ def main():
                 logger.error(f"run_polling упал: {e}. Перезапуск через 5с")
                 time.sleep(5)
                 continue
-            # Если вышли без исключения — это, скорее всего, внешняя остановка. Дадим шанс авто‑рестарту.
-            logger.warning("run_polling завершился. Перезапуск через 5с")
-            time.sleep(5)
+            # Без исключения run_polling возвращается только по сигналу остановки
+            # (SIGTERM при деплое, SIGINT) — выходим и закрываем ресурсы в finally
+            logger.info("⏹ run_polling остановлен сигналом")
+            break
     except KeyboardInterrupt:
         logger.info("⏹ Остановка бота...")
     finally:
+        close_async_pool()
+        close_geo_buffer()
+        close_invalidation_bus()
         close_connection_pool()
         logger.info("👋 Бот остановлен")
 
@@ -9,6 +9,111 @@ from datetime import timezone, timedelta
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# sqlite:///путь.db или sqlite:///:memory: — встроенный SQLite вместо PostgreSQL
+# (локальные тесты и бенчмарки без сервера БД)
+DB_BACKEND = 'sqlite' if (DATABASE_URL or '').startswith('sqlite:') else 'postgres'
+
+# Пул соединений с БД
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))              # ожидание свободного соединения, сек
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # макс. время жизни соединения, сек
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))           # простой до закрытия лишних, сек
+DB_POOL_PREPING_AFTER = float(os.getenv("DB_POOL_PREPING_AFTER", "30"))  # проверка соединения после простоя, сек
+
+# Классы нагрузки: statement_timeout и lock_timeout (мс, 0 — без ограничения)
+# и квота одновременных соединений (0 — без квоты).
+# interactive — значения по умолчанию для каждого соединения пула.
+DB_WORKLOADS = {
+    'interactive': {
+        'statement_timeout': int(os.getenv("DB_INTERACTIVE_STATEMENT_TIMEOUT", "5000")),
+        'lock_timeout': int(os.getenv("DB_INTERACTIVE_LOCK_TIMEOUT", "2000")),
+        'quota': 0,
+    },
+    'admin': {
+        'statement_timeout': int(os.getenv("DB_ADMIN_STATEMENT_TIMEOUT", "15000")),
+        'lock_timeout': int(os.getenv("DB_ADMIN_LOCK_TIMEOUT", "5000")),
+        'quota': int(os.getenv("DB_ADMIN_QUOTA", "3")),
+    },
+    'export': {
+        'statement_timeout': int(os.getenv("DB_EXPORT_STATEMENT_TIMEOUT", "120000")),
+        'lock_timeout': int(os.getenv("DB_EXPORT_LOCK_TIMEOUT", "5000")),
+        'quota': int(os.getenv("DB_EXPORT_QUOTA", "2")),
+    },
+    'maintenance': {
+        'statement_timeout': int(os.getenv("DB_MAINTENANCE_STATEMENT_TIMEOUT", "0")),
+        'lock_timeout': int(os.getenv("DB_MAINTENANCE_LOCK_TIMEOUT", "30000")),
+        'quota': int(os.getenv("DB_MAINTENANCE_QUOTA", "1")),
+    },
+}
+
+# Реплика для чтения (списки, экспорт). Пусто — всё читается с primary.
+# Для локальной проверки можно указать тот же DSN, что и DATABASE_URL.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "30"))          # допустимое отставание реплики, сек
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "10"))  # как часто проверять отставание, сек
+
+# Повторы при временных ошибках БД и автоматический выключатель (circuit breaker)
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))               # всего попыток для идемпотентных операций
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.1"))       # базовая задержка, сек (экспонента + jitter)
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "2"))           # максимальная задержка, сек
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))         # ошибок соединения подряд до размыкания
+DB_BREAKER_RESET_TIMEOUT = float(os.getenv("DB_BREAKER_RESET_TIMEOUT", "15"))  # пауза до пробного запроса, сек
+
+# Статистика таблиц для /health (оценка по каталогу, кэш)
+TABLE_STATS_TTL = float(os.getenv("TABLE_STATS_TTL", "60"))                # время жизни кэша, сек
+
+# Статистика запросов
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))           # порог журнала медленных запросов, мс (0 — выкл.)
+DB_QUERY_STATS_SAMPLES = int(os.getenv("DB_QUERY_STATS_SAMPLES", "1024"))  # замеров на запрос для перцентилей
+
+# Кэш регистрации/прав пользователя (is_user_registered / is_user_admin)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))                  # время жизни записи, сек (0 — выкл.)
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))       # предел числа пользователей в кэше
+
+# Кэш профилей пользователей (write-through: записи бота сразу обновляют кэш)
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))            # время жизни записи, сек (0 — выкл.)
+PROFILE_CACHE_MAX_SIZE = int(os.getenv("PROFILE_CACHE_MAX_SIZE", "5000"))    # предел числа профилей в кэше
+
+# Кэш активного мероприятия: живёт до ближайшего начала/окончания мероприятия,
+# но не дольше ACTIVE_EVENT_CACHE_MAX_TTL сек (0 — выкл.)
+ACTIVE_EVENT_CACHE_MAX_TTL = float(os.getenv("ACTIVE_EVENT_CACHE_MAX_TTL", "3600"))
+
+# Кэш готового текста «Кто в кампусе» / «Все участники» (сбрасывается событиями;
+# TTL ограничивает устаревание индикаторов, зависящих от времени), сек (0 — выкл.)
+VIEW_CACHE_TTL = float(os.getenv("VIEW_CACHE_TTL", "60"))
+VIEW_CACHE_WAIT_TIMEOUT = float(os.getenv("VIEW_CACHE_WAIT_TIMEOUT", "2"))  # ожидание чужой пересборки со слотом БД, сек (затем — своя)
+
+# Шина инвалидации кэшей между процессами (PostgreSQL LISTEN/NOTIFY, 0 — выкл.)
+INVALIDATION_BUS = os.getenv("INVALIDATION_BUS", "1") == "1"
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "campus_invalidate")
+
+# Лестница рангов в памяти (перечитывается не реже, сек)
+RANK_LADDER_TTL = float(os.getenv("RANK_LADDER_TTL", "600"))
+
+# Таблица лидеров в памяти (см. database/leaderboard.py)
+LEADERBOARD_RELOAD_INTERVAL = float(os.getenv("LEADERBOARD_RELOAD_INTERVAL", "600"))  # полная перезагрузка не реже, сек
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", "10"))                  # участников на странице /leaderboard
+
+# Серверные prepared statements для горячих запросов (0 — выкл., например за PgBouncer в transaction mode)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+
+# Буфер записи геолокации (пакетная вставка вместо INSERT + COMMIT на сообщение)
+GEO_BUFFER_MAX_ROWS = int(os.getenv("GEO_BUFFER_MAX_ROWS", "500"))            # сброс при накоплении строк
+GEO_BUFFER_FLUSH_INTERVAL = float(os.getenv("GEO_BUFFER_FLUSH_INTERVAL", "2"))  # сброс не реже, сек
+GEO_BUFFER_MAX_PENDING = int(os.getenv("GEO_BUFFER_MAX_PENDING", "20000"))    # предел очереди (старые строки отбрасываются)
+
+# Массовые рассылки (см. features/broadcast.py); лимиты Telegram — ~30 сообщ./с на бота, 1 сообщ./с в чат
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))                 # одновременных запросов к Telegram
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))                             # сообщений в секунду на все рассылки (0 — без лимита)
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1"))            # пауза между сообщениями в один чат, сек
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))                  # повторов при flood control и сетевых ошибках
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))    # как часто сообщать о ходе рассылки, сек
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "50"))                   # получателей в пачке очереди доставки (повтор после сбоя — не больше пачки)
+BROADCAST_DELIVERY_ATTEMPTS = int(os.getenv("BROADCAST_DELIVERY_ATTEMPTS", "3"))      # попыток на получателя при временных ошибках
+BROADCAST_LEASE = float(os.getenv("BROADCAST_LEASE", "300"))                          # сек, на сколько пачка закрепляется за процессом (после падения её заберёт другой)
+BROADCAST_RETRY_DELAY = float(os.getenv("BROADCAST_RETRY_DELAY", "30"))               # сек до повтора после временной ошибки (удваивается с каждой попыткой)
+
 # Координаты кампуса
 CAMPUS_LATITUDE = float(os.getenv("CAMPUS_LATITUDE", "43.2220"))
 CAMPUS_LONGITUDE = float(os.getenv("CAMPUS_LONGITUDE", "76.8512"))
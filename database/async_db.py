@@ -0,0 +1,233 @@
+# ============================================
+# FILE: database/async_db.py
+# ============================================
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from database.db_manager import get_db, execute_query, new_unit_of_work
+from database.query_stats import current_caller, caller_label
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Пул потоков для блокирующих вызовов psycopg2 (event loop никогда не ждёт сеть)
+db_executor = None
+max_db_workers = 10
+
+# Ограничение одновременных checkout'ов из корутин (не больше, чем соединений в пуле)
+_checkout_slots = None
+_checkout_loop = None
+
+
+def init_async_pool(max_workers=10):
+    """Инициализация асинхронного слоя БД (пул потоков + лимит соединений)"""
+    global db_executor, max_db_workers
+    if db_executor is not None:
+        return
+    max_db_workers = max_workers
+    db_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+    logger.info(f"✅ Асинхронный пул БД создан (workers={max_workers})")
+
+
+def close_async_pool():
+    """Остановить пул потоков асинхронного слоя"""
+    global db_executor
+    if db_executor is not None:
+        db_executor.shutdown(wait=True)
+        db_executor = None
+        logger.info("✅ Асинхронный пул БД закрыт")
+
+
+def _get_checkout_slots():
+    """Семафор checkout'ов для текущего event loop"""
+    global _checkout_slots, _checkout_loop
+    loop = asyncio.get_running_loop()
+    # run_polling может пересоздать loop после перезапуска — семафор привязан к loop
+    if _checkout_slots is None or _checkout_loop is not loop:
+        _checkout_slots = asyncio.Semaphore(max_db_workers)
+        _checkout_loop = loop
+    return _checkout_slots
+
+
+@asynccontextmanager
+async def _checkout_slot():
+    """
+    Слот checkout'а на время работы с БД
+
+    Единица работы держит один слот до своего завершения (берётся при
+    первом обращении к БД), вложенные вызовы внутри неё слот не занимают
+    """
+    uow = current_unit_of_work.get()
+    if uow is None:
+        async with _get_checkout_slots():
+            yield
+        return
+
+    async with uow.slot_lock:
+        if not uow.holds_slot:
+            await _get_checkout_slots().acquire()
+            uow.holds_slot = True
+    yield
+
+
+def holds_checkout_slot() -> bool:
+    """Текущая единица работы уже держит слот checkout'а"""
+    uow = current_unit_of_work.get()
+    return uow is not None and uow.holds_slot
+
+
+def checkout_slots_exhausted() -> bool:
+    """Свободных слотов checkout'а нет (следующий checkout будет ждать)"""
+    return _get_checkout_slots().locked()
+
+
+async def _in_executor(func, *args, **kwargs):
+    """Выполнить блокирующий вызов в пуле потоков с текущим contextvars-контекстом"""
+    if db_executor is None:
+        init_async_pool()
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    # В потоке пула стек handler'а уже не виден — запоминаем вызывающего заранее
+    if current_caller.get() is None:
+        ctx.run(current_caller.set, caller_label())
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(db_executor, call)
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Выполнить синхронную функцию, работающую с БД, не блокируя event loop
+
+    Используется для хелперов database.models / features, которые сами
+    берут соединение через get_db()
+    """
+    async with _checkout_slot():
+        return await _in_executor(func, *args, **kwargs)
+
+
+class AsyncCursor:
+    """Асинхронная обёртка над курсором psycopg2"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, query, params=None):
+        await _in_executor(self._cursor.execute, query, params)
+
+    async def executemany(self, query, params_seq):
+        await _in_executor(self._cursor.executemany, query, params_seq)
+
+    # Клиентский курсор psycopg2 буферизует весь результат в execute(),
+    # поэтому выборка строк не ходит в сеть и не требует пула потоков
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class AsyncConnection:
+    """Асинхронная обёртка над соединением psycopg2"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return AsyncCursor(self._conn.cursor())
+
+    async def commit(self):
+        await _in_executor(self._conn.commit)
+
+    async def rollback(self):
+        await _in_executor(self._conn.rollback)
+
+
+@asynccontextmanager
+async def get_db_async(readonly: bool = False, workload: str = None):
+    """
+    Асинхронный контекстный менеджер для работы с PostgreSQL
+
+    Берёт соединение через get_db() в пуле потоков; все запросы
+    выполняются вне event loop. readonly=True — чтение с реплики,
+    workload — класс нагрузки (см. database/workloads.py)
+    """
+    async with _checkout_slot():
+        db_context = get_db(readonly=readonly, workload=workload)
+        conn = await _in_executor(db_context.__enter__)
+        try:
+            yield AsyncConnection(conn)
+        except BaseException as e:
+            suppressed = await _in_executor(db_context.__exit__, type(e), e, e.__traceback__)
+            if not suppressed:
+                raise
+        else:
+            await _in_executor(db_context.__exit__, None, None, None)
+
+
+@asynccontextmanager
+async def unit_of_work_async():
+    """
+    Асинхронная единица работы (одна на апдейт)
+
+    Все get_db_async() / run_sync() внутри используют одно соединение
+    и одну транзакцию; COMMIT — один раз в конце, при исключении — ROLLBACK
+    """
+    if current_unit_of_work.get() is not None:
+        yield current_unit_of_work.get()
+        return
+
+    uow = new_unit_of_work()
+    uow.slot_lock = asyncio.Lock()
+    token = current_unit_of_work.set(uow)
+    success = False
+    try:
+        yield uow
+        success = True
+    finally:
+        current_unit_of_work.reset(token)
+        try:
+            if uow.conn is not None:
+                await _in_executor(uow.finish, success)
+        finally:
+            if uow.holds_slot:
+                _get_checkout_slots().release()
+            logger.debug(f"Единица работы: {uow.stats()}")
+
+
+async def checkpoint_unit_of_work():
+    """
+    Закоммитить текущую единицу работы до запроса к Telegram
+
+    Соединение и слот checkout'а возвращаются на время сетевого запроса;
+    следующее обращение к БД в том же апдейте возьмёт их заново
+    (см. UnitOfWork.checkpoint)
+    """
+    uow = current_unit_of_work.get()
+    if uow is None or (uow.conn is None and not uow.holds_slot):
+        return
+    async with uow.slot_lock:
+        try:
+            if uow.conn is not None:
+                await _in_executor(uow.checkpoint)
+        finally:
+            # Соединение возвращено (в том числе после ошибки COMMIT) — слот тоже
+            if uow.conn is None and uow.holds_slot:
+                uow.holds_slot = False
+                _get_checkout_slots().release()
+
+
+async def execute_query_async(query: str, params: tuple = None, fetch_one=False, fetch_all=False):
+    """Асинхронная версия execute_query"""
+    return await run_sync(
+        execute_query, query, params,
+        fetch_one=fetch_one, fetch_all=fetch_all
+    )
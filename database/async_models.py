@@ -0,0 +1,96 @@
+# ============================================
+# FILE: database/async_models.py
+# ============================================
+# Асинхронные версии хелперов database.models для handlers.
+# Синхронные функции остаются для Flask-потока и скриптов.
+
+from database import models
+from database.async_db import run_sync
+
+
+async def get_user_auth(user_id: int) -> dict:
+    """Регистрация и права пользователя (попадание в кэш — без перехода в пул потоков)"""
+    auth = models.peek_user_auth(user_id)
+    if auth is None:
+        auth = await run_sync(models.get_user_auth, user_id)
+    return auth
+
+
+async def is_user_registered(user_id: int) -> bool:
+    """Проверка, зарегистрирован ли пользователь"""
+    return (await get_user_auth(user_id))['is_registered']
+
+
+async def is_user_admin(user_id: int) -> bool:
+    """Проверка, является ли пользователь администратором"""
+    return (await get_user_auth(user_id))['is_admin']
+
+
+async def get_user_profile(user_id: int) -> dict:
+    """Получить профиль пользователя (попадание в кэш — без перехода в пул потоков)"""
+    profile = models.peek_user_profile(user_id)
+    if profile is None:
+        profile = await run_sync(models.get_user_profile, user_id)
+    return profile
+
+
+async def toggle_geo_consent(user_id: int) -> dict:
+    """Переключить согласие на геолокацию; возвращает обновлённый профиль"""
+    return await run_sync(models.toggle_geo_consent, user_id)
+
+
+async def get_open_presence(user_id: int, date) -> dict:
+    """Открытая сессия пользователя за день (или None)"""
+    return await run_sync(models.get_open_presence, user_id, date)
+
+
+async def get_user_dashboard(user_id: int, today, with_stats: bool = False) -> dict:
+    """Всё для экранов «Мой статус» и «Моя статистика» одним запросом"""
+    return await run_sync(models.get_user_dashboard, user_id, today, with_stats)
+
+
+async def create_user(user_id: int, username: str, full_name: str):
+    """Создать запись пользователя при первом старте"""
+    return await run_sync(models.create_user, user_id, username, full_name)
+
+
+async def complete_registration(user_id: int, data: dict):
+    """Завершить регистрацию пользователя"""
+    return await run_sync(models.complete_registration, user_id, data)
+
+
+async def delete_account(user_id: int):
+    """Удалить аккаунт: снять регистрацию и стереть личные данные"""
+    return await run_sync(models.delete_account, user_id)
+
+
+async def promote_admins(user_ids):
+    """Выдать права администратора (ADMIN_IDS) существующим пользователям"""
+    return await run_sync(models.promote_admins, user_ids)
+
+
+async def increment_checkins(user_id: int):
+    """Увеличить счётчик чекинов и обновить ранг"""
+    return await run_sync(models.increment_checkins, user_id)
+
+
+async def check_in_user(user_id: int, check_in_time, date, latitude: float, longitude: float,
+                        distance: float, is_near: bool) -> dict:
+    """Атомарный check-in одним запросом"""
+    return await run_sync(
+        models.check_in_user, user_id, check_in_time, date,
+        latitude, longitude, distance, is_near
+    )
+
+
+async def get_all_users_status(readonly: bool = True):
+    """Получить всех пользователей с индикатором присутствия"""
+    return await run_sync(models.get_all_users_status, readonly)
+
+
+async def get_active_event():
+    """Получить активное мероприятие (попадание в кэш — без перехода в пул потоков)"""
+    cached = models.active_event_cache.peek('active')
+    if cached is not None:
+        return cached['event']
+    return await run_sync(models.get_active_event)
@@ -0,0 +1,114 @@
+# ============================================
+# FILE: database/cache.py
+# ============================================
+# Ограниченный по размеру кэш в памяти процесса: LRU + время жизни записи.
+#
+# Заполнение после чтения из БД защищено «эпохой»: если между началом
+# чтения и set() кэш инвалидировали, устаревшее значение не сохраняется.
+
+import threading
+import time
+from collections import OrderedDict
+
+from database.invalidation import publish
+from database.unit_of_work import current_unit_of_work
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с TTL и счётчиками попаданий"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def epoch(self) -> int:
+        """Метка для set(): взять до чтения из БД"""
+        return self._epoch
+
+    def get(self, key):
+        """Значение или None (промах / истёк срок)"""
+        return self._lookup(key, count_miss=True)
+
+    def peek(self, key):
+        """Как get(), но промах не учитывается (за ним последует get())"""
+        return self._lookup(key, count_miss=False)
+
+    def _lookup(self, key, count_miss):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def set(self, key, value, epoch: int = None, ttl: float = None):
+        """
+        Сохранить значение (не сохраняется, если с epoch была инвалидация)
+
+        ttl — срок жизни этой записи, не больше ttl кэша
+        """
+        if not self.max_size or self.ttl <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(max(ttl, 0.0), self.ttl)
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Удалить ключи (без аргументов — весь кэш)"""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            if keys:
+                for key in keys:
+                    self._data.pop(key, None)
+            else:
+                self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+def invalidate_on_finish(cache: TTLCache, *keys, kind: str = None):
+    """
+    Сбросить ключи сейчас и ещё раз по завершении текущей единицы работы
+
+    До COMMIT параллельные апдейты читают старое значение и могут
+    положить его обратно в кэш. kind — тип сообщения шины инвалидации
+    для других процессов (см. database/invalidation.py)
+    """
+    cache.invalidate(*keys)
+    if kind is not None:
+        publish(kind, *keys)
+    uow = current_unit_of_work.get()
+    if uow is not None:
+        uow.on_finish(lambda: cache.invalidate(*keys))
@@ -3,65 +3,459 @@
 # ============================================
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
 from contextlib import contextmanager
+import threading
 import logging
+import time
 import os
 
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_PREPING_AFTER,
+    DATABASE_REPLICA_URL,
+    DB_REPLICA_MAX_LAG,
+    DB_REPLICA_LAG_CHECK_INTERVAL,
+    TABLE_STATS_TTL,
+)
+from database import sqlite_backend
+from database.dialect import is_sqlite
+from database.pool import ConnectionPool, PoolTimeout
+from database.unit_of_work import UnitOfWork, current_unit_of_work
+from database.resilience import breaker
+from database.workloads import (
+    WORKLOADS,
+    get_workload,
+    INTERACTIVE,
+    MAINTENANCE,
+    same_budget,
+    connection_options,
+    is_default,
+    apply_workload,
+    reset_workload,
+    is_budget_exceeded,
+    record_cancelled,
+)
 
 logger = logging.getLogger(__name__)
 
 # Пул соединений для оптимизации
 connection_pool = None
+_pool_lock = threading.Lock()
 
-def init_connection_pool(minconn=1, maxconn=10):
+# Пул реплики для чтения (None — реплика не настроена или недоступна)
+replica_pool = None
+
+# Состояние реплики: последнее измеренное отставание и время проверки
+_replica_state = {'checked_at': 0.0, 'lag': None, 'fresh': True, 'down_until': 0.0}
+
+# Сколько ждать соединение реплики, прежде чем читать с primary, сек
+_REPLICA_CHECKOUT_TIMEOUT = 1.0
+
+STATS_TABLES = [
+    'users', 'presence', 'geolocation', 'events',
+    'posts', 'photo_contest', 'knowledge_base', 'ranks'
+]
+
+# Кэш оценок размера таблиц для /health (обновляется в фоновом потоке)
+_table_stats_cache = {'stats': {}, 'updated_at': None, 'refreshing': False}
+_table_stats_lock = threading.Lock()
+
+# Выданные соединения primary: id(conn) -> (пул, слот квоты класса нагрузки)
+_checked_out = {}
+
+def init_connection_pool(minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
     """Инициализация пула соединений"""
     global connection_pool
+    with _pool_lock:
+        if connection_pool is not None:
+            return connection_pool
+        if is_sqlite():
+            return _init_sqlite_pool(minconn, maxconn)
+        try:
+            connection_pool = ConnectionPool(
+                DATABASE_URL,
+                minconn=minconn,
+                maxconn=maxconn,
+                timeout=DB_POOL_TIMEOUT,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                max_idle=DB_POOL_MAX_IDLE,
+                preping_after=DB_POOL_PREPING_AFTER,
+                connect_kwargs={'options': connection_options()}
+            )
+            logger.info(f"✅ Пул соединений создан (min={minconn}, max={maxconn})")
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания пула соединений: {e}")
+            connection_pool = None
+        _init_replica_pool(minconn, maxconn)
+        return connection_pool
+
+
+def _init_sqlite_pool(minconn, maxconn):
+    """Пул соединений встроенного SQLite (под _pool_lock); реплики нет"""
+    global connection_pool
+    if sqlite_backend.database_path(DATABASE_URL) is None:
+        # Общая in-memory база блокируется целиком: пишет одно соединение
+        minconn, maxconn = min(minconn, 1), 1
     try:
-        connection_pool = SimpleConnectionPool(
-            minconn,
-            maxconn,
-            DATABASE_URL
+        connection_pool = ConnectionPool(
+            DATABASE_URL,
+            minconn=minconn,
+            maxconn=maxconn,
+            timeout=DB_POOL_TIMEOUT,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=DB_POOL_MAX_IDLE,
+            preping_after=DB_POOL_PREPING_AFTER,
+            connect=sqlite_backend.connect
         )
-        logger.info(f"✅ Пул соединений создан (min={minconn}, max={maxconn})")
+        logger.info(f"✅ Пул соединений SQLite создан ({DATABASE_URL}, max={maxconn})")
     except Exception as e:
-        logger.error(f"❌ Ошибка создания пула соединений: {e}")
+        logger.error(f"❌ Ошибка создания пула SQLite: {e}")
         connection_pool = None
+    return connection_pool
+
+
+def _init_replica_pool(minconn, maxconn):
+    """Пул реплики (если задан DATABASE_REPLICA_URL); ошибка не фатальна"""
+    global replica_pool
+    if not DATABASE_REPLICA_URL or replica_pool is not None:
+        return
+    try:
+        replica_pool = ConnectionPool(
+            DATABASE_REPLICA_URL,
+            minconn=min(1, minconn),
+            maxconn=maxconn,
+            timeout=DB_POOL_TIMEOUT,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=DB_POOL_MAX_IDLE,
+            preping_after=DB_POOL_PREPING_AFTER,
+            connect_kwargs={'options': connection_options()}
+        )
+        logger.info(f"✅ Пул реплики создан (max={maxconn})")
+    except Exception as e:
+        logger.warning(f"⚠️ Реплика недоступна, чтение идёт с primary: {e}")
+        replica_pool = None
+
+
+def _get_pool():
+    """Текущий пул; создаётся лениво, если init_connection_pool ещё не вызывался"""
+    # Пока БД недоступна, запросы сразу получают DatabaseUnavailable
+    breaker.before_call()
+    pool = connection_pool
+    if pool is None:
+        pool = init_connection_pool()
+    if pool is None:
+        raise psycopg2.OperationalError("Пул соединений недоступен")
+    return pool
+
+
+def _acquire_quota(wl):
+    """Занять слот квоты класса нагрузки (None — у класса нет квоты)"""
+    slots = wl.quota_slots
+    if slots is not None and not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        wl.count('quota_timeouts')
+        raise PoolTimeout(f"Квота класса нагрузки '{wl.name}' ({wl.quota}) исчерпана")
+    return slots
+
+
+def _acquire_primary(wl=None, quota=True):
+    """
+    Соединение primary с учётом квоты класса нагрузки (по умолчанию — текущего)
+
+    quota=False — для единицы работы: квоту занимает каждый её блок get_db()
+    """
+    wl = wl or get_workload()
+    pool = _get_pool()
+    slots = _acquire_quota(wl) if quota else None
+    try:
+        conn = pool.getconn()
+    except Exception:
+        if slots is not None:
+            slots.release()
+        raise
+    wl.count('checkouts')
+    _checked_out[id(conn)] = (pool, slots)
+    return conn
+
+
+def _release_primary(conn, close=False):
+    """Вернуть соединение primary в пул и освободить слот квоты"""
+    pool, slots = _checked_out.pop(id(conn))
+    try:
+        pool.putconn(conn, close=close)
+    finally:
+        if slots is not None:
+            slots.release()
+
+
+def _aborts_transaction(error) -> bool:
+    """Ошибка сервера или соединения: транзакция PostgreSQL уже прервана"""
+    return isinstance(error, (psycopg2.DatabaseError, psycopg2.InterfaceError))
+
+
+def _release_quota(uow, wl, slots):
+    """Освободить слот квоты, занятый блоком get_db() единицы работы"""
+    if slots is not None:
+        uow.quotas.discard(wl.name)
+        slots.release()
+
+
+def _switch_workload(uow, conn, wl):
+    """
+    Выставить таймауты класса wl в транзакции единицы работы (SET LOCAL)
+
+    Returns:
+        Класс, действовавший до блока (для восстановления при выходе)
+    """
+    previous = WORKLOADS[uow.workload or INTERACTIVE]
+    if not same_budget(previous, wl):
+        apply_workload(conn, wl, local=True)
+    uow.workload = wl.name
+    return previous
+
+
+def new_unit_of_work() -> UnitOfWork:
+    """Новая единица работы на соединениях primary"""
+    return UnitOfWork(lambda: _acquire_primary(quota=False), _release_primary)
+
+
+def _replica_is_fresh(conn) -> bool:
+    """Отставание реплики в пределах DB_REPLICA_MAX_LAG (проверка не чаще интервала)"""
+    now = time.monotonic()
+    if now - _replica_state['checked_at'] < DB_REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_state['fresh']
+
+    cursor = conn.cursor()
+    # На primary (или stand-in без репликации) функция вернёт NULL — отставания нет
+    cursor.execute('''
+        SELECT EXTRACT(EPOCH FROM (NOW() - pg_last_xact_replay_timestamp())) AS lag
+        WHERE pg_is_in_recovery()
+    ''')
+    row = cursor.fetchone()
+    conn.rollback()
+
+    lag = float(row['lag']) if row and row['lag'] is not None else 0.0
+    fresh = lag <= DB_REPLICA_MAX_LAG
+    if not fresh and _replica_state['fresh']:
+        logger.warning(f"⚠️ Реплика отстаёт на {lag:.0f}с — чтение переключено на primary")
+    _replica_state.update(checked_at=now, lag=lag, fresh=fresh)
+    return fresh
+
+
+def _checkout_replica():
+    """(пул, соединение) реплики или None, если читать нужно с primary"""
+    pool = replica_pool
+    if pool is None or time.monotonic() < _replica_state['down_until']:
+        return None
+
+    conn = None
+    try:
+        conn = pool.getconn(timeout=_REPLICA_CHECKOUT_TIMEOUT)
+        if _replica_is_fresh(conn):
+            return pool, conn
+        pool.putconn(conn)
+    except Exception as e:
+        # Реплика недоступна — не пробуем до следующей проверки
+        _replica_state['down_until'] = time.monotonic() + DB_REPLICA_LAG_CHECK_INTERVAL
+        logger.warning(f"⚠️ Ошибка реплики, чтение с primary: {e}")
+        if conn is not None:
+            pool.putconn(conn, close=True)
+    return None
 
 
 @contextmanager
-def get_db():
+def get_db(readonly: bool = False, workload: str = None):
     """
     Контекстный менеджер для работы с PostgreSQL
-    Использует пул соединений если доступен, иначе создаёт новое соединение
+    Берёт соединение из потокобезопасного пула (с ожиданием при исчерпании).
+    Внутри unit_of_work() присоединяется к её соединению и транзакции.
+
+    readonly=True — только чтение: запрос уходит на реплику, если она
+    настроена и не отстаёт больше DB_REPLICA_MAX_LAG, иначе на primary.
+
+    workload — класс нагрузки (database/workloads.py); по умолчанию
+    берётся из контекста вызывающего кода
     """
-    conn = None
-    from_pool = False
+    wl = get_workload(workload)
+    uow = current_unit_of_work.get()
+    checkout = None
+    if readonly and (uow is None or uow.conn is None):
+        # Единица работы, уже взявшая соединение, читает свои же записи
+        checkout = _checkout_replica()
+    if uow is not None and checkout is None:
+        # Квота — на время блока, а не всего checkout'а единицы работы;
+        # вложенный блок того же класса слот второй раз не занимает
+        slots = None
+        try:
+            if wl.name not in uow.quotas:
+                slots = _acquire_quota(wl)
+                if slots is not None:
+                    uow.quotas.add(wl.name)
+            conn = uow.connection()
+            previous = _switch_workload(uow, conn, wl)
+        except Exception as e:
+            _release_quota(uow, wl, slots)
+            breaker.record_failure(e)
+            if _aborts_transaction(e):
+                try:
+                    uow.rollback()
+                except Exception:
+                    pass
+            raise
+        except BaseException:
+            _release_quota(uow, wl, slots)
+            breaker.release_probe()
+            raise
+        uow.open_blocks += 1
+        restore = True
+        completed = False
+        try:
+            yield conn
+            completed = True
+        except Exception as e:
+            breaker.record_failure(e)
+            if is_budget_exceeded(e):
+                record_cancelled(wl, e)
+            if _aborts_transaction(e):
+                # Транзакция единицы работы уже в ошибке — откатываем её целиком
+                # (вместе с SET LOCAL: восстанавливать таймауты не нужно)
+                restore = False
+                try:
+                    uow.rollback()
+                except Exception:
+                    pass
+                logger.error(f"Ошибка БД: {e}")
+            # Ошибка не из БД транзакцию не прерывает: если её поймали, записи
+            # апдейта остаются; непойманная откатит всё через process_error
+            raise
+        except BaseException:
+            # Отмена (CancelledError) — исхода пробного запроса нет
+            breaker.release_probe()
+            raise
+        finally:
+            uow.open_blocks -= 1
+            try:
+                if restore:
+                    # Таймауты класса блока не должны действовать на следующие запросы
+                    _switch_workload(uow, conn, previous)
+            except Exception as e:
+                logger.error(f"Ошибка восстановления класса нагрузки: {e}")
+                try:
+                    uow.rollback()
+                except Exception:
+                    pass
+                if completed:
+                    raise
+            finally:
+                _release_quota(uow, wl, slots)
+        breaker.record_success()
+        return
+
+    if checkout is not None:
+        pool, conn = checkout
+        release = lambda c, close: pool.putconn(c, close=close)
+    else:
+        try:
+            conn = _acquire_primary(wl)
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        except BaseException:
+            breaker.release_probe()
+            raise
+        release = _release_primary
+    broken = False
+    applied = False
     
     try:
-        if connection_pool:
-            conn = connection_pool.getconn()
-            from_pool = True
-        else:
-            conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-        
-        conn.cursor_factory = RealDictCursor
+        if not is_default(wl):
+            # На уровне сессии, чтобы пережить commit() внутри блока; сбрасывается ниже
+            apply_workload(conn, wl, local=False)
+            conn.commit()
+            applied = True
         yield conn
+        if checkout is None:
+            breaker.record_success()
         
     except Exception as e:
-        if conn:
-            conn.rollback()
+        if checkout is None:
+            breaker.record_failure(e)
+        if is_budget_exceeded(e):
+            record_cancelled(wl, e)
+        # Потерянное соединение не возвращаем в пул
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) or conn.closed
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
         logger.error(f"Ошибка БД: {e}")
         raise
+    
+    except BaseException:
+        if checkout is None:
+            breaker.release_probe()
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        raise
         
     finally:
-        if conn:
-            if from_pool and connection_pool:
-                connection_pool.putconn(conn)
-            else:
-                conn.close()
+        if applied and not broken and not conn.closed:
+            try:
+                conn.rollback()
+                reset_workload(conn)
+                conn.commit()
+            except Exception:
+                broken = True
+        release(conn, broken)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Единица работы: одно соединение и один COMMIT на все get_db() внутри
+
+    Вложенный вызов присоединяется к уже активной единице работы.
+    При исключении вся транзакция откатывается
+    """
+    if current_unit_of_work.get() is not None:
+        yield current_unit_of_work.get()
+        return
+
+    uow = new_unit_of_work()
+    token = current_unit_of_work.set(uow)
+    try:
+        yield uow
+    except BaseException:
+        current_unit_of_work.reset(token)
+        uow.finish(success=False)
+        raise
+    else:
+        current_unit_of_work.reset(token)
+        uow.finish(success=True)
+    finally:
+        logger.debug(f"Единица работы: {uow.stats()}")
+
+
+def get_pool_stats() -> dict:
+    """Статистика пула соединений (занято, ожидающие, время ожидания)"""
+    if connection_pool is None:
+        return {}
+    stats = connection_pool.stats()
+    if replica_pool is not None:
+        stats['replica'] = dict(
+            replica_pool.stats(),
+            lag=_replica_state['lag'],
+            fresh=_replica_state['fresh']
+        )
+    return stats
 
 
 def test_connection():
@@ -69,9 +463,12 @@ def test_connection():
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT version();')
+            if is_sqlite():
+                cursor.execute('SELECT \'SQLite \' || sqlite_version() AS version')
+            else:
+                cursor.execute('SELECT version();')
             version = cursor.fetchone()
-            logger.info(f"✅ Подключение к PostgreSQL успешно")
+            logger.info(f"✅ Подключение к БД успешно")
             logger.info(f"Версия: {version['version']}")
             return True
     except Exception as e:
@@ -111,18 +508,13 @@ def execute_query(query: str, params: tuple = None, fetch_one=False, fetch_all=F
 
 
 def get_table_stats():
-    """Получить статистику по таблицам БД"""
-    tables = [
-        'users', 'presence', 'geolocation', 'events',
-        'posts', 'photo_contest', 'knowledge_base', 'ranks'
-    ]
-    
+    """Получить точную статистику по таблицам БД (COUNT(*) — только для админских задач)"""
     stats = {}
     
     with get_db() as conn:
         cursor = conn.cursor()
         
-        for table in tables:
+        for table in STATS_TABLES:
             try:
                 cursor.execute(f'SELECT COUNT(*) as count FROM {table}')
                 result = cursor.fetchone()
@@ -134,11 +526,76 @@ def get_table_stats():
     return stats
 
 
+def get_table_estimates() -> dict:
+    """
+    Оценка числа строк по каталогу (pg_class.reltuples) одним запросом
+
+    Таблицы не сканируются; для ещё не проанализированных таблиц
+    (reltuples = -1) берётся n_live_tup из pg_stat_user_tables.
+    В SQLite каталожных оценок нет — точный COUNT(*)
+    """
+    if is_sqlite():
+        return get_table_stats()
+
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.relname AS table_name,
+                   CASE WHEN c.reltuples >= 0 THEN c.reltuples::BIGINT
+                        ELSE COALESCE(s.n_live_tup, 0)
+                   END AS estimate
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE n.nspname = current_schema()
+              AND c.relkind = 'r'
+              AND c.relname = ANY(%s)
+        ''', (STATS_TABLES,))
+        estimates = {row['table_name']: row['estimate'] for row in cursor.fetchall()}
+    
+    return {table: estimates.get(table, -1) for table in STATS_TABLES}
+
+
+def refresh_table_stats() -> dict:
+    """Обновить кэш оценок таблиц (синхронно)"""
+    try:
+        stats = get_table_estimates()
+        with _table_stats_lock:
+            _table_stats_cache['stats'] = stats
+        return stats
+    except Exception as e:
+        logger.error(f"Ошибка обновления статистики таблиц: {e}")
+        return _table_stats_cache['stats']
+    finally:
+        with _table_stats_lock:
+            _table_stats_cache['updated_at'] = time.monotonic()
+            _table_stats_cache['refreshing'] = False
+
+
+def get_cached_table_stats() -> dict:
+    """
+    Статистика таблиц из кэша (без обращения к БД)
+
+    Если кэш старше TABLE_STATS_TTL, обновление запускается в фоновом
+    потоке — запрос /health его не ждёт
+    """
+    with _table_stats_lock:
+        updated_at = _table_stats_cache['updated_at']
+        stale = updated_at is None or time.monotonic() - updated_at > TABLE_STATS_TTL
+        if stale and not _table_stats_cache['refreshing']:
+            _table_stats_cache['refreshing'] = True
+            threading.Thread(target=refresh_table_stats, name='table-stats', daemon=True).start()
+        return dict(_table_stats_cache['stats'])
+
+
 def vacuum_database():
     """Выполнить VACUUM для оптимизации БД"""
+    if is_sqlite():
+        return _vacuum_sqlite()
     try:
         conn = psycopg2.connect(DATABASE_URL)
         conn.set_isolation_level(0)  # Autocommit mode
+        apply_workload(conn, get_workload(MAINTENANCE), local=False)
         cursor = conn.cursor()
         cursor.execute('VACUUM ANALYZE;')
         cursor.close()
@@ -150,6 +607,21 @@ def vacuum_database():
         return False
 
 
+def _vacuum_sqlite():
+    try:
+        with get_db(workload=MAINTENANCE) as conn:
+            # VACUUM не выполняется внутри транзакции
+            conn.commit()
+            cursor = conn.cursor()
+            cursor.execute('VACUUM')
+            cursor.execute('ANALYZE')
+        logger.info("✅ VACUUM выполнен успешно")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка VACUUM: {e}")
+        return False
+
+
 def backup_table(table_name: str) -> list:
     """
     Создать резервную копию таблицы (в памяти)
@@ -158,7 +630,7 @@ def backup_table(table_name: str) -> list:
         Список всех строк таблицы
     """
     try:
-        with get_db() as conn:
+        with get_db(workload=MAINTENANCE) as conn:
             cursor = conn.cursor()
             cursor.execute(f'SELECT * FROM {table_name}')
             data = cursor.fetchall()
@@ -171,7 +643,10 @@ def backup_table(table_name: str) -> list:
 
 def close_connection_pool():
     """Закрыть пул соединений"""
-    global connection_pool
+    global connection_pool, replica_pool
+    if replica_pool:
+        replica_pool.closeall()
+        replica_pool = None
     if connection_pool:
         connection_pool.closeall()
         logger.info("✅ Пул соединений закрыт")
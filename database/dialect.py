@@ -0,0 +1,57 @@
+# ============================================
+# FILE: database/dialect.py
+# ============================================
+# Фрагменты SQL, которые пишутся по-разному в PostgreSQL и SQLite.
+# Всё остальное в запросах бота — общее подмножество обоих диалектов.
+
+from config import DB_BACKEND
+
+
+def is_sqlite() -> bool:
+    """Бот работает на встроенном SQLite (DATABASE_URL=sqlite:///...)"""
+    return DB_BACKEND == 'sqlite'
+
+
+def latest_row_join(alias: str, table: str, columns: str, where: str, order_by: str) -> str:
+    """
+    LEFT JOIN последней строки table по order_by для каждой строки внешнего запроса
+
+    PostgreSQL — LATERAL; в SQLite его нет, там соединение по id,
+    найденному коррелированным подзапросом (поиск по rowid).
+    Колонки берутся через alias.колонка
+    """
+    if is_sqlite():
+        return (
+            f"LEFT JOIN {table} {alias} ON {alias}.id = ("
+            f"SELECT id FROM {table} WHERE {where} ORDER BY {order_by} LIMIT 1)"
+        )
+    return (
+        f"LEFT JOIN LATERAL (SELECT {columns} FROM {table} "
+        f"WHERE {where} ORDER BY {order_by} LIMIT 1) {alias} ON TRUE"
+    )
+
+
+def seconds_between(start: str, end: str) -> str:
+    """Выражение: число секунд между двумя TIMESTAMP"""
+    if is_sqlite():
+        return f"(julianday({end}) - julianday({start})) * 86400"
+    return f"EXTRACT(EPOCH FROM ({end} - {start}))"
+
+
+def hours_between(start: str, end: str) -> str:
+    """Выражение: число часов между двумя TIMESTAMP"""
+    if is_sqlite():
+        return f"(julianday({end}) - julianday({start})) * 24"
+    return f"EXTRACT(EPOCH FROM ({end} - {start})) / 3600"
+
+
+def skip_locked() -> str:
+    """
+    Хвост SELECT: заблокировать выбранные строки, пропуская занятые
+    другими транзакциями (очереди задач)
+
+    В SQLite пишет один процесс и блокировки строк нет — пустая строка
+    """
+    if is_sqlite():
+        return ''
+    return 'FOR UPDATE SKIP LOCKED'
@@ -0,0 +1,243 @@
+# ============================================
+# FILE: database/geo_buffer.py
+# ============================================
+# Буфер записи геолокации: строки копятся в памяти и вставляются
+# пакетом (multi-row INSERT) по размеру или по таймеру.
+#
+# Чтения «последней геолокации» накладывают на результат запроса ещё
+# не записанную точку пользователя (apply_pending_geolocation), поэтому
+# только что присланная геолокация видна сразу. Время точки — naive UTC,
+# как его возвращает БД (колонка TIMESTAMP, UTC-сессия): до и после
+# сброса чтения видят одно и то же значение.
+
+import contextvars
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from config import GEO_BUFFER_MAX_ROWS, GEO_BUFFER_FLUSH_INTERVAL, GEO_BUFFER_MAX_PENDING
+from database.db_manager import get_db
+from database.dialect import is_sqlite
+from database.invalidation import publish
+
+logger = logging.getLogger(__name__)
+
+INSERT_GEOLOCATION_SQL = '''
+    INSERT INTO geolocation (
+        user_id, latitude, longitude, distance_to_campus, is_near_campus, timestamp
+    )
+    VALUES %s
+'''
+
+# SQLite: execute_values недоступен, строки вставляются executemany в одной транзакции
+INSERT_GEOLOCATION_ROW_SQL = INSERT_GEOLOCATION_SQL.replace('%s', '(%s, %s, %s, %s, %s, %s)')
+
+
+class GeolocationBuffer:
+    """Потокобезопасная очередь строк geolocation с фоновым сбросом"""
+
+    def __init__(self, max_rows=GEO_BUFFER_MAX_ROWS, interval=GEO_BUFFER_FLUSH_INTERVAL,
+                 max_pending=GEO_BUFFER_MAX_PENDING):
+        self.max_rows = max_rows
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._rows = deque()
+        self._latest = {}  # user_id -> последняя ещё не записанная строка
+        self._lock = threading.Lock()
+        # Один сброс за раз: фоновый поток и close() не пишут параллельно
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='geo-buffer', daemon=True)
+
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._failures = 0
+        self._dropped = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._flush_time_total = 0.0
+
+    def start(self):
+        self._thread.start()
+
+    def add(self, user_id, latitude, longitude, distance, is_near, timestamp=None):
+        """Поставить строку в очередь (не блокирует event loop)"""
+        timestamp = timestamp or datetime.now(timezone.utc)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        row = (user_id, latitude, longitude, distance, is_near, timestamp)
+        with self._lock:
+            self._rows.append(row)
+            self._latest[user_id] = row
+            self._trim()
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Отбросить самые старые строки сверх max_pending (под self._lock)"""
+        while len(self._rows) > self.max_pending:
+            row = self._rows.popleft()
+            self._dropped += 1
+            if self._latest.get(row[0]) is row:
+                del self._latest[row[0]]
+
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def latest(self, user_id):
+        """Последняя незаписанная точка пользователя (или None)"""
+        row = self._latest.get(user_id)
+        if row is None:
+            return None
+        return dict(zip(
+            ('user_id', 'latitude', 'longitude', 'distance_to_campus', 'is_near_campus', 'timestamp'),
+            row
+        ))
+
+    def flush(self) -> int:
+        """Вставить всё накопленное; возвращает число записанных строк"""
+        if not self._rows:
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._rows)
+                self._rows.clear()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                # Пустой контекст: сброс не должен попасть в единицу работы апдейта
+                contextvars.Context().run(self._write, batch)
+            except Exception as e:
+                self._failures += 1
+                logger.error(f"❌ Ошибка записи геолокации ({len(batch)} строк): {e}")
+                with self._lock:
+                    # Возвращаем строки в начало очереди для следующей попытки
+                    self._rows.extendleft(reversed(batch))
+                    self._trim()
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                # Записанные точки теперь видны запросам — убираем их из наложения
+                for row in batch:
+                    if self._latest.get(row[0]) is row:
+                        del self._latest[row[0]]
+            # Точки стали видны и другим процессам — их экраны с геолокацией устарели
+            publish('views')
+            self._flushes += 1
+            self._flushed_rows += len(batch)
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._flush_time_total += elapsed_ms
+            return len(batch)
+
+    def _write(self, batch):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if is_sqlite():
+                cursor.executemany(INSERT_GEOLOCATION_ROW_SQL, batch)
+            else:
+                execute_values(cursor, INSERT_GEOLOCATION_SQL, batch, page_size=self.max_rows)
+            conn.commit()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка фонового сброса геолокации: {e}")
+
+    def close(self):
+        """Остановить фоновый поток и записать остаток"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending(),
+            'flushes': self._flushes,
+            'flushed_rows': self._flushed_rows,
+            'failures': self._failures,
+            'dropped': self._dropped,
+            'last_flush_ms': round(self._last_flush_ms, 2),
+            'max_flush_ms': round(self._max_flush_ms, 2),
+            'avg_flush_ms': round(self._flush_time_total / self._flushes, 2) if self._flushes else 0.0,
+        }
+
+
+geo_buffer = None
+_geo_buffer_lock = threading.Lock()
+
+
+def init_geo_buffer():
+    """Создать и запустить буфер геолокации"""
+    global geo_buffer
+    with _geo_buffer_lock:
+        if geo_buffer is None:
+            geo_buffer = GeolocationBuffer()
+            geo_buffer.start()
+            logger.info(
+                f"✅ Буфер геолокации запущен (до {geo_buffer.max_rows} строк / {geo_buffer.interval}с)"
+            )
+        return geo_buffer
+
+
+def enqueue_geolocation(user_id, latitude, longitude, distance, is_near, timestamp=None):
+    """Поставить точку геолокации в очередь на пакетную запись"""
+    (geo_buffer or init_geo_buffer()).add(user_id, latitude, longitude, distance, is_near, timestamp)
+
+
+def flush_geolocation() -> int:
+    """Записать накопленные точки сейчас"""
+    if geo_buffer is None:
+        return 0
+    return geo_buffer.flush()
+
+
+def apply_pending_geolocation(rows, user_key='user_id', **columns):
+    """
+    Наложить незаписанные точки на строки запроса «последней геолокации»
+
+    columns: поле буфера -> колонка строки, например
+    apply_pending_geolocation(rows, is_near_campus='is_near_campus', timestamp='last_geo_update')
+    """
+    if geo_buffer is None:
+        return rows
+    for row in rows:
+        pending = geo_buffer.latest(row[user_key])
+        if pending is not None:
+            for field, column in columns.items():
+                row[column] = pending[field]
+    return rows
+
+
+def get_geo_buffer_stats() -> dict:
+    """Глубина очереди и время сброса"""
+    if geo_buffer is None:
+        return {}
+    return geo_buffer.stats()
+
+
+def close_geo_buffer():
+    """Записать остаток и остановить буфер (при завершении бота)"""
+    global geo_buffer
+    with _geo_buffer_lock:
+        if geo_buffer is not None:
+            geo_buffer.close()
+            logger.info("✅ Буфер геолокации сброшен и остановлен")
+            geo_buffer = None
@@ -0,0 +1,276 @@
+# ============================================
+# FILE: database/invalidation.py
+# ============================================
+# Шина инвалидации кэшей между процессами бота (PostgreSQL LISTEN/NOTIFY).
+#
+# Каждый кэш в памяти (права, профили, активное мероприятие, лестница
+# рангов, таблица лидеров, готовые экраны) подписывается на свой тип
+# сообщения (subscribe). Писатели, сбрасывая свой кэш, публикуют тип и
+# ключи (publish) — остальные процессы сбрасывают те же ключи у себя.
+#
+# Публикация — после COMMIT текущей единицы работы, в фоновом потоке со
+# своим соединением (event loop и соединения пула не ждут NOTIFY).
+# Сообщения своего процесса игнорируются. После переподключения
+# listener сбрасывает все подписанные кэши целиком: уведомления,
+# пришедшие во время разрыва, потеряны.
+#
+# В SQLite (один процесс) и при INVALIDATION_BUS=0 шина выключена.
+# Задержка между двумя процессами — tests/test_invalidation.py.
+
+import json
+import os
+import queue
+import select
+import socket
+import threading
+import time
+import uuid
+import logging
+
+import psycopg2
+
+from config import DATABASE_URL, INVALIDATION_BUS, INVALIDATION_CHANNEL
+from database.dialect import is_sqlite
+from database.unit_of_work import after_commit
+
+logger = logging.getLogger(__name__)
+
+# Предел payload у NOTIFY — 8000 байт; берём с запасом
+MAX_PAYLOAD = 7000
+RECONNECT_DELAY = 5.0
+
+# Метка процесса: свои уведомления не применяются повторно
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Тип сообщения -> обработчики callback(*keys); без ключей — сбросить всё
+_handlers = {}
+
+
+def subscribe(kind: str, callback):
+    """Сбрасывать локальный кэш по сообщениям kind из других процессов"""
+    _handlers.setdefault(kind, []).append(callback)
+
+
+def _apply(kind: str, keys) -> int:
+    applied = 0
+    for callback in _handlers.get(kind, ()):
+        try:
+            callback(*keys)
+            applied += 1
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработчика инвалидации {kind}: {e}")
+    return applied
+
+
+def _encode(messages) -> list:
+    """Сообщения (kind, keys) -> payload'ы NOTIFY не длиннее MAX_PAYLOAD"""
+    payloads, chunk = [], []
+
+    def dump(items):
+        return json.dumps({'o': ORIGIN, 't': time.time(), 'm': items}, separators=(',', ':'))
+
+    for kind, keys in messages:
+        item = [kind, list(keys)]
+        if len(dump([item])) > MAX_PAYLOAD:
+            item = [kind, []]  # слишком много ключей — сбросить тип целиком
+        if chunk and len(dump(chunk + [item])) > MAX_PAYLOAD:
+            payloads.append(dump(chunk))
+            chunk = []
+        chunk.append(item)
+    if chunk:
+        payloads.append(dump(chunk))
+    return payloads
+
+
+class InvalidationBus:
+    """Фоновый поток: LISTEN на своём соединении и отправка очереди NOTIFY"""
+
+    def __init__(self, dsn: str, channel: str = INVALIDATION_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self._outbox = queue.SimpleQueue()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._closed = False
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name='invalidation-bus', daemon=True)
+
+        self.published = 0
+        self.notifies = 0
+        self.received = 0
+        self.applied = 0
+        self.reconnects = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        self._thread.start()
+
+    def publish(self, kind: str, keys):
+        """Поставить сообщение в очередь отправки (не блокирует)"""
+        self._outbox.put((kind, tuple(keys)))
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # канал и так полон — поток уже разбужен
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        return conn
+
+    def _drain_outbox(self) -> list:
+        messages = []
+        while True:
+            try:
+                message = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            if message not in messages:
+                messages.append(message)
+        return messages
+
+    def _send(self, conn, messages):
+        with conn.cursor() as cursor:
+            for payload in _encode(messages):
+                cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+                self.notifies += 1
+        self.published += len(messages)
+
+    def _receive(self, conn):
+        conn.poll()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+            except ValueError:
+                logger.warning(f"⚠️ Некорректное сообщение инвалидации: {notify.payload[:100]}")
+                continue
+            if message.get('o') == ORIGIN:
+                continue
+            self.received += 1
+            lag_ms = max((time.time() - message.get('t', time.time())) * 1000, 0.0)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            for kind, keys in message.get('m', ()):
+                self.applied += _apply(kind, keys)
+
+    def _reset_all(self):
+        """Уведомления за время разрыва потеряны — сбросить все подписанные кэши"""
+        for kind in list(_handlers):
+            _apply(kind, ())
+
+    def _run(self):
+        pending = []
+        while not self._closed:
+            conn = self._conn
+            try:
+                if conn is None or conn.closed:
+                    conn = self._conn = self._connect()
+                    if self.reconnects:
+                        self._reset_all()
+                    self.reconnects += 1
+
+                readable, _, _ = select.select([conn, self._wake_r], [], [], RECONNECT_DELAY)
+                if self._wake_r in readable:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                pending.extend(m for m in self._drain_outbox() if m not in pending)
+                if pending:
+                    self._send(conn, pending)
+                    pending = []
+                self._receive(conn)
+            except Exception as e:
+                logger.warning(f"⚠️ Шина инвалидации: {e}; переподключение через {RECONNECT_DELAY}с")
+                self._close_conn()
+                time.sleep(RECONNECT_DELAY)
+
+    def _close_conn(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Отправить остаток очереди и остановить поток"""
+        self._closed = True
+        self._wake()
+        if self._thread.is_alive():
+            self._thread.join(timeout=RECONNECT_DELAY + 5)
+        messages = self._drain_outbox()
+        if messages and self._conn is not None and not self._conn.closed:
+            try:
+                self._send(self._conn, messages)
+            except Exception as e:
+                logger.warning(f"⚠️ Шина инвалидации: не отправлено при остановке: {e}")
+        self._close_conn()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def stats(self) -> dict:
+        return {
+            'channel': self.channel,
+            'connected': self._conn is not None and not self._conn.closed,
+            'published': self.published,
+            'notifies': self.notifies,
+            'received': self.received,
+            'applied': self.applied,
+            'reconnects': max(self.reconnects - 1, 0),
+            'last_lag_ms': round(self.last_lag_ms, 2),
+            'max_lag_ms': round(self.max_lag_ms, 2),
+        }
+
+
+bus = None
+_bus_lock = threading.Lock()
+
+
+def init_invalidation_bus(dsn: str = None):
+    """Запустить шину (ничего не делает в SQLite и при INVALIDATION_BUS=0)"""
+    global bus
+    if is_sqlite() or not INVALIDATION_BUS:
+        return None
+    with _bus_lock:
+        if bus is None:
+            bus = InvalidationBus(dsn or DATABASE_URL)
+            bus.start()
+            logger.info(f"✅ Шина инвалидации запущена (LISTEN {bus.channel})")
+        return bus
+
+
+def publish(kind: str, *keys):
+    """
+    Сообщить другим процессам: сбросить keys в кэше kind (без ключей — весь)
+
+    Внутри единицы работы отправляется после COMMIT; при ROLLBACK — нет
+    """
+    if bus is None:
+        return
+    after_commit(lambda: bus is not None and bus.publish(kind, keys))
+
+
+def get_invalidation_stats() -> dict:
+    """Счётчики шины и задержка доставки"""
+    if bus is None:
+        return {}
+    return bus.stats()
+
+
+def close_invalidation_bus():
+    """Остановить шину (при завершении бота)"""
+    global bus
+    with _bus_lock:
+        if bus is not None:
+            bus.close()
+            logger.info("✅ Шина инвалидации остановлена")
+            bus = None
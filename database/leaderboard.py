@@ -0,0 +1,231 @@
+# ============================================
+# FILE: database/leaderboard.py
+# ============================================
+# Таблица лидеров в памяти процесса.
+#
+# Зарегистрированные пользователи хранятся в списке, отсортированном
+# по (чекины ↓, дата регистрации ↑, user_id); check-in переставляет
+# одного пользователя бинарным поиском вместо сортировки всех на
+# каждый /leaderboard. Страница — срез списка, место пользователя —
+# bisect по его ключу.
+#
+# Полная загрузка — при первом обращении и раз в LEADERBOARD_RELOAD_INTERVAL
+# (правки в обход бота). Изменения профиля (регистрация, удаление
+# аккаунта) помечают пользователя, и его строка перечитывается
+# по первичному ключу при следующем чтении.
+
+import threading
+import time
+import logging
+from bisect import bisect_left, insort
+
+from config import LEADERBOARD_RELOAD_INTERVAL
+from database.db_manager import get_db
+from database.invalidation import subscribe, publish
+from database.resilience import retry_db
+from database.unit_of_work import after_commit
+
+logger = logging.getLogger(__name__)
+
+LEADER_COLUMNS = (
+    'user_id, first_name, last_name, username, team_role, '
+    'total_checkins, current_rank, registration_date'
+)
+
+
+def _sort_key(entry: dict) -> tuple:
+    registered = entry['registration_date']
+    return (
+        -(entry['total_checkins'] or 0),
+        registered.timestamp() if registered else 0.0,
+        entry['user_id'],
+    )
+
+
+class Leaderboard:
+    """Отсортированный список участников с поиском места за O(log n)"""
+
+    def __init__(self, rows=()):
+        self._entries = {}  # user_id -> строка пользователя
+        self._keys = []     # отсортированные ключи _sort_key
+        for row in rows:
+            self._entries[row['user_id']] = dict(row)
+        self._keys = sorted(_sort_key(e) for e in self._entries.values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def upsert(self, row: dict):
+        """Добавить пользователя или обновить его строку"""
+        self.remove(row['user_id'])
+        entry = self._entries[row['user_id']] = dict(row)
+        insort(self._keys, _sort_key(entry))
+
+    def remove(self, user_id: int):
+        """Убрать пользователя (если он есть)"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            del self._keys[bisect_left(self._keys, _sort_key(entry))]
+
+    def update(self, user_id: int, **fields) -> bool:
+        """Изменить поля пользователя (False — его нет в таблице)"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+        self.upsert(dict(entry, **fields))
+        return True
+
+    def page(self, offset: int, limit: int) -> list:
+        """Строки с местами offset+1 … offset+limit (поле position)"""
+        return [
+            dict(self._entries[key[2]], position=position)
+            for position, key in enumerate(self._keys[offset:offset + limit], offset + 1)
+        ]
+
+    def position(self, user_id: int) -> int:
+        """Место пользователя (None — не участвует)"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self._keys, _sort_key(entry)) + 1
+
+
+_board = None
+_loaded_at = 0.0
+_dirty = set()  # user_id, чьи строки нужно перечитать
+_reloading = 0  # идёт полная загрузка: изменения за это время перечитываются после неё
+_board_lock = threading.Lock()
+
+
+@retry_db
+def _load() -> Leaderboard:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {LEADER_COLUMNS} FROM users WHERE is_registered = TRUE')
+        return Leaderboard(cursor.fetchall())
+
+
+@retry_db
+def _load_users(user_ids) -> list:
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {LEADER_COLUMNS}, is_registered FROM users
+            WHERE user_id IN ({placeholders})
+        ''', tuple(user_ids))
+        return cursor.fetchall()
+
+
+def reload_leaderboard() -> Leaderboard:
+    """Полностью перечитать таблицу лидеров из БД"""
+    global _board, _loaded_at, _reloading
+    with _board_lock:
+        _dirty.clear()
+        _reloading += 1
+    try:
+        board = _load()
+    finally:
+        with _board_lock:
+            _reloading -= 1
+    with _board_lock:
+        _board, _loaded_at = board, time.monotonic()
+    logger.info(f"🏆 Таблица лидеров загружена: {len(board)}")
+    return board
+
+
+def _get_board() -> Leaderboard:
+    board = _board
+    if board is None or time.monotonic() - _loaded_at > LEADERBOARD_RELOAD_INTERVAL:
+        return reload_leaderboard()
+
+    with _board_lock:
+        dirty = set(_dirty)
+        _dirty.clear()
+    if dirty:
+        try:
+            rows = _load_users(sorted(dirty))
+        except Exception:
+            with _board_lock:
+                _dirty.update(dirty)
+            raise
+        found = {row['user_id']: row for row in rows}
+        with _board_lock:
+            for user_id in dirty:
+                row = found.get(user_id)
+                if row is not None and row['is_registered']:
+                    board.upsert({k: v for k, v in row.items() if k != 'is_registered'})
+                else:
+                    board.remove(user_id)
+    return board
+
+
+def get_leaderboard_page(offset: int = 0, limit: int = 10) -> dict:
+    """
+    Страница таблицы лидеров
+
+    Returns:
+        {'leaders': [... с полем position], 'total': число участников}
+    """
+    board = _get_board()
+    with _board_lock:
+        return {'leaders': board.page(offset, limit), 'total': len(board)}
+
+
+def get_leaderboard_position(user_id: int) -> int:
+    """Место пользователя в таблице лидеров (None — не участвует)"""
+    board = _get_board()
+    with _board_lock:
+        return board.position(user_id)
+
+
+def _apply_update(user_id: int, **fields):
+    with _board_lock:
+        updated = _board is not None and _board.update(user_id, **fields)
+        if _reloading or (_board is not None and not updated):
+            _dirty.add(user_id)
+
+
+def record_checkins(user_id: int, total_checkins: int, current_rank: str):
+    """Новое число чекинов и ранг пользователя — применяется после COMMIT"""
+    after_commit(lambda: _apply_update(
+        user_id, total_checkins=total_checkins, current_rank=current_rank
+    ))
+    publish('leaderboard', user_id)
+
+
+def record_rank(user_id: int, current_rank: str):
+    """Ранг пользователя изменён — применяется после COMMIT"""
+    after_commit(lambda: _apply_update(user_id, current_rank=current_rank))
+    publish('leaderboard', user_id)
+
+
+def invalidate_leaderboard_user(*user_ids):
+    """Профиль изменился (регистрация, удаление) — перечитать строки при следующем чтении"""
+    after_commit(lambda: _mark_dirty(*user_ids))
+    publish('leaderboard', *user_ids)
+
+
+def _mark_dirty(*user_ids):
+    """Перечитать строки user_ids при следующем чтении (без аргументов — всю таблицу)"""
+    global _loaded_at
+    with _board_lock:
+        if user_ids:
+            _dirty.update(user_ids)
+        else:
+            _loaded_at = time.monotonic() - LEADERBOARD_RELOAD_INTERVAL - 1
+
+
+# Другие процессы: их чекины и правки профилей перечитываются по первичному ключу
+subscribe('leaderboard', _mark_dirty)
+
+
+def get_leaderboard_stats() -> dict:
+    """Размер таблицы лидеров и возраст загрузки"""
+    with _board_lock:
+        return {
+            'loaded': _board is not None,
+            'size': len(_board) if _board is not None else 0,
+            'dirty': len(_dirty),
+            'age_seconds': round(time.monotonic() - _loaded_at, 1) if _board is not None else None,
+        }
@@ -0,0 +1,221 @@
+# ============================================
+# FILE: database/migrate.py
+# ============================================
+# Версионные миграции схемы.
+#
+# Миграции — файлы database/migrations/NNNN_название.sql, применяются
+# по порядку номеров, каждая в своей транзакции. Применённые версии
+# записываются в таблицу schema_version.
+#
+# CLI:
+#   python -m database.migrate            — применить новые миграции
+#   python -m database.migrate status     — показать текущую и последнюю версию
+#   python -m database.migrate check      — код выхода 1, если есть неприменённые
+
+import os
+import re
+import sys
+import logging
+
+import psycopg2
+
+from database.db_manager import get_db
+from database.dialect import is_sqlite
+from database.rank_ladder import invalidate_rank_ladder
+from database.sqlite_backend import init_schema as init_sqlite_schema
+from database.workloads import MAINTENANCE
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Произвольный ключ advisory lock: два процесса не мигрируют одновременно
+MIGRATION_LOCK_ID = 74201
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_([\w\-]+)\.sql$')
+
+# Кэш последней версии, уже сверенной с БД в этом процессе
+_verified_version = None
+
+
+def load_migrations() -> list:
+    """Список миграций [(version, name, path)], отсортированный по версии"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        migrations.append((version, match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Дублирующиеся номера миграций в database/migrations")
+    return migrations
+
+
+def latest_version() -> int:
+    """Номер последней миграции в коде"""
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def get_current_version(conn) -> int:
+    """Текущая версия схемы в БД (0, если миграции ещё не применялись)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT MAX(version) AS version FROM schema_version')
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    row = cursor.fetchone()
+    conn.rollback()
+    return row['version'] or 0
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def apply_migrations() -> list:
+    """
+    Применить все неприменённые миграции
+
+    Returns:
+        Список применённых версий
+    """
+    migrations = load_migrations()
+    if is_sqlite():
+        return _apply_sqlite_schema(migrations)
+    applied = []
+
+    with get_db(workload=MAINTENANCE) as conn:
+        cursor = conn.cursor()
+
+        # Блокировка на уровне сессии: параллельный процесс дождётся нас
+        cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+        try:
+            _ensure_version_table(cursor)
+            conn.commit()
+
+            current = get_current_version(conn)
+            for version, name, path in migrations:
+                if version <= current:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    sql = f.read()
+
+                logger.info(f"⏫ Миграция {version:04d}_{name}...")
+                cursor.execute(sql)
+                cursor.execute(
+                    'INSERT INTO schema_version (version, name) VALUES (%s, %s)',
+                    (version, name)
+                )
+                conn.commit()
+                applied.append(version)
+        finally:
+            conn.rollback()
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+            conn.commit()
+
+    if applied:
+        invalidate_rank_ladder()
+        logger.info(f"✅ Применено миграций: {len(applied)} (версия схемы {applied[-1]})")
+    return applied
+
+
+def _apply_sqlite_schema(migrations) -> list:
+    """
+    SQLite: миграции PostgreSQL не применяются, схема создаётся из
+    database/sqlite_schema.sql и помечается последней версией
+    """
+    with get_db(workload=MAINTENANCE) as conn:
+        current = get_current_version(conn)
+        pending = [(version, name) for version, name, _ in migrations if version > current]
+        if not pending:
+            return []
+
+        logger.info("⏫ Схема SQLite (database/sqlite_schema.sql)...")
+        init_sqlite_schema(conn)
+        cursor = conn.cursor()
+        cursor.executemany('INSERT INTO schema_version (version, name) VALUES (%s, %s)', pending)
+        conn.commit()
+
+    applied = [version for version, _ in pending]
+    invalidate_rank_ladder()
+    logger.info(f"✅ Схема SQLite создана (версия схемы {applied[-1]})")
+    return applied
+
+
+def migration_status() -> dict:
+    """Текущая и последняя версии схемы и список неприменённых миграций"""
+    migrations = load_migrations()
+    with get_db() as conn:
+        current = get_current_version(conn)
+    pending = [f"{v:04d}_{name}" for v, name, _ in migrations if v > current]
+    return {
+        'current': current,
+        'latest': migrations[-1][0] if migrations else 0,
+        'pending': pending
+    }
+
+
+def ensure_schema():
+    """
+    Быстрый путь при старте: один запрос версии, миграции — только если отстаём
+    """
+    global _verified_version
+    latest = latest_version()
+    if _verified_version == latest:
+        return
+
+    with get_db() as conn:
+        current = get_current_version(conn)
+
+    if current < latest:
+        apply_migrations()
+    elif current > latest:
+        logger.warning(f"⚠️ Схема БД ({current}) новее кода ({latest})")
+
+    _verified_version = latest
+
+
+def main(argv=None):
+    """Точка входа CLI"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'upgrade'
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    if command == 'upgrade':
+        applied = apply_migrations()
+        if not applied:
+            print("Схема актуальна, новых миграций нет")
+        return 0
+
+    if command in ('status', 'check'):
+        status = migration_status()
+        print(f"Текущая версия: {status['current']}")
+        print(f"Последняя версия: {status['latest']}")
+        for name in status['pending']:
+            print(f"  ожидает: {name}")
+        if command == 'check' and status['pending']:
+            return 1
+        return 0
+
+    print(f"Неизвестная команда: {command}. Доступно: upgrade, status, check")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+-- ============================================
+-- 0001: исходная схема (бывший init_database)
+-- ============================================
+-- ALTER ... ADD COLUMN IF NOT EXISTS оставлены, чтобы привести
+-- к актуальному виду базы, созданные старыми версиями бота.
+
+-- Таблица пользователей (расширенная)
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    birth_date DATE,
+    team_role TEXT,
+    phone_number TEXT,
+    is_registered BOOLEAN DEFAULT FALSE,
+    is_admin BOOLEAN DEFAULT FALSE,
+    total_checkins INTEGER DEFAULT 0,
+    current_rank TEXT DEFAULT 'Новичок',
+    geo_consent BOOLEAN DEFAULT FALSE,
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS username TEXT,
+ADD COLUMN IF NOT EXISTS first_name TEXT,
+ADD COLUMN IF NOT EXISTS last_name TEXT,
+ADD COLUMN IF NOT EXISTS birth_date DATE,
+ADD COLUMN IF NOT EXISTS team_role TEXT,
+ADD COLUMN IF NOT EXISTS phone_number TEXT,
+ADD COLUMN IF NOT EXISTS is_registered BOOLEAN DEFAULT FALSE,
+ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE,
+ADD COLUMN IF NOT EXISTS total_checkins INTEGER DEFAULT 0,
+ADD COLUMN IF NOT EXISTS current_rank TEXT DEFAULT 'Новичок',
+ADD COLUMN IF NOT EXISTS geo_consent BOOLEAN DEFAULT FALSE,
+ADD COLUMN IF NOT EXISTS registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+ADD COLUMN IF NOT EXISTS last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Таблица мероприятий
+CREATE TABLE IF NOT EXISTS events (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    description TEXT,
+    created_by BIGINT REFERENCES users(user_id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблица присутствия (с event_id)
+CREATE TABLE IF NOT EXISTS presence (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    event_id INTEGER REFERENCES events(id),
+    check_in_time TIMESTAMP,
+    check_out_time TIMESTAMP,
+    date DATE,
+    status TEXT,
+    latitude REAL,
+    longitude REAL
+);
+
+ALTER TABLE presence
+ADD COLUMN IF NOT EXISTS event_id INTEGER REFERENCES events(id),
+ADD COLUMN IF NOT EXISTS check_in_time TIMESTAMP,
+ADD COLUMN IF NOT EXISTS check_out_time TIMESTAMP,
+ADD COLUMN IF NOT EXISTS date DATE,
+ADD COLUMN IF NOT EXISTS status TEXT,
+ADD COLUMN IF NOT EXISTS latitude REAL,
+ADD COLUMN IF NOT EXISTS longitude REAL;
+
+-- Таблица геолокации
+CREATE TABLE IF NOT EXISTS geolocation (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    latitude REAL,
+    longitude REAL,
+    distance_to_campus REAL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_near_campus BOOLEAN
+);
+
+ALTER TABLE geolocation
+ADD COLUMN IF NOT EXISTS latitude REAL,
+ADD COLUMN IF NOT EXISTS longitude REAL,
+ADD COLUMN IF NOT EXISTS distance_to_campus REAL,
+ADD COLUMN IF NOT EXISTS timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+ADD COLUMN IF NOT EXISTS is_near_campus BOOLEAN;
+
+-- Таблица постов
+CREATE TABLE IF NOT EXISTS posts (
+    id SERIAL PRIMARY KEY,
+    event_id INTEGER REFERENCES events(id),
+    text TEXT NOT NULL,
+    media_id TEXT,
+    scheduled_time TIMESTAMP NOT NULL,
+    status TEXT DEFAULT 'pending',
+    created_by BIGINT REFERENCES users(user_id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Таблица конкурса фото
+CREATE TABLE IF NOT EXISTS photo_contest (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    photo_file_id TEXT NOT NULL,
+    description TEXT,
+    event_id INTEGER REFERENCES events(id),
+    votes INTEGER DEFAULT 0,
+    submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_winner BOOLEAN DEFAULT FALSE,
+    contest_date DATE DEFAULT CURRENT_DATE
+);
+
+ALTER TABLE photo_contest
+ADD COLUMN IF NOT EXISTS description TEXT,
+ADD COLUMN IF NOT EXISTS event_id INTEGER REFERENCES events(id),
+ADD COLUMN IF NOT EXISTS votes INTEGER DEFAULT 0,
+ADD COLUMN IF NOT EXISTS submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+ADD COLUMN IF NOT EXISTS is_winner BOOLEAN DEFAULT FALSE,
+ADD COLUMN IF NOT EXISTS contest_date DATE DEFAULT CURRENT_DATE;
+
+-- Таблица голосов за фото
+CREATE TABLE IF NOT EXISTS photo_votes (
+    id SERIAL PRIMARY KEY,
+    photo_id INTEGER REFERENCES photo_contest(id),
+    voter_id BIGINT REFERENCES users(user_id),
+    vote_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(photo_id, voter_id)
+);
+
+-- Расписание фотоконкурса (по датам)
+CREATE TABLE IF NOT EXISTS photo_contest_schedule (
+    contest_date DATE PRIMARY KEY,
+    end_time TIMESTAMP,
+    is_closed BOOLEAN DEFAULT FALSE
+);
+
+ALTER TABLE photo_contest_schedule
+ADD COLUMN IF NOT EXISTS end_time TIMESTAMP,
+ADD COLUMN IF NOT EXISTS is_closed BOOLEAN DEFAULT FALSE;
+
+-- Таблица базы знаний
+CREATE TABLE IF NOT EXISTS knowledge_base (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_type TEXT,
+    uploaded_by BIGINT REFERENCES users(user_id),
+    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблица рангов
+CREATE TABLE IF NOT EXISTS ranks (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    min_checkins INTEGER NOT NULL,
+    emoji TEXT DEFAULT '⭐'
+);
+
+-- Заполняем ранги, если таблица пустая
+INSERT INTO ranks (name, min_checkins, emoji)
+SELECT name, min_checkins, emoji
+FROM (VALUES
+    ('Новичок', 0, '🌱'),
+    ('Идеолог', 5, '💡'),
+    ('Реформатор', 15, '🔥'),
+    ('Философ', 30, '🧠')
+) AS seed(name, min_checkins, emoji)
+WHERE NOT EXISTS (SELECT 1 FROM ranks);
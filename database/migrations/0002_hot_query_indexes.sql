@@ -0,0 +1,44 @@
+-- ============================================
+-- 0002: индексы под горячие запросы
+-- ============================================
+-- Проверка планов: python -m database.plan_check --seed
+
+-- Кто сейчас в кампусе / мониторинг / экспорт: только открытые сессии
+CREATE INDEX IF NOT EXISTS idx_presence_open_by_date
+    ON presence (date, check_in_time)
+    WHERE status = 'in_campus';
+
+-- Отметка пользователя за день (check-in, checkout, «Мой статус»)
+CREATE INDEX IF NOT EXISTS idx_presence_user_date
+    ON presence (user_id, date, check_in_time DESC);
+
+-- Участники мероприятия (детали/экспорт по мероприятию)
+CREATE INDEX IF NOT EXISTS idx_presence_event
+    ON presence (event_id)
+    WHERE event_id IS NOT NULL;
+
+-- Последняя геолокация пользователя
+CREATE INDEX IF NOT EXISTS idx_geolocation_user_ts
+    ON geolocation (user_id, timestamp DESC);
+
+-- Планировщик постов: только ожидающие отправки
+CREATE INDEX IF NOT EXISTS idx_posts_pending_scheduled
+    ON posts (scheduled_time)
+    WHERE status = 'pending';
+
+-- Фото конкурса за день (просмотр, победитель) и заявка пользователя
+CREATE INDEX IF NOT EXISTS idx_photo_contest_date_votes
+    ON photo_contest (contest_date, votes DESC);
+CREATE INDEX IF NOT EXISTS idx_photo_contest_user_date
+    ON photo_contest (user_id, contest_date);
+
+-- Активное мероприятие и списки предстоящих/прошедших
+CREATE INDEX IF NOT EXISTS idx_events_start_end
+    ON events (start_time DESC, end_time);
+CREATE INDEX IF NOT EXISTS idx_events_end
+    ON events (end_time);
+
+-- Таблица лидеров: только зарегистрированные
+CREATE INDEX IF NOT EXISTS idx_users_leaderboard
+    ON users (total_checkins DESC, registration_date)
+    WHERE is_registered = TRUE;
@@ -0,0 +1,94 @@
+-- ============================================
+-- 0003: атомарный check-in одним вызовом
+-- ============================================
+-- campus_checkin() выполняет весь check-in в одной транзакции:
+-- проверка geo_consent, защита от повторной отметки, запись presence
+-- и geolocation, счётчик чекинов и повышение ранга.
+--
+-- Строка пользователя блокируется (FOR UPDATE), поэтому двойное нажатие
+-- и параллельные запросы одного пользователя выполняются по очереди.
+--
+-- result: 'ok' | 'no_consent' | 'already_checked_in'
+
+CREATE OR REPLACE FUNCTION campus_checkin(
+    p_user_id BIGINT,
+    p_check_in_time TIMESTAMP,
+    p_date DATE,
+    p_latitude REAL,
+    p_longitude REAL,
+    p_distance REAL,
+    p_is_near BOOLEAN
+)
+RETURNS TABLE (
+    result TEXT,
+    total_checkins INTEGER,
+    current_rank TEXT,
+    rank_emoji TEXT,
+    rank_changed BOOLEAN,
+    event_id INTEGER,
+    event_name TEXT,
+    is_admin BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_user users%ROWTYPE;
+    v_event events%ROWTYPE;
+    v_total INTEGER;
+    v_rank TEXT;
+    v_emoji TEXT;
+BEGIN
+    SELECT * INTO v_user
+    FROM users u
+    WHERE u.user_id = p_user_id
+    FOR UPDATE;
+
+    IF NOT FOUND OR NOT COALESCE(v_user.geo_consent, FALSE) THEN
+        RETURN QUERY SELECT 'no_consent'::TEXT, v_user.total_checkins, v_user.current_rank,
+                            NULL::TEXT, FALSE, NULL::INTEGER, NULL::TEXT,
+                            COALESCE(v_user.is_admin, FALSE);
+        RETURN;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM presence p
+        WHERE p.user_id = p_user_id AND p.date = p_date AND p.status = 'in_campus'
+    ) THEN
+        RETURN QUERY SELECT 'already_checked_in'::TEXT, v_user.total_checkins, v_user.current_rank,
+                            NULL::TEXT, FALSE, NULL::INTEGER, NULL::TEXT,
+                            COALESCE(v_user.is_admin, FALSE);
+        RETURN;
+    END IF;
+
+    -- Активное мероприятие (как get_active_event)
+    SELECT * INTO v_event
+    FROM events e
+    WHERE e.start_time <= CURRENT_TIMESTAMP AND e.end_time >= CURRENT_TIMESTAMP
+    ORDER BY e.start_time DESC
+    LIMIT 1;
+
+    INSERT INTO presence (user_id, event_id, check_in_time, date, status, latitude, longitude)
+    VALUES (p_user_id, v_event.id, p_check_in_time, p_date, 'in_campus', p_latitude, p_longitude);
+
+    INSERT INTO geolocation (user_id, latitude, longitude, distance_to_campus, is_near_campus)
+    VALUES (p_user_id, p_latitude, p_longitude, p_distance, p_is_near);
+
+    v_total := COALESCE(v_user.total_checkins, 0) + 1;
+
+    SELECT r.name, r.emoji INTO v_rank, v_emoji
+    FROM ranks r
+    WHERE r.min_checkins <= v_total
+    ORDER BY r.min_checkins DESC
+    LIMIT 1;
+
+    UPDATE users u
+    SET total_checkins = v_total,
+        current_rank = COALESCE(v_rank, u.current_rank)
+    WHERE u.user_id = p_user_id;
+
+    RETURN QUERY SELECT 'ok'::TEXT, v_total, COALESCE(v_rank, v_user.current_rank), v_emoji,
+                        v_rank IS NOT NULL AND v_rank IS DISTINCT FROM v_user.current_rank,
+                        v_event.id, v_event.name, COALESCE(v_user.is_admin, FALSE);
+END;
+$$;
@@ -0,0 +1,109 @@
+-- ============================================
+-- 0004: одна открытая сессия на пользователя в день
+-- ============================================
+-- Повторные доставки апдейтов и ретраи больше не создают дубли:
+-- уникальный частичный индекс + INSERT ... ON CONFLICT DO NOTHING.
+
+-- Закрываем уже накопившиеся дубли, оставляя самую раннюю отметку
+UPDATE presence p
+SET status = 'left',
+    check_out_time = COALESCE(p.check_out_time, p.check_in_time)
+FROM (
+    SELECT id,
+           ROW_NUMBER() OVER (PARTITION BY user_id, date ORDER BY check_in_time, id) AS n
+    FROM presence
+    WHERE status = 'in_campus'
+) d
+WHERE p.id = d.id AND d.n > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_presence_open_session
+    ON presence (user_id, date)
+    WHERE status = 'in_campus';
+
+-- campus_checkin: дедупликация через ограничение вместо SELECT + INSERT.
+-- Счётчик увеличивается только если запись действительно вставлена.
+CREATE OR REPLACE FUNCTION campus_checkin(
+    p_user_id BIGINT,
+    p_check_in_time TIMESTAMP,
+    p_date DATE,
+    p_latitude REAL,
+    p_longitude REAL,
+    p_distance REAL,
+    p_is_near BOOLEAN
+)
+RETURNS TABLE (
+    result TEXT,
+    total_checkins INTEGER,
+    current_rank TEXT,
+    rank_emoji TEXT,
+    rank_changed BOOLEAN,
+    event_id INTEGER,
+    event_name TEXT,
+    is_admin BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_user users%ROWTYPE;
+    v_event events%ROWTYPE;
+    v_presence_id INTEGER;
+    v_total INTEGER;
+    v_old_rank TEXT;
+    v_rank TEXT;
+    v_emoji TEXT;
+BEGIN
+    SELECT * INTO v_user
+    FROM users u
+    WHERE u.user_id = p_user_id;
+
+    IF NOT FOUND OR NOT COALESCE(v_user.geo_consent, FALSE) THEN
+        RETURN QUERY SELECT 'no_consent'::TEXT, v_user.total_checkins, v_user.current_rank,
+                            NULL::TEXT, FALSE, NULL::INTEGER, NULL::TEXT,
+                            COALESCE(v_user.is_admin, FALSE);
+        RETURN;
+    END IF;
+
+    -- Активное мероприятие (как get_active_event)
+    SELECT * INTO v_event
+    FROM events e
+    WHERE e.start_time <= CURRENT_TIMESTAMP AND e.end_time >= CURRENT_TIMESTAMP
+    ORDER BY e.start_time DESC
+    LIMIT 1;
+
+    INSERT INTO presence (user_id, event_id, check_in_time, date, status, latitude, longitude)
+    VALUES (p_user_id, v_event.id, p_check_in_time, p_date, 'in_campus', p_latitude, p_longitude)
+    ON CONFLICT (user_id, date) WHERE status = 'in_campus' DO NOTHING
+    RETURNING id INTO v_presence_id;
+
+    IF v_presence_id IS NULL THEN
+        RETURN QUERY SELECT 'already_checked_in'::TEXT, v_user.total_checkins, v_user.current_rank,
+                            NULL::TEXT, FALSE, NULL::INTEGER, NULL::TEXT,
+                            COALESCE(v_user.is_admin, FALSE);
+        RETURN;
+    END IF;
+
+    INSERT INTO geolocation (user_id, latitude, longitude, distance_to_campus, is_near_campus)
+    VALUES (p_user_id, p_latitude, p_longitude, p_distance, p_is_near);
+
+    -- Инкремент по текущему значению строки (а не по прочитанному выше)
+    UPDATE users u
+    SET total_checkins = COALESCE(u.total_checkins, 0) + 1
+    WHERE u.user_id = p_user_id
+    RETURNING u.total_checkins, u.current_rank INTO v_total, v_old_rank;
+
+    SELECT r.name, r.emoji INTO v_rank, v_emoji
+    FROM ranks r
+    WHERE r.min_checkins <= v_total
+    ORDER BY r.min_checkins DESC
+    LIMIT 1;
+
+    IF v_rank IS NOT NULL AND v_rank IS DISTINCT FROM v_old_rank THEN
+        UPDATE users u SET current_rank = v_rank WHERE u.user_id = p_user_id;
+    END IF;
+
+    RETURN QUERY SELECT 'ok'::TEXT, v_total, COALESCE(v_rank, v_old_rank), v_emoji,
+                        v_rank IS NOT NULL AND v_rank IS DISTINCT FROM v_old_rank,
+                        v_event.id, v_event.name, COALESCE(v_user.is_admin, FALSE);
+END;
+$$;
@@ -0,0 +1,41 @@
+-- ============================================
+-- 0006: очередь доставки рассылок
+-- ============================================
+-- Рассылка (пост, приглашение на фотоконкурс, итоги) создаётся вместе
+-- со строкой на каждого получателя. Воркеры забирают пачки pending-строк
+-- через SELECT ... FOR UPDATE SKIP LOCKED и отмечают результат в той же
+-- транзакции: после рестарта рассылка продолжается с неотправленных.
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    post_id INTEGER REFERENCES posts(id) ON DELETE SET NULL,
+    text TEXT NOT NULL,
+    media_id TEXT,
+    reply_markup TEXT,
+    status TEXT NOT NULL DEFAULT 'sending',
+    created_by BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL REFERENCES broadcasts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (broadcast_id, user_id)
+);
+
+-- Незавершённые рассылки и их неотправленные получатели
+CREATE INDEX IF NOT EXISTS idx_broadcasts_sending
+    ON broadcasts (id)
+    WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS idx_broadcasts_post
+    ON broadcasts (post_id)
+    WHERE post_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_pending
+    ON broadcast_deliveries (broadcast_id, user_id)
+    WHERE status = 'pending';
@@ -0,0 +1,19 @@
+-- ============================================
+-- 0007: аренда пачек рассылки и отложенные повторы
+-- ============================================
+-- Пачка получателей закрепляется за процессом короткой транзакцией
+-- (status = 'sending', lease_until), отправка идёт без транзакции и
+-- блокировок строк, результат записывается второй короткой транзакцией.
+-- Строки процесса, упавшего посреди пачки, снова забираются после
+-- lease_until. Временные ошибки возвращают получателя в pending не
+-- раньше next_attempt_at.
+
+ALTER TABLE broadcast_deliveries
+    ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+
+-- Забрать можно pending и sending с истёкшей арендой
+DROP INDEX IF EXISTS idx_broadcast_deliveries_pending;
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_claimable
+    ON broadcast_deliveries (broadcast_id, user_id)
+    WHERE status IN ('pending', 'sending');
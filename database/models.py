@@ -2,259 +2,276 @@
 # FILE: database/models.py (ИСПРАВЛЕНО)
 # ============================================
 
+from config import (
+    AUTH_CACHE_TTL, AUTH_CACHE_MAX_SIZE, PROFILE_CACHE_TTL, PROFILE_CACHE_MAX_SIZE,
+    ACTIVE_EVENT_CACHE_MAX_TTL
+)
+from database.cache import TTLCache, invalidate_on_finish
 from database.db_manager import get_db
+from database.dialect import is_sqlite, hours_between, seconds_between, latest_row_join
+from database.geo_buffer import apply_pending_geolocation
+from database.invalidation import subscribe, publish
+from database.leaderboard import record_checkins, record_rank, invalidate_leaderboard_user
+from database.migrate import ensure_schema
+from database.prepared import prepared_statement, execute_prepared
+from database.rank_ladder import get_rank_ladder, DEFAULT_EMOJI
+from database.resilience import retry_db
+from database.unit_of_work import current_unit_of_work
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Горячие запросы (почти каждый апдейт) — prepared statements, см. database/prepared.py
+USER_AUTH = prepared_statement(
+    'campus_user_auth',
+    'SELECT is_registered, is_admin FROM users WHERE user_id = %s',
+    ('BIGINT',)
+)
+OPEN_PRESENCE = prepared_statement(
+    'campus_open_presence',
+    "SELECT id, check_in_time FROM presence WHERE user_id = %s AND date = %s AND status = 'in_campus'",
+    ('BIGINT', 'DATE')
+)
+
+# Регистрация и права пользователя: user_id -> {'is_registered', 'is_admin'}
+auth_cache = TTLCache(AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL)
+
+# Профили: user_id -> строка PROFILE_COLUMNS (write-through, см. _write_profile)
+profile_cache = TTLCache(PROFILE_CACHE_MAX_SIZE, PROFILE_CACHE_TTL)
+
+PROFILE_COLUMNS = '''user_id, username, first_name, last_name, birth_date,
+                   team_role, phone_number, is_registered, total_checkins,
+                   current_rank, geo_consent'''
+
+# Активное мероприятие: одна запись {'event': ...}, срок — до ближайшей границы
+active_event_cache = TTLCache(1, ACTIVE_EVENT_CACHE_MAX_TTL)
+
+# Записи других процессов бота (database/invalidation.py)
+subscribe('user_auth', auth_cache.invalidate)
+subscribe('profile', profile_cache.invalidate)
+subscribe('active_event', active_event_cache.invalidate)
+
 def init_database():
-    """Инициализация всех таблиц БД"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Таблица пользователей (расширенная)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                birth_date DATE,
-                team_role TEXT,
-                phone_number TEXT,
-                is_registered BOOLEAN DEFAULT FALSE,
-                is_admin BOOLEAN DEFAULT FALSE,
-                total_checkins INTEGER DEFAULT 0,
-                current_rank TEXT DEFAULT 'Новичок',
-                geo_consent BOOLEAN DEFAULT FALSE,
-                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Обновление существующей схемы: гарантируем наличие столбца is_admin
-                # Обновление существующей схемы: гарантируем наличие столбца is_admin
-        cursor.execute('''
-            ALTER TABLE users
-            ADD COLUMN IF NOT EXISTS username TEXT,
-            ADD COLUMN IF NOT EXISTS first_name TEXT,
-            ADD COLUMN IF NOT EXISTS last_name TEXT,
-            ADD COLUMN IF NOT EXISTS birth_date DATE,
-            ADD COLUMN IF NOT EXISTS team_role TEXT,
-            ADD COLUMN IF NOT EXISTS phone_number TEXT,
-            ADD COLUMN IF NOT EXISTS is_registered BOOLEAN DEFAULT FALSE,
-            ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE,
-            ADD COLUMN IF NOT EXISTS total_checkins INTEGER DEFAULT 0,
-            ADD COLUMN IF NOT EXISTS current_rank TEXT DEFAULT 'Новичок',
-            ADD COLUMN IF NOT EXISTS geo_consent BOOLEAN DEFAULT FALSE,
-            ADD COLUMN IF NOT EXISTS registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        ''')
-        
-        # Таблица мероприятий (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS events (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                start_time TIMESTAMP,
-                end_time TIMESTAMP,
-                description TEXT,
-                created_by BIGINT REFERENCES users(user_id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица присутствия (с event_id)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS presence (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT REFERENCES users(user_id),
-                event_id INTEGER REFERENCES events(id),
-                check_in_time TIMESTAMP,
-                check_out_time TIMESTAMP,
-                date DATE,
-                status TEXT,
-                latitude REAL,
-                longitude REAL
-            )
-        ''')
+    """
+    Инициализация схемы БД через версионные миграции
 
-        # Обновление схемы presence: гарантируем наличие нужных столбцов
-        cursor.execute('''
-            ALTER TABLE presence
-            ADD COLUMN IF NOT EXISTS event_id INTEGER REFERENCES events(id),
-            ADD COLUMN IF NOT EXISTS check_in_time TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS check_out_time TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS date DATE,
-            ADD COLUMN IF NOT EXISTS status TEXT,
-            ADD COLUMN IF NOT EXISTS latitude REAL,
-            ADD COLUMN IF NOT EXISTS longitude REAL
-        ''')
-        # Таблица геолокации
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS geolocation (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT REFERENCES users(user_id),
-                latitude REAL,
-                longitude REAL,
-                distance_to_campus REAL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_near_campus BOOLEAN
-            )
-        ''')
+    При актуальной схеме выполняется один запрос версии (см. database/migrate.py)
+    """
+    ensure_schema()
+    logger.info("База данных инициализирована успешно")
 
-        # Обновление схемы geolocation: гарантируем наличие нужных столбцов
-        cursor.execute('''
-            ALTER TABLE geolocation
-            ADD COLUMN IF NOT EXISTS latitude REAL,
-            ADD COLUMN IF NOT EXISTS longitude REAL,
-            ADD COLUMN IF NOT EXISTS distance_to_campus REAL,
-            ADD COLUMN IF NOT EXISTS timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS is_near_campus BOOLEAN
-        ''')
-        
-        # Таблица постов (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
-                id SERIAL PRIMARY KEY,
-                event_id INTEGER REFERENCES events(id),
-                text TEXT NOT NULL,
-                media_id TEXT,
-                scheduled_time TIMESTAMP NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_by BIGINT REFERENCES users(user_id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sent_at TIMESTAMP
-            )
-        ''')
-        
-        # Таблица конкурса фото (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS photo_contest (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT REFERENCES users(user_id),
-                photo_file_id TEXT NOT NULL,
-                description TEXT,
-                event_id INTEGER REFERENCES events(id),
-                votes INTEGER DEFAULT 0,
-                submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_winner BOOLEAN DEFAULT FALSE,
-                contest_date DATE DEFAULT CURRENT_DATE
-            )
-        ''')
 
-        # Обновление схемы photo_contest: гарантируем наличие нужных столбцов
-        cursor.execute('''
-            ALTER TABLE photo_contest
-            ADD COLUMN IF NOT EXISTS description TEXT,
-            ADD COLUMN IF NOT EXISTS event_id INTEGER REFERENCES events(id),
-            ADD COLUMN IF NOT EXISTS votes INTEGER DEFAULT 0,
-            ADD COLUMN IF NOT EXISTS submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS is_winner BOOLEAN DEFAULT FALSE,
-            ADD COLUMN IF NOT EXISTS contest_date DATE DEFAULT CURRENT_DATE
-        ''')
-        
-        # Таблица голосов за фото (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS photo_votes (
-                id SERIAL PRIMARY KEY,
-                photo_id INTEGER REFERENCES photo_contest(id),
-                voter_id BIGINT REFERENCES users(user_id),
-                vote_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(photo_id, voter_id)
-            )
-        ''')
+def invalidate_user_auth(*user_ids):
+    """
+    Сбросить кэш регистрации/прав пользователей после их изменения
 
-        # Расписание фотоконкурса (по датам)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS photo_contest_schedule (
-                contest_date DATE PRIMARY KEY,
-                end_time TIMESTAMP,
-                is_closed BOOLEAN DEFAULT FALSE
-            )
-        ''')
-        cursor.execute('''
-            ALTER TABLE photo_contest_schedule
-            ADD COLUMN IF NOT EXISTS end_time TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS is_closed BOOLEAN DEFAULT FALSE
-        ''')
-        # Таблица базы знаний (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS knowledge_base (
-                id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                file_id TEXT NOT NULL,
-                file_type TEXT,
-                uploaded_by BIGINT REFERENCES users(user_id),
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица рангов (новая)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ranks (
-                id SERIAL PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                min_checkins INTEGER NOT NULL,
-                emoji TEXT DEFAULT '⭐'
-            )
-        ''')
-        
-        # Заполняем ранги, если таблица пустая
-        cursor.execute('SELECT COUNT(*) AS count FROM ranks')
-        if cursor.fetchone()['count'] == 0:
-            ranks_data = [
-                ('Новичок', 0, '🌱'),
-                ('Идеолог', 5, '💡'),
-                ('Реформатор', 15, '🔥'),
-                ('Философ', 30, '🧠')
-            ]
-            cursor.executemany(
-                'INSERT INTO ranks (name, min_checkins, emoji) VALUES (%s, %s, %s)',
-                ranks_data
-            )
-        
-        conn.commit()
-        logger.info("База данных инициализирована успешно")
+    Внутри единицы работы сбрасывается ещё раз после COMMIT/ROLLBACK
+    (см. invalidate_on_finish)
+    """
+    invalidate_on_finish(auth_cache, *user_ids, kind='user_auth')
 
 
-def is_user_registered(user_id: int) -> bool:
-    """Проверка, зарегистрирован ли пользователь"""
+def peek_user_auth(user_id: int) -> dict:
+    """Состояние из кэша без обращения к БД (None — нет в кэше)"""
+    return auth_cache.peek(user_id)
+
+
+@retry_db
+def get_user_auth(user_id: int) -> dict:
+    """Регистрация и права пользователя: {'is_registered', 'is_admin'} (кэш AUTH_CACHE_TTL)"""
+    auth = auth_cache.get(user_id)
+    if auth is not None:
+        return auth
+
+    epoch = auth_cache.epoch()
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            'SELECT is_registered FROM users WHERE user_id = %s',
-            (user_id,)
-        )
+        execute_prepared(cursor, USER_AUTH, (user_id,))
         result = cursor.fetchone()
-        return result['is_registered'] if result else False
+    auth = {
+        'is_registered': bool(result and result['is_registered']),
+        'is_admin': bool(result and result['is_admin']),
+    }
+    auth_cache.set(user_id, auth, epoch)
+    return auth
+
+
+def is_user_registered(user_id: int) -> bool:
+    """Проверка, зарегистрирован ли пользователь"""
+    return get_user_auth(user_id)['is_registered']
 
 
 def is_user_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT is_admin FROM users WHERE user_id = %s',
-            (user_id,)
-        )
-        result = cursor.fetchone()
-        return result['is_admin'] if result else False
+    return get_user_auth(user_id)['is_admin']
+
+
+def get_auth_cache_stats() -> dict:
+    """Попадания/промахи кэша регистрации и прав"""
+    return auth_cache.stats()
+
+
+def _uncommitted_profile(user_id: int) -> dict:
+    """Профиль, записанный текущей единицей работы и ещё не закоммиченный"""
+    uow = current_unit_of_work.get()
+    if uow is None:
+        return None
+    return uow.cache_writes.get(('profile', user_id))
+
+
+def peek_user_profile(user_id: int) -> dict:
+    """Профиль из кэша без обращения к БД (None — нет в кэше)"""
+    profile = _uncommitted_profile(user_id) or profile_cache.peek(user_id)
+    return dict(profile) if profile is not None else None
 
 
 def get_user_profile(user_id: int) -> dict:
-    """Получить профиль пользователя"""
+    """Получить профиль пользователя (кэш PROFILE_CACHE_TTL)"""
+    profile = _uncommitted_profile(user_id) or profile_cache.get(user_id)
+    if profile is None:
+        profile = _load_user_profile(user_id)
+    return dict(profile) if profile is not None else None
+
+
+@retry_db
+def _load_user_profile(user_id: int) -> dict:
+    epoch = profile_cache.epoch()
+    # Единица работы, уже взявшая соединение, могла что-то записать:
+    # её чтение видит незакоммиченные строки — в общий кэш его не кладём
+    uow = current_unit_of_work.get()
+    cacheable = uow is None or uow.conn is None
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT user_id, username, first_name, last_name, birth_date,
-                   team_role, phone_number, is_registered, total_checkins,
-                   current_rank, geo_consent
+        cursor.execute(f'''
+            SELECT {PROFILE_COLUMNS}
             FROM users
             WHERE user_id = %s
         ''', (user_id,))
+        profile = cursor.fetchone()
+    if profile is not None and cacheable:
+        profile_cache.set(user_id, profile, epoch)
+    return profile
+
+
+def _write_profile(user_id: int, profile: dict):
+    """
+    Write-through: профиль после изменения (строка RETURNING PROFILE_COLUMNS)
+
+    Внутри единицы работы до COMMIT новая строка видна только ей
+    (read-your-writes), в общий кэш она попадает после COMMIT; по
+    завершении транзакции (COMMIT или ROLLBACK) ключ сбрасывается ещё
+    раз, как в invalidate_on_finish. Сброс сдвигает эпоху, поэтому
+    параллельное чтение старой строки не перезапишет новую
+    """
+    uow = current_unit_of_work.get()
+    if uow is None:
+        profile_cache.invalidate(user_id)
+        publish('profile', user_id)
+        if profile is not None:
+            profile_cache.set(user_id, profile)
+        return
+
+    invalidate_on_finish(profile_cache, user_id, kind='profile')
+    if profile is None:
+        return
+    uow.cache_writes[('profile', user_id)] = profile
+    committed = []
+    uow.on_commit(lambda: committed.append(True))
+
+    def store():
+        # on_finish выполняется после on_commit и сразу после сброса выше
+        if committed:
+            profile_cache.set(user_id, profile)
+
+    uow.on_finish(store)
+
+
+def _patch_profile(user_id: int, **fields):
+    """Write-through части полей: есть профиль в кэше — обновить, нет — сбросить"""
+    profile = _uncommitted_profile(user_id) or profile_cache.peek(user_id)
+    _write_profile(user_id, dict(profile, **fields) if profile is not None else None)
+
+
+def get_profile_cache_stats() -> dict:
+    """Попадания/промахи кэша профилей"""
+    return profile_cache.stats()
+
+
+@retry_db
+def get_open_presence(user_id: int, date) -> dict:
+    """Открытая сессия пользователя за день (или None)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        execute_prepared(cursor, OPEN_PRESENCE, (user_id, date))
         return cursor.fetchone()
 
 
+USER_DASHBOARD_SQL = f'''
+    SELECT u.user_id, u.first_name, u.last_name, u.team_role,
+           u.total_checkins, u.current_rank, u.geo_consent, u.is_admin,
+           p.check_in_time, p.check_out_time, p.status AS presence_status,
+           g.distance_to_campus, g.is_near_campus, g.timestamp AS geo_timestamp,
+           s.total_days, s.avg_hours
+    FROM users u
+    LEFT JOIN (
+        SELECT check_in_time, check_out_time, status
+        FROM presence
+        WHERE user_id = %(user_id)s AND date = %(today)s
+        ORDER BY check_in_time DESC
+        LIMIT 1
+    ) p ON TRUE
+    LEFT JOIN (
+        SELECT distance_to_campus, is_near_campus, timestamp
+        FROM geolocation
+        WHERE user_id = %(user_id)s
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ) g ON TRUE
+    LEFT JOIN (
+        SELECT COUNT(DISTINCT date) FILTER (WHERE status = 'in_campus') AS total_days,
+               AVG({hours_between('check_in_time', 'check_out_time')})
+                   FILTER (WHERE check_out_time IS NOT NULL) AS avg_hours
+        FROM presence
+        WHERE user_id = %(user_id)s AND %(with_stats)s
+    ) s ON TRUE
+    WHERE u.user_id = %(user_id)s
+'''
+
+
+@retry_db
+def get_user_dashboard(user_id: int, today, with_stats: bool = False) -> dict:
+    """
+    Всё для экранов «Мой статус» и «Моя статистика» одним запросом
+
+    Профиль, эмодзи ранга, присутствие сегодня, последняя геолокация,
+    следующий ранг; с with_stats — ещё дни присутствия и среднее время
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(USER_DASHBOARD_SQL, {
+            'user_id': user_id,
+            'today': today,
+            'with_stats': with_stats
+        })
+        dashboard = cursor.fetchone()
+    
+    if dashboard:
+        # Эмодзи и следующий ранг — из лестницы рангов в памяти
+        ladder = get_rank_ladder()
+        next_rank = ladder.next(dashboard['total_checkins'])
+        dashboard['rank_emoji'] = ladder.emoji(dashboard['current_rank'], DEFAULT_EMOJI)
+        dashboard['next_rank_name'] = next_rank['name'] if next_rank else None
+        dashboard['next_rank_min_checkins'] = next_rank['min_checkins'] if next_rank else None
+        apply_pending_geolocation(
+            [dashboard],
+            distance_to_campus='distance_to_campus',
+            is_near_campus='is_near_campus',
+            timestamp='geo_timestamp'
+        )
+    return dashboard
+
+
+@retry_db
 def create_user(user_id: int, username: str, full_name: str):
     """Создать запись пользователя при первом старте"""
     with get_db() as conn:
@@ -265,13 +282,16 @@ def create_user(user_id: int, username: str, full_name: str):
             ON CONFLICT (user_id) DO NOTHING
         ''', (user_id, username, full_name))
         conn.commit()
+    invalidate_user_auth(user_id)
+    invalidate_on_finish(profile_cache, user_id, kind='profile')
 
 
+@retry_db
 def complete_registration(user_id: int, data: dict):
     """Завершить регистрацию пользователя"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE users
             SET first_name = %s,
                 last_name = %s,
@@ -282,6 +302,7 @@ def complete_registration(user_id: int, data: dict):
                 geo_consent = TRUE,
                 last_update = CURRENT_TIMESTAMP
             WHERE user_id = %s
+            RETURNING {PROFILE_COLUMNS}
         ''', (
             data['first_name'],
             data['last_name'],
@@ -290,40 +311,109 @@ def complete_registration(user_id: int, data: dict):
             data['phone_number'],
             user_id
         ))
+        profile = cursor.fetchone()
+        conn.commit()
+    _write_profile(user_id, profile)
+    invalidate_user_auth(user_id)
+    invalidate_leaderboard_user(user_id)
+
+
+@retry_db
+def delete_account(user_id: int):
+    """Удалить аккаунт: снять регистрацию и стереть личные данные"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE users
+            SET is_registered = FALSE,
+                geo_consent = FALSE,
+                first_name = NULL,
+                last_name = NULL,
+                birth_date = NULL,
+                team_role = NULL,
+                phone_number = NULL,
+                last_update = CURRENT_TIMESTAMP
+            WHERE user_id = %s
+            RETURNING {PROFILE_COLUMNS}
+        ''', (user_id,))
+        profile = cursor.fetchone()
+        conn.commit()
+    _write_profile(user_id, profile)
+    invalidate_user_auth(user_id)
+    invalidate_leaderboard_user(user_id)
+
+
+@retry_db
+def toggle_geo_consent(user_id: int) -> dict:
+    """Переключить согласие на геолокацию; возвращает обновлённый профиль"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE users
+            SET geo_consent = NOT COALESCE(geo_consent, FALSE)
+            WHERE user_id = %s
+            RETURNING {PROFILE_COLUMNS}
+        ''', (user_id,))
+        profile = cursor.fetchone()
+        conn.commit()
+    _write_profile(user_id, profile)
+    return dict(profile) if profile is not None else None
+
+
+@retry_db
+def update_user_rank(user_id: int, new_rank: str) -> dict:
+    """Записать ранг пользователя; возвращает обновлённый профиль (None — нет пользователя)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE users
+            SET current_rank = %s, last_update = CURRENT_TIMESTAMP
+            WHERE user_id = %s
+            RETURNING {PROFILE_COLUMNS}
+        ''', (new_rank, user_id))
+        profile = cursor.fetchone()
         conn.commit()
+    _write_profile(user_id, profile)
+    record_rank(user_id, new_rank)
+    return profile
+
+
+@retry_db
+def promote_admins(user_ids):
+    """Выдать права администратора (ADMIN_IDS) существующим пользователям"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE users SET is_admin = TRUE WHERE user_id = %s',
+            [(user_id,) for user_id in user_ids]
+        )
+        conn.commit()
+    invalidate_user_auth(*user_ids)
 
 
 def increment_checkins(user_id: int):
     """Увеличить счётчик чекинов и обновить ранг"""
+    ladder = get_rank_ladder()
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Увеличиваем счётчик
+        # Увеличиваем счётчик (и сразу получаем текущий ранг)
         cursor.execute('''
             UPDATE users
             SET total_checkins = total_checkins + 1
             WHERE user_id = %s
-            RETURNING total_checkins
+            RETURNING total_checkins, current_rank
         ''', (user_id,))
         
-        total = cursor.fetchone()['total_checkins']
-        
-        # Определяем новый ранг
-        cursor.execute('''
-            SELECT name FROM ranks
-            WHERE min_checkins <= %s
-            ORDER BY min_checkins DESC
-            LIMIT 1
-        ''', (total,))
-        
-        new_rank = cursor.fetchone()['name']
+        updated = cursor.fetchone()
+        old_rank = updated['current_rank']
         
-        # Получаем текущий ранг
-        cursor.execute(
-            'SELECT current_rank FROM users WHERE user_id = %s',
-            (user_id,)
-        )
-        old_rank = cursor.fetchone()['current_rank']
+        # Новый ранг — бинарным поиском по лестнице в памяти
+        rank = ladder.current(updated['total_checkins'])
+        new_rank = rank['name'] if rank else old_rank
         
         # Обновляем ранг, если изменился
         if new_rank != old_rank:
@@ -332,18 +422,129 @@ def increment_checkins(user_id: int):
                 SET current_rank = %s
                 WHERE user_id = %s
             ''', (new_rank, user_id))
-            conn.commit()
-            return new_rank  # Возвращаем новый ранг для уведомления
         
         conn.commit()
-        return None
+    _patch_profile(user_id, total_checkins=updated['total_checkins'], current_rank=new_rank)
+    record_checkins(user_id, updated['total_checkins'], new_rank)
+    # Новый ранг — для уведомления
+    return new_rank if new_rank != old_rank else None
 
 
-def get_all_users_status():
-    """Получить всех пользователей с индикатором присутствия"""
+@retry_db
+def check_in_user(user_id: int, check_in_time, date, latitude: float, longitude: float,
+                  distance: float, is_near: bool) -> dict:
+    """
+    Атомарный check-in одним запросом (функция campus_checkin, миграция 0003);
+    в SQLite — те же шаги в одной транзакции (_campus_checkin_sqlite)
+
+    Returns:
+        {'result', 'total_checkins', 'current_rank', 'rank_emoji',
+         'rank_changed', 'event_id', 'event_name', 'is_admin'}
+    """
+    # Мероприятие из кэша (миграция 0005): в установившемся режиме без запроса к events
+    event = get_active_event() or {}
+    # Лестница — до get_db: в пуле in-memory SQLite одно соединение
+    ladder = get_rank_ladder() if is_sqlite() else None
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        if is_sqlite():
+            result = _campus_checkin_sqlite(
+                cursor, user_id, check_in_time, date, latitude, longitude, distance, is_near,
+                event, ladder
+            )
+        else:
+            # check_in_time приходит с часовым поясом (timestamptz), а параметр
+            # функции — TIMESTAMP: неявного приведения нет, только явное
+            cursor.execute(
+                'SELECT * FROM campus_checkin(%s, %s::timestamp, %s, %s, %s, %s, %s, %s, %s)',
+                (user_id, check_in_time, date, latitude, longitude, distance, is_near,
+                 event.get('id'), event.get('name'))
+            )
+            result = cursor.fetchone()
+        conn.commit()
+    if result['result'] == 'ok':
+        _patch_profile(
+            user_id, total_checkins=result['total_checkins'], current_rank=result['current_rank']
+        )
+        record_checkins(user_id, result['total_checkins'], result['current_rank'])
+    return result
+
+
+def _campus_checkin_sqlite(cursor, user_id, check_in_time, date, latitude, longitude,
+                           distance, is_near, event, ladder) -> dict:
+    """campus_checkin() для SQLite: те же шаги отдельными запросами в одной транзакции"""
+    cursor.execute(
+        'SELECT total_checkins, current_rank, geo_consent, is_admin FROM users WHERE user_id = %s',
+        (user_id,)
+    )
+    user = cursor.fetchone() or {}
+    result = {
+        'result': 'no_consent',
+        'total_checkins': user.get('total_checkins'),
+        'current_rank': user.get('current_rank'),
+        'rank_emoji': None,
+        'rank_changed': False,
+        'event_id': None,
+        'event_name': None,
+        'is_admin': bool(user.get('is_admin')),
+    }
+    if not user.get('geo_consent'):
+        return result
+
+    cursor.execute('''
+        INSERT INTO presence (user_id, event_id, check_in_time, date, status, latitude, longitude)
+        VALUES (%s, %s, %s, %s, 'in_campus', %s, %s)
+        ON CONFLICT (user_id, date) WHERE status = 'in_campus' DO NOTHING
+        RETURNING id
+    ''', (user_id, event.get('id'), check_in_time, date, latitude, longitude))
+    if cursor.fetchone() is None:
+        result['result'] = 'already_checked_in'
+        return result
+
+    cursor.execute('''
+        INSERT INTO geolocation (user_id, latitude, longitude, distance_to_campus, is_near_campus)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (user_id, latitude, longitude, distance, is_near))
+
+    cursor.execute('''
+        UPDATE users
+        SET total_checkins = COALESCE(total_checkins, 0) + 1
+        WHERE user_id = %s
+        RETURNING total_checkins, current_rank
+    ''', (user_id,))
+    updated = cursor.fetchone()
+    rank = ladder.current(updated['total_checkins'])
+
+    rank_changed = rank is not None and rank['name'] != updated['current_rank']
+    if rank_changed:
+        cursor.execute(
+            'UPDATE users SET current_rank = %s WHERE user_id = %s',
+            (rank['name'], user_id)
+        )
+
+    result.update(
+        result='ok',
+        total_checkins=updated['total_checkins'],
+        current_rank=rank['name'] if rank else updated['current_rank'],
+        rank_emoji=rank['emoji'] if rank else None,
+        rank_changed=rank_changed,
+        event_id=event.get('id'),
+        event_name=event.get('name'),
+    )
+    return result
+
+
+@retry_db
+def get_all_users_status(readonly: bool = True):
+    """
+    Получить всех пользователей с индикатором присутствия
+
+    readonly=False — читать с primary (результат кэшируется, отставание
+    реплики закрепилось бы в кэше)
+    """
+    with get_db(readonly=readonly) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
             SELECT 
                 u.user_id,
                 u.first_name,
@@ -355,25 +556,53 @@ def get_all_users_status():
                 g.is_near_campus,
                 g.timestamp as last_geo_update
             FROM users u
-            LEFT JOIN (
-                SELECT DISTINCT ON (user_id) user_id, status
-                FROM presence
-                WHERE date = CURRENT_DATE
-                ORDER BY user_id, check_in_time DESC
-            ) p ON u.user_id = p.user_id
-            LEFT JOIN (
-                SELECT DISTINCT ON (user_id) user_id, is_near_campus, timestamp
-                FROM geolocation
-                ORDER BY user_id, timestamp DESC
-            ) g ON u.user_id = g.user_id
+            {latest_row_join(
+                'p', 'presence', 'status',
+                where='user_id = u.user_id AND date = CURRENT_DATE',
+                order_by='check_in_time DESC'
+            )}
+            {latest_row_join(
+                'g', 'geolocation', 'is_near_campus, timestamp',
+                where='user_id = u.user_id',
+                order_by='timestamp DESC'
+            )}
             WHERE u.is_registered = TRUE
             ORDER BY u.first_name, u.last_name
         ''')
-        return cursor.fetchall()
+        users = cursor.fetchall()
+    
+    return apply_pending_geolocation(
+        users, is_near_campus='is_near_campus', timestamp='last_geo_update'
+    )
+
+
+# Ближайшая граница, после которой активное мероприятие может смениться:
+# начало следующего мероприятия или окончание одного из идущих
+ACTIVE_EVENT_BOUNDARY_SQL = f'''
+    SELECT
+        {seconds_between('CURRENT_TIMESTAMP', '(SELECT MIN(start_time) FROM events WHERE start_time > CURRENT_TIMESTAMP)')} AS until_start,
+        {seconds_between('CURRENT_TIMESTAMP', """(SELECT MIN(end_time) FROM events
+            WHERE start_time <= CURRENT_TIMESTAMP AND end_time >= CURRENT_TIMESTAMP)""")} AS until_end
+'''
 
 
 def get_active_event():
-    """Получить активное мероприятие"""
+    """
+    Получить активное мероприятие
+
+    Кэшируется до ближайшего начала/окончания мероприятия (не дольше
+    ACTIVE_EVENT_CACHE_MAX_TTL); правки events в админке сбрасывают кэш
+    через invalidate_active_event()
+    """
+    cached = active_event_cache.get('active')
+    if cached is not None:
+        return cached['event']
+    return _load_active_event()
+
+
+@retry_db
+def _load_active_event():
+    epoch = active_event_cache.epoch()
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
@@ -383,4 +612,21 @@ def get_active_event():
             ORDER BY start_time DESC
             LIMIT 1
         ''')
-        return cursor.fetchone()
+        event = cursor.fetchone()
+        cursor.execute(ACTIVE_EVENT_BOUNDARY_SQL)
+        boundary = cursor.fetchone()
+
+    # Секунды считаются по часам БД, срок в кэше — по monotonic: расхождение часов не важно
+    seconds = [float(v) for v in (boundary['until_start'], boundary['until_end']) if v is not None]
+    active_event_cache.set('active', {'event': event}, epoch, ttl=min(seconds, default=None))
+    return event
+
+
+def invalidate_active_event():
+    """Мероприятия изменились — перечитать активное при следующем обращении"""
+    invalidate_on_finish(active_event_cache, kind='active_event')
+
+
+def get_active_event_cache_stats() -> dict:
+    """Попадания/промахи кэша активного мероприятия"""
+    return active_event_cache.stats()
@@ -0,0 +1,320 @@
+# ============================================
+# FILE: database/plan_check.py
+# ============================================
+# Проверка планов горячих запросов (защита от регрессий индексов).
+#
+# Для каждого горячего запроса выполняется EXPLAIN и проверяется, что
+# по «большим» таблицам нет Seq Scan.
+#
+# CLI:
+#   python -m database.plan_check                 — проверить на текущих данных
+#   python -m database.plan_check --seed [--scale N]
+#       — засеять синтетический набор данных в транзакции, выполнить
+#         ANALYZE + EXPLAIN и откатить. Только для dev/CI базы: ANALYZE
+#         обновляет оценки pg_class вне транзакции.
+#
+# Код выхода 1, если хотя бы один запрос использует Seq Scan.
+# То же на синтетических данных — в тестах (tests/test_query_plans.py).
+
+import sys
+import logging
+from datetime import date
+
+from database.db_manager import get_db
+from database.models import USER_DASHBOARD_SQL
+from database.workloads import MAINTENANCE
+
+logger = logging.getLogger(__name__)
+
+# Диапазон user_id синтетических пользователей (не пересекается с Telegram ID)
+SEED_USER_ID_BASE = 9_000_000_000_000
+
+# Горячие запросы: SQL повторяет запросы из указанных функций
+HOT_QUERIES = [
+    {
+        'name': 'who_inside',
+        'source': 'handlers.user_menu.show_who_inside',
+        'sql': '''
+            SELECT u.first_name, u.last_name, p.check_in_time,
+                   g.is_near_campus, g.distance_to_campus
+            FROM presence p
+            JOIN users u ON p.user_id = u.user_id
+            LEFT JOIN LATERAL (
+                SELECT is_near_campus, distance_to_campus
+                FROM geolocation
+                WHERE user_id = u.user_id
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) g ON TRUE
+            WHERE p.date = %(today)s AND p.status = 'in_campus'
+            ORDER BY p.check_in_time
+        ''',
+        'tables': ('presence', 'geolocation'),
+    },
+    {
+        'name': 'user_presence_today',
+        'source': 'handlers.checkin / handlers.user_menu.show_my_status',
+        'sql': '''
+            SELECT id, check_in_time, check_out_time, status
+            FROM presence
+            WHERE user_id = %(user_id)s AND date = %(today)s
+            ORDER BY check_in_time DESC LIMIT 1
+        ''',
+        'tables': ('presence',),
+    },
+    {
+        'name': 'all_users_status',
+        'source': 'database.models.get_all_users_status',
+        'sql': '''
+            SELECT u.user_id, p.status, g.is_near_campus, g.timestamp
+            FROM users u
+            LEFT JOIN LATERAL (
+                SELECT status
+                FROM presence
+                WHERE user_id = u.user_id AND date = %(today)s
+                ORDER BY check_in_time DESC
+                LIMIT 1
+            ) p ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT is_near_campus, timestamp
+                FROM geolocation
+                WHERE user_id = u.user_id
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) g ON TRUE
+            WHERE u.is_registered = TRUE
+            ORDER BY u.first_name, u.last_name
+        ''',
+        'tables': ('presence', 'geolocation'),
+    },
+    {
+        'name': 'user_dashboard',
+        'source': 'database.models.get_user_dashboard',
+        'sql': USER_DASHBOARD_SQL,
+        'tables': ('users', 'presence', 'geolocation'),
+    },
+    {
+        'name': 'last_geolocation',
+        'source': 'handlers.user_menu.show_my_status',
+        'sql': '''
+            SELECT distance_to_campus, is_near_campus, timestamp
+            FROM geolocation
+            WHERE user_id = %(user_id)s
+            ORDER BY timestamp DESC LIMIT 1
+        ''',
+        'tables': ('geolocation',),
+    },
+    {
+        'name': 'pending_posts',
+        'source': 'features.posts_scheduler.check_scheduled_posts',
+        'sql': '''
+            SELECT id, text, media_id, event_id
+            FROM posts
+            WHERE status = 'pending'
+              AND scheduled_time <= NOW()
+        ''',
+        'tables': ('posts',),
+    },
+    {
+        'name': 'contest_photos',
+        'source': 'handlers.contests.view_contest_photos',
+        'sql': '''
+            SELECT pc.id, pc.photo_file_id, pc.votes
+            FROM photo_contest pc
+            WHERE pc.contest_date = %(today)s
+            ORDER BY pc.votes DESC
+        ''',
+        'tables': ('photo_contest',),
+    },
+    {
+        'name': 'active_event',
+        'source': 'database.models.get_active_event',
+        'sql': '''
+            SELECT * FROM events
+            WHERE start_time <= CURRENT_TIMESTAMP
+              AND end_time >= CURRENT_TIMESTAMP
+            ORDER BY start_time DESC
+            LIMIT 1
+        ''',
+        'tables': ('events',),
+    },
+    {
+        'name': 'leaderboard_refresh',
+        'source': 'database.leaderboard._load_users',
+        'sql': '''
+            SELECT user_id, first_name, last_name, username, team_role,
+                   total_checkins, current_rank, registration_date, is_registered
+            FROM users
+            WHERE user_id IN (%(user_id)s)
+        ''',
+        'tables': ('users',),
+    },
+    {
+        'name': 'broadcast_claim',
+        'source': 'features.broadcast_queue._claim_batch',
+        'sql': '''
+            SELECT user_id
+            FROM broadcast_deliveries
+            WHERE broadcast_id = (SELECT MAX(id) FROM broadcasts)
+              AND attempts < 3
+              AND (
+                  (status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= NOW()))
+                  OR (status = 'sending' AND lease_until < NOW())
+              )
+            ORDER BY user_id
+            LIMIT 50
+            FOR UPDATE SKIP LOCKED
+        ''',
+        'tables': ('broadcast_deliveries',),
+    },
+]
+
+
+def seed_synthetic_data(cursor, scale: int = 1):
+    """Засеять синтетический набор данных (вызывать внутри откатываемой транзакции)"""
+    users = 5000 * scale
+    base = SEED_USER_ID_BASE
+
+    cursor.execute('''
+        INSERT INTO users (user_id, username, first_name, last_name,
+                           is_registered, total_checkins, current_rank, geo_consent)
+        SELECT %(base)s + n, 'seed_' || n, 'Имя' || n, 'Фамилия' || n,
+               TRUE, n %% 40, 'Новичок', TRUE
+        FROM generate_series(1, %(users)s) AS n
+    ''', {'base': base, 'users': users})
+
+    cursor.execute('''
+        INSERT INTO events (name, start_time, end_time)
+        SELECT 'Событие ' || n,
+               NOW() - (n || ' hours')::interval,
+               NOW() - (n || ' hours')::interval + INTERVAL '2 hours'
+        FROM generate_series(1, %(events)s) AS n
+    ''', {'events': 1000 * scale})
+
+    # ~год истории; открытые сессии только у небольшой части сегодняшних
+    cursor.execute('''
+        INSERT INTO presence (user_id, check_in_time, check_out_time, date, status)
+        SELECT %(base)s + 1 + (n %% %(users)s),
+               d + INTERVAL '9 hours',
+               d + INTERVAL '17 hours',
+               d::date,
+               CASE WHEN d::date = CURRENT_DATE AND n %% 10 = 0 THEN 'in_campus' ELSE 'left' END
+        FROM generate_series(1, %(rows)s) AS n,
+             LATERAL (SELECT CURRENT_DATE - (n %% 365) AS d) AS day
+    ''', {'base': base, 'users': users, 'rows': 40 * users})
+
+    cursor.execute('''
+        INSERT INTO geolocation (user_id, latitude, longitude, distance_to_campus,
+                                 timestamp, is_near_campus)
+        SELECT %(base)s + 1 + (n %% %(users)s), 43.2, 76.8, n %% 3000,
+               NOW() - (n || ' minutes')::interval, n %% 3000 <= 1000
+        FROM generate_series(1, %(rows)s) AS n
+    ''', {'base': base, 'users': users, 'rows': 100 * users})
+
+    cursor.execute('''
+        INSERT INTO posts (text, scheduled_time, status)
+        SELECT 'Пост ' || n, NOW() - (n || ' hours')::interval,
+               CASE WHEN n %% 500 = 0 THEN 'pending' ELSE 'sent' END
+        FROM generate_series(1, %(rows)s) AS n
+    ''', {'rows': 4 * users})
+
+    cursor.execute('''
+        INSERT INTO photo_contest (user_id, photo_file_id, votes, contest_date)
+        SELECT %(base)s + 1 + (n %% %(users)s), 'seed_photo_' || n, n %% 50,
+               CURRENT_DATE - (n %% 365)
+        FROM generate_series(1, %(rows)s) AS n
+    ''', {'base': base, 'users': users, 'rows': 10 * users})
+
+    # Завершённые рассылки всем и одна текущая, отправленная наполовину
+    cursor.execute('''
+        INSERT INTO broadcasts (kind, text, status)
+        SELECT 'post', 'Пост ' || n, CASE WHEN n = %(rows)s THEN 'sending' ELSE 'done' END
+        FROM generate_series(1, %(rows)s) AS n
+    ''', {'rows': 20})
+    cursor.execute('''
+        INSERT INTO broadcast_deliveries (broadcast_id, user_id, status, attempts)
+        SELECT b.id, u.user_id,
+               CASE WHEN b.status = 'sending' AND u.user_id %% 2 = 0 THEN 'pending' ELSE 'sent' END,
+               1
+        FROM broadcasts b
+        CROSS JOIN users u
+        WHERE u.user_id > %(base)s
+    ''', {'base': base})
+
+    cursor.execute(
+        'ANALYZE users, events, presence, geolocation, posts, photo_contest, '
+        'broadcasts, broadcast_deliveries'
+    )
+
+
+def _seq_scans(plan: dict, tables) -> list:
+    """Найти Seq Scan по указанным таблицам в дереве плана"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child, tables))
+    return found
+
+
+def check_query_plans(seed: bool = False, scale: int = 1) -> list:
+    """
+    Проверить планы горячих запросов
+
+    Returns:
+        Список {'name', 'source', 'ok', 'seq_scans'} по каждому запросу
+    """
+    params = {'today': date.today(), 'user_id': SEED_USER_ID_BASE + 1, 'with_stats': True}
+    results = []
+
+    with get_db(workload=MAINTENANCE) as conn:
+        cursor = conn.cursor()
+        try:
+            if seed:
+                seed_synthetic_data(cursor, scale)
+
+            for query in HOT_QUERIES:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + query['sql'], params)
+                plan = cursor.fetchone()['QUERY PLAN'][0]['Plan']
+                seq_scans = _seq_scans(plan, query['tables'])
+                results.append({
+                    'name': query['name'],
+                    'source': query['source'],
+                    'ok': not seq_scans,
+                    'seq_scans': seq_scans
+                })
+        finally:
+            # Синтетические данные никогда не коммитятся
+            conn.rollback()
+
+    return results
+
+
+def main(argv=None):
+    """Точка входа CLI"""
+    argv = sys.argv[1:] if argv is None else argv
+    seed = '--seed' in argv
+    scale = 1
+    if '--scale' in argv:
+        scale = int(argv[argv.index('--scale') + 1])
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    results = check_query_plans(seed=seed, scale=scale)
+    failed = [r for r in results if not r['ok']]
+    for r in results:
+        mark = '✅' if r['ok'] else '❌'
+        details = '' if r['ok'] else f" — Seq Scan: {', '.join(r['seq_scans'])}"
+        print(f"{mark} {r['name']} ({r['source']}){details}")
+
+    if failed:
+        print(f"\nРегрессия планов: {len(failed)} из {len(results)} запросов")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
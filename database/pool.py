@@ -0,0 +1,295 @@
+# ============================================
+# FILE: database/pool.py
+# ============================================
+
+import functools
+import threading
+import time
+import logging
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from database.query_stats import InstrumentedCursor
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений PostgreSQL
+
+    - ожидание свободного соединения с таймаутом вместо ошибки при исчерпании
+    - проверка (pre-ping) соединений, долго лежавших без дела
+    - ограничение времени жизни соединения и закрытие лишних простаивающих
+    - прогрев minconn соединений при старте
+    - статистика: занято/свободно/ожидающие/время ожидания
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0,
+                 max_lifetime=1800.0, max_idle=300.0, preping_after=30.0,
+                 connect_kwargs=None, connect=None):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные границы пула: minconn/maxconn")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.preping_after = preping_after
+        self.connect_kwargs = connect_kwargs or {}
+        # Фабрика соединений: по умолчанию psycopg2 (SQLite подставляет свою)
+        self.connect = connect or functools.partial(psycopg2.connect, cursor_factory=InstrumentedCursor)
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, created_at, last_used)
+        self._in_use = {}           # id(conn) -> (conn, created_at)
+        self._size = 0              # всего открыто (свободные + занятые + создаваемые)
+        self._waiters = 0
+        self._closed = False
+        self._last_reap = time.monotonic()
+
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'preping_failed': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+        self._warm_up()
+
+    # ----------------------------------------
+    # Создание / закрытие соединений
+    # ----------------------------------------
+
+    def _connect(self):
+        conn = self.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Закрыть соединение, не возвращая его в пул"""
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['discarded'] += 1
+
+    def _warm_up(self):
+        """Открыть minconn соединений заранее (ошибка прогрева не фатальна)"""
+        for _ in range(self.minconn):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning(f"⚠️ Прогрев пула прерван: {e}")
+                break
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append((conn, now, now))
+                self._size += 1
+
+    def _is_expired(self, created_at, now):
+        return self.max_lifetime and now - created_at > self.max_lifetime
+
+    def _ping(self, conn):
+        """Проверить, что соединение живо (после рестарта Postgres оно может быть мёртвым)"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # ----------------------------------------
+    # Checkout / return
+    # ----------------------------------------
+
+    def getconn(self, timeout=None):
+        """Взять соединение из пула, при исчерпании ждать не дольше timeout секунд"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("Пул соединений закрыт")
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"Пул соединений исчерпан: нет свободного соединения за {timeout:.1f}с"
+                        )
+                    waited = True
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+                    if self._closed:
+                        raise PoolError("Пул соединений закрыт")
+
+                if self._idle:
+                    # LIFO: самые «тёплые» соединения используются первыми
+                    conn, created_at, last_used = self._idle.pop()
+                else:
+                    conn, created_at, last_used = None, None, None
+                    self._size += 1  # резервируем место под новое соединение
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+            else:
+                now = time.monotonic()
+                stale = (
+                    conn.closed
+                    or self._is_expired(created_at, now)
+                    or (now - last_used > self.preping_after and not self._ping(conn))
+                )
+                if stale:
+                    if not conn.closed and not self._is_expired(created_at, now):
+                        with self._cond:
+                            self._stats['preping_failed'] += 1
+                    self._discard(conn)
+                    with self._cond:
+                        self._size -= 1
+                    continue
+
+            wait_time = time.monotonic() - started
+            with self._cond:
+                self._in_use[id(conn)] = (conn, created_at)
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += wait_time
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Вернуть соединение в пул (или закрыть, если оно сломано/устарело)"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            if self._closed:
+                self._discard(conn)
+                return
+            raise PoolError("Попытка вернуть соединение, не взятое из этого пула")
+        created_at = entry[1]
+
+        if not close and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    # Незавершённая транзакция не должна «протечь» к следующему пользователю
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        now = time.monotonic()
+        if close or conn.closed or self._closed or self._is_expired(created_at, now):
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+        else:
+            with self._cond:
+                self._idle.append((conn, created_at, now))
+                self._cond.notify()
+
+        self._maybe_reap(now)
+
+    # ----------------------------------------
+    # Обслуживание
+    # ----------------------------------------
+
+    def _maybe_reap(self, now):
+        """Периодически закрывать соединения, простаивающие дольше max_idle"""
+        if not self.max_idle or now - self._last_reap < min(self.max_idle, 60):
+            return
+        self._last_reap = now
+        self.reap_idle()
+
+    def reap_idle(self):
+        """Закрыть простаивающие соединения сверх minconn"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            keep = deque()
+            # Самые старые по last_used — в начале очереди
+            while self._idle:
+                conn, created_at, last_used = self._idle.popleft()
+                idle_too_long = self.max_idle and now - last_used > self.max_idle
+                if self._size - len(expired) > self.minconn and (
+                        idle_too_long or self._is_expired(created_at, now)):
+                    expired.append(conn)
+                else:
+                    keep.append((conn, created_at, last_used))
+            self._idle = keep
+            self._size -= len(expired)
+        for conn in expired:
+            self._discard(conn)
+        if expired:
+            logger.info(f"♻️ Закрыто простаивающих соединений: {len(expired)}")
+        return len(expired)
+
+    def closeall(self):
+        """Закрыть все соединения пула"""
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            in_use = [entry[0] for entry in self._in_use.values()]
+            self._idle.clear()
+            self._in_use.clear()
+            self._size = 0
+            self._cond.notify_all()
+        for conn in idle + in_use:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        """Снимок статистики пула"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiters': self._waiters,
+            })
+        waits = stats['waits']
+        stats['wait_time_avg'] = round(stats['wait_time_total'] / waits, 4) if waits else 0.0
+        stats['wait_time_total'] = round(stats['wait_time_total'], 4)
+        stats['wait_time_max'] = round(stats['wait_time_max'], 4)
+        return stats
@@ -0,0 +1,112 @@
+# ============================================
+# FILE: database/prepared.py
+# ============================================
+# Серверные prepared statements для самых частых запросов.
+#
+# Запрос регистрируется один раз при импорте модуля (prepared_statement),
+# на каждом соединении пула PREPARE выполняется при первом использовании,
+# дальше — только EXECUTE: разбор и планирование не повторяются.
+# Микробенчмарк — tests/test_prepared.py (нужен PostgreSQL).
+
+import re
+import threading
+import weakref
+import logging
+
+import psycopg2
+
+from config import DB_PREPARED_STATEMENTS
+from database.dialect import is_sqlite
+
+logger = logging.getLogger(__name__)
+
+_PARAM = re.compile(r'%s')
+
+# Зарегистрированные запросы: имя -> PreparedStatement
+_statements = {}
+
+# Какие запросы уже подготовлены на соединении (соединение -> set имён)
+_prepared_on = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+_stats = {'prepares': 0, 'executions': 0, 'reprepares': 0}
+
+
+class PreparedStatement:
+    """Запрос с позиционными параметрами %s и их типами PostgreSQL"""
+
+    def __init__(self, name: str, sql: str, types):
+        self.name = name
+        self.sql = sql
+        self.types = tuple(types)
+        if len(_PARAM.findall(sql)) != len(self.types):
+            raise ValueError(f"{name}: число параметров %s не совпадает с types")
+
+        numbers = iter(range(1, len(self.types) + 1))
+        body = _PARAM.sub(lambda _: f"${next(numbers)}", sql)
+        arguments = f" ({', '.join(self.types)})" if self.types else ''
+        self.prepare_sql = f"PREPARE {name}{arguments} AS {body}"
+        placeholders = f" ({', '.join(['%s'] * len(self.types))})" if self.types else ''
+        self.execute_sql = f"EXECUTE {name}{placeholders}"
+
+
+def prepared_statement(name: str, sql: str, types=()) -> PreparedStatement:
+    """Зарегистрировать запрос (имя уникально в пределах процесса)"""
+    statement = _statements.get(name)
+    if statement is not None:
+        if statement.sql != sql:
+            raise ValueError(f"Prepared statement {name} уже зарегистрирован с другим SQL")
+        return statement
+    statement = _statements[name] = PreparedStatement(name, sql, types)
+    return statement
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def execute_prepared(cursor, statement: PreparedStatement, params=()):
+    """
+    Выполнить запрос через EXECUTE, подготовив его на соединении курсора
+    при первом вызове
+
+    В SQLite (и при DB_PREPARED_STATEMENTS=0) выполняется обычный запрос:
+    sqlite3 сам кэширует скомпилированные запросы соединения
+    """
+    if is_sqlite() or not DB_PREPARED_STATEMENTS:
+        cursor.execute(statement.sql, params)
+        return
+
+    conn = cursor.connection
+    with _lock:
+        prepared = _prepared_on.get(conn)
+        if prepared is None:
+            prepared = _prepared_on[conn] = set()
+
+    if statement.name not in prepared:
+        cursor.execute(statement.prepare_sql)
+        prepared.add(statement.name)
+        _count('prepares')
+
+    try:
+        cursor.execute(statement.execute_sql, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Сессия потеряла prepared statements (DISCARD ALL) — подготовим заново в следующий раз
+        prepared.discard(statement.name)
+        _count('reprepares')
+        raise
+    _count('executions')
+
+
+def get_prepared_stats() -> dict:
+    """Зарегистрированные запросы и счётчики PREPARE / EXECUTE"""
+    with _lock:
+        stats = dict(_stats)
+        connections = len(_prepared_on)
+    stats.update({
+        'enabled': DB_PREPARED_STATEMENTS and not is_sqlite(),
+        'statements': sorted(_statements),
+        'connections': connections,
+    })
+    return stats
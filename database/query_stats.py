@@ -0,0 +1,186 @@
+# ============================================
+# FILE: database/query_stats.py
+# ============================================
+# Инструментирование запросов: время выполнения, отпечаток запроса,
+# вызывающий handler, перцентили и журнал медленных запросов.
+
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from psycopg2.extras import RealDictCursor
+
+from config import DB_SLOW_QUERY_MS, DB_QUERY_STATS_SAMPLES
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Метка вызывающего кода; выставляется асинхронным слоем до перехода в пул потоков
+current_caller = contextvars.ContextVar('current_caller', default=None)
+
+_DB_DIR = os.path.dirname(os.path.abspath(__file__))
+_STDLIB_DIR = os.path.dirname(os.path.abspath(os.__file__))
+
+_lock = threading.Lock()
+_stats = {}  # fingerprint -> dict
+
+_described = {}  # текст запроса -> (отпечаток, нормализованный текст)
+_DESCRIBED_MAX = 2048
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*(?:\?\s*,\s*)+\?\s*\)")
+
+
+def normalize_query(query) -> str:
+    """Нормализовать SQL: литералы и параметры -> ?, пробелы схлопнуты"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    text = _STRING_LITERAL.sub('?', str(query))
+    text = text.replace('%s', '?')
+    text = re.sub(r"%\(\w+\)s", '?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    return _IN_LIST.sub('(?)', text)
+
+
+def _describe(query):
+    """(отпечаток, нормализованный текст) с кэшем: SQL в коде — одни и те же строки"""
+    described = _described.get(query)
+    if described is None:
+        normalized = normalize_query(query)
+        described = (hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12], normalized)
+        if len(_described) >= _DESCRIBED_MAX:
+            _described.clear()
+        _described[query] = described
+    return described
+
+
+def fingerprint(query) -> str:
+    """Стабильный отпечаток запроса (не зависит от параметров и форматирования)"""
+    return _describe(query)[0]
+
+
+def caller_label(skip=1) -> str:
+    """Первый кадр стека вне пакета database/ и стандартной библиотеки"""
+    frame = sys._getframe(skip)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not (filename.startswith(_DB_DIR) or filename.startswith(_STDLIB_DIR)
+                or 'site-packages' in filename or filename.startswith('<')):
+            module = frame.f_globals.get('__name__', '?')
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def record_query(query, elapsed: float, rows: int, caller: str = None):
+    """Учесть выполненный запрос"""
+    key, normalized = _describe(query)
+    caller = caller or current_caller.get() or caller_label(skip=3)
+    elapsed_ms = elapsed * 1000
+
+    uow = current_unit_of_work.get()
+    if uow is not None:
+        uow.statements += 1
+
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {
+                'fingerprint': key,
+                'query': normalized[:500],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'rows': 0,
+                'slow': 0,
+                'callers': {},
+                'samples': deque(maxlen=DB_QUERY_STATS_SAMPLES),
+            }
+        entry['count'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['rows'] += max(rows, 0)
+        entry['samples'].append(elapsed_ms)
+        entry['callers'][caller] = entry['callers'].get(caller, 0) + 1
+        is_slow = DB_SLOW_QUERY_MS and elapsed_ms >= DB_SLOW_QUERY_MS
+        if is_slow:
+            entry['slow'] += 1
+
+    if is_slow:
+        logger.warning(
+            f"🐢 Медленный запрос {elapsed_ms:.0f}мс [{key}] из {caller}: "
+            f"{normalized[:200]}"
+        )
+
+
+def get_query_stats(fingerprint_key: str = None) -> list:
+    """Сводка по запросам: count, p50/p95/p99, строки, вызывающие"""
+    with _lock:
+        entries = [
+            e for e in _stats.values()
+            if fingerprint_key is None or e['fingerprint'] == fingerprint_key
+        ]
+        snapshot = [dict(e, samples=sorted(e['samples']), callers=dict(e['callers'])) for e in entries]
+
+    result = []
+    for e in snapshot:
+        samples = e.pop('samples')
+        count = e['count']
+        e.update({
+            'avg_ms': round(e['total_ms'] / count, 3) if count else 0.0,
+            'p50_ms': round(_percentile(samples, 50), 3),
+            'p95_ms': round(_percentile(samples, 95), 3),
+            'p99_ms': round(_percentile(samples, 99), 3),
+            'rows_avg': round(e['rows'] / count, 1) if count else 0.0,
+            'total_ms': round(e['total_ms'], 3),
+            'max_ms': round(e['max_ms'], 3),
+        })
+        result.append(e)
+    return result
+
+
+def get_top_queries(limit: int = 10, order_by: str = 'total_ms') -> list:
+    """Топ-N самых дорогих запросов (по умолчанию — по суммарному времени)"""
+    stats = get_query_stats()
+    stats.sort(key=lambda e: e.get(order_by, 0), reverse=True)
+    return stats[:limit]
+
+
+def reset_query_stats():
+    """Сбросить накопленную статистику"""
+    with _lock:
+        _stats.clear()
+
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor, замеряющий каждый execute/executemany"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started, self.rowcount)
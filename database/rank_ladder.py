@@ -0,0 +1,105 @@
+# ============================================
+# FILE: database/rank_ladder.py
+# ============================================
+# Лестница рангов в памяти процесса.
+#
+# Таблица ranks крошечная и меняется только миграциями, поэтому она
+# читается один раз и дальше текущий/следующий ранг находятся бинарным
+# поиском по порогам min_checkins без обращения к БД.
+#
+# Перечитывается после invalidate_rank_ladder() (миграции, ручная
+# правка) и не реже раза в RANK_LADDER_TTL секунд.
+
+import threading
+import time
+import logging
+from bisect import bisect_right
+
+from config import RANK_LADDER_TTL
+from database.db_manager import get_db
+from database.invalidation import subscribe, publish
+from database.resilience import retry_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMOJI = '🌱'
+
+
+class RankLadder:
+    """Ранги, отсортированные по порогу min_checkins"""
+
+    def __init__(self, rows):
+        self.ranks = sorted(
+            ({'name': r['name'], 'emoji': r['emoji'], 'min_checkins': r['min_checkins']} for r in rows),
+            key=lambda r: r['min_checkins']
+        )
+        self._thresholds = [r['min_checkins'] for r in self.ranks]
+        self._by_name = {r['name']: r for r in self.ranks}
+
+    def current(self, checkins: int) -> dict:
+        """Ранг для числа чекинов (None — ниже первого порога или ладдер пуст)"""
+        index = bisect_right(self._thresholds, checkins or 0) - 1
+        return self.ranks[index] if index >= 0 else None
+
+    def next(self, checkins: int) -> dict:
+        """Следующий ранг с полем remaining (None — максимальный ранг)"""
+        checkins = checkins or 0
+        index = bisect_right(self._thresholds, checkins)
+        if index >= len(self.ranks):
+            return None
+        return dict(self.ranks[index], remaining=self.ranks[index]['min_checkins'] - checkins)
+
+    def get(self, name: str) -> dict:
+        """Ранг по названию (или None)"""
+        return self._by_name.get(name)
+
+    def emoji(self, name: str, default: str = DEFAULT_EMOJI) -> str:
+        """Эмодзи ранга по названию"""
+        rank = self._by_name.get(name)
+        return rank['emoji'] if rank else default
+
+
+_ladder = None
+_loaded_at = 0.0
+_ladder_lock = threading.Lock()
+
+
+@retry_db
+def _load() -> RankLadder:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT name, emoji, min_checkins FROM ranks ORDER BY min_checkins')
+        return RankLadder(cursor.fetchall())
+
+
+def reload_rank_ladder() -> RankLadder:
+    """Перечитать ранги из БД сейчас"""
+    global _ladder, _loaded_at
+    ladder = _load()
+    with _ladder_lock:
+        _ladder, _loaded_at = ladder, time.monotonic()
+    logger.info(f"🏅 Лестница рангов загружена: {len(ladder.ranks)}")
+    return ladder
+
+
+def get_rank_ladder() -> RankLadder:
+    """Лестница рангов (загружается при первом обращении и по истечении TTL)"""
+    ladder = _ladder
+    if ladder is None or time.monotonic() - _loaded_at > RANK_LADDER_TTL:
+        ladder = reload_rank_ladder()
+    return ladder
+
+
+def invalidate_rank_ladder():
+    """Ранги изменились — перечитать при следующем обращении (во всех процессах)"""
+    _drop_ladder()
+    publish('rank_ladder')
+
+
+def _drop_ladder(*_):
+    global _ladder
+    with _ladder_lock:
+        _ladder = None
+
+
+subscribe('rank_ladder', _drop_ladder)
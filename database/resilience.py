@@ -0,0 +1,224 @@
+# ============================================
+# FILE: database/resilience.py
+# ============================================
+# Устойчивость к сбоям БД: классификация ошибок, повторы с
+# экспоненциальной задержкой и jitter для идемпотентных операций,
+# автоматический выключатель (circuit breaker) на время недоступности.
+
+import functools
+import random
+import threading
+import time
+import logging
+
+import psycopg2
+
+from config import (
+    DB_RETRY_ATTEMPTS,
+    DB_RETRY_BASE_DELAY,
+    DB_RETRY_MAX_DELAY,
+    DB_BREAKER_THRESHOLD,
+    DB_BREAKER_RESET_TIMEOUT,
+)
+from database.pool import PoolTimeout
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Виды временных ошибок
+CONNECTION = 'connection'
+SERIALIZATION = 'serialization'
+DEADLOCK = 'deadlock'
+
+
+class DatabaseUnavailable(psycopg2.OperationalError):
+    """Выключатель разомкнут: БД считается недоступной, запрос не выполняется"""
+
+
+def classify_error(error):
+    """Вид временной ошибки (connection / serialization / deadlock) или None"""
+    if isinstance(error, (DatabaseUnavailable, PoolTimeout)):
+        return None
+    pgcode = getattr(error, 'pgcode', None)
+    if pgcode == '40001':
+        return SERIALIZATION
+    if pgcode == '40P01':
+        return DEADLOCK
+    # Класс 08 — ошибки соединения, 57P01..57P03 — сервер остановлен/перезапускается
+    if pgcode and (pgcode.startswith('08') or pgcode in ('57P01', '57P02', '57P03')):
+        return CONNECTION
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not pgcode:
+        return CONNECTION
+    return None
+
+
+class CircuitBreaker:
+    """
+    Выключатель по ошибкам соединения
+
+    closed — запросы идут; после threshold ошибок подряд — open (сразу
+    DatabaseUnavailable); через reset_timeout — half_open: пропускается
+    один пробный запрос, его результат замыкает или снова размыкает цепь.
+    Цепь замыкает только ответ БД: успешный блок или ошибка сервера
+    (psycopg2.Error с pgcode). Пробный запрос без исхода (отмена, квота,
+    ошибка не из БД) или дольше reset_timeout не держит цепь:
+    пропускается следующий
+    """
+
+    def __init__(self, threshold=DB_BREAKER_THRESHOLD, reset_timeout=DB_BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+        self._opened_total = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self):
+        """Проверить, можно ли обращаться к БД; иначе DatabaseUnavailable"""
+        if self._state == 'closed':
+            return
+        with self._lock:
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = 'half_open'
+                self._probe_in_flight = False
+            if self._state == 'half_open' and (
+                not self._probe_in_flight
+                or time.monotonic() - self._probe_started >= self.reset_timeout
+            ):
+                self._probe_in_flight = True
+                self._probe_started = time.monotonic()
+                return
+            if self._state == 'closed':
+                return
+            self._rejected += 1
+        raise DatabaseUnavailable("БД временно недоступна (circuit breaker разомкнут)")
+
+    def record_success(self):
+        if self._state == 'closed' and not self._failures:
+            return
+        with self._lock:
+            if self._state != 'closed':
+                logger.info("✅ Соединение с БД восстановлено, circuit breaker замкнут")
+            self._state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос завершился без исхода — пропустить следующий"""
+        if self._state != 'half_open':
+            return
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, error):
+        """Учесть ошибку; размыкает цепь только на ошибках соединения"""
+        if classify_error(error) != CONNECTION:
+            if isinstance(error, DatabaseUnavailable):
+                return  # отказ самого выключателя: до БД запрос не дошёл
+            if isinstance(error, psycopg2.Error) and getattr(error, 'pgcode', None):
+                # Ограничение, таймаут запроса, конфликт — ответ сервера: БД жива
+                self.record_success()
+                return
+            # Соединение не получено (PoolTimeout) или ошибка не из БД (handler
+            # внутри блока get_db) — о БД ничего не известно, состояние не меняем
+            self.release_probe()
+            return
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or (
+                self._state == 'closed' and self._failures >= self.threshold
+            ):
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self._opened_total += 1
+                logger.error(
+                    f"🔌 БД недоступна ({self._failures} ошибок подряд): circuit breaker разомкнут "
+                    f"на {self.reset_timeout:.0f}с"
+                )
+
+    def stats(self) -> dict:
+        return {
+            'state': self._state,
+            'consecutive_failures': self._failures,
+            'opened_total': self._opened_total,
+            'rejected': self._rejected,
+        }
+
+
+breaker = CircuitBreaker()
+
+_retry_lock = threading.Lock()
+_retry_stats = {
+    'calls': 0,
+    'retries': 0,
+    'recovered': 0,
+    'gave_up': 0,
+    'by_kind': {CONNECTION: 0, SERIALIZATION: 0, DEADLOCK: 0},
+}
+
+
+def _count(key, kind=None):
+    with _retry_lock:
+        _retry_stats[key] += 1
+        if kind:
+            _retry_stats['by_kind'][kind] += 1
+
+
+def backoff_delay(attempt: int) -> float:
+    """Задержка перед повтором: экспонента с полным jitter"""
+    return random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def retry_db(func):
+    """
+    Повторять идемпотентную операцию с БД при временных ошибках
+
+    Внутри единицы работы повтор возможен, только если до вызова она
+    ещё не брала соединение (иначе откатилась бы чужая работа)
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _count('calls')
+        attempt = 0
+        while True:
+            uow = current_unit_of_work.get()
+            fresh = uow is None or uow.conn is None
+            try:
+                result = func(*args, **kwargs)
+                if attempt:
+                    _count('recovered')
+                return result
+            except Exception as e:
+                kind = classify_error(e)
+                attempt += 1
+                if kind is None or not fresh or attempt >= DB_RETRY_ATTEMPTS:
+                    if kind is not None:
+                        _count('gave_up')
+                    raise
+                if uow is not None:
+                    uow.discard(close=kind == CONNECTION)
+                delay = backoff_delay(attempt)
+                _count('retries', kind)
+                logger.warning(
+                    f"🔁 {func.__name__}: {kind}, попытка {attempt + 1}/{DB_RETRY_ATTEMPTS} "
+                    f"через {delay * 1000:.0f}мс"
+                )
+                time.sleep(delay)
+    return wrapper
+
+
+def get_resilience_stats() -> dict:
+    """Состояние выключателя и счётчики повторов"""
+    with _retry_lock:
+        retries = dict(_retry_stats, by_kind=dict(_retry_stats['by_kind']))
+    return {'breaker': breaker.stats(), 'retries': retries}
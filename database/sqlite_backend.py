@@ -0,0 +1,213 @@
+# ============================================
+# FILE: database/sqlite_backend.py
+# ============================================
+# Встроенный SQLite вместо PostgreSQL для локальных тестов и бенчмарков
+# (DATABASE_URL=sqlite:///campus.db или sqlite:///:memory:).
+#
+# Соединение повторяет ту часть интерфейса psycopg2, которой пользуется
+# бот: курсор со строками-словарями, параметры %s / %(name)s,
+# commit/rollback, closed и info.transaction_status — поэтому пул,
+# единица работы и инструментирование запросов работают без изменений.
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from datetime import date, datetime, timezone
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+from database.query_stats import record_query
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+# Имя общей in-memory базы: все соединения процесса видят одни данные
+_MEMORY_URI = 'file:campus_presence?mode=memory&cache=shared'
+
+# Ожидание блокировки записи другим соединением, сек
+_BUSY_TIMEOUT = 5.0
+
+_PARAM = re.compile(r"%\((\w+)\)s|%s|%%")
+
+_translated = {}  # текст запроса psycopg2 -> текст для sqlite3
+_TRANSLATED_MAX = 2048
+
+# Соединение, держащее общую in-memory базу, пока жив процесс
+_memory_keeper = None
+_memory_lock = threading.Lock()
+
+
+def _adapt_datetime(value):
+    # TIMESTAMP без зоны, как в PostgreSQL с UTC-сессией: aware -> naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(' ')
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter('BOOLEAN', lambda raw: bool(int(raw)))
+
+
+def database_path(dsn: str) -> str:
+    """Путь к файлу базы из sqlite:///путь (None — in-memory)"""
+    path = dsn[len('sqlite://'):]
+    if path.startswith('/'):
+        path = path[1:]
+    if path in ('', ':memory:'):
+        return None
+    return path
+
+
+def translate(query: str) -> str:
+    """Параметры psycopg2 (%s, %(name)s, %%) -> sqlite3 (?, :name, %)"""
+    translated = _translated.get(query)
+    if translated is None:
+        def replace(match):
+            if match.group(1):
+                return f":{match.group(1)}"
+            return '?' if match.group(0) == '%s' else '%'
+        translated = _PARAM.sub(replace, query)
+        if len(_translated) >= _TRANSLATED_MAX:
+            _translated.clear()
+        _translated[query] = translated
+    return translated
+
+
+def _translate_error(error):
+    """Исключение sqlite3 -> аналог из psycopg2 (его ловит остальной код)"""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        return psycopg2.IntegrityError(message)
+    if message.startswith('no such table'):
+        return errors.UndefinedTable(message)
+    return psycopg2.DatabaseError(message)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Курсор с интерфейсом RealDictCursor и замером каждого запроса"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(translate(query), () if vars is None else vars)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        finally:
+            record_query(query, time.perf_counter() - started, self._cursor.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(translate(query), vars_list)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        finally:
+            record_query(query, time.perf_counter() - started, self._cursor.rowcount)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _ConnectionInfo:
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def transaction_status(self):
+        if self._conn.closed:
+            return extensions.TRANSACTION_STATUS_UNKNOWN
+        if self._conn.raw.in_transaction:
+            return extensions.TRANSACTION_STATUS_INTRANS
+        return extensions.TRANSACTION_STATUS_IDLE
+
+
+class SQLiteConnection:
+    """Соединение sqlite3 с интерфейсом соединения psycopg2"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = 0
+        self.info = _ConnectionInfo(self)
+
+    def cursor(self):
+        return SQLiteCursor(self.raw.cursor())
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def executescript(self, script: str):
+        self.raw.executescript(script)
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+            self.closed = 1
+
+
+def _open(path):
+    if path is None:
+        raw = sqlite3.connect(_MEMORY_URI, uri=True, timeout=_BUSY_TIMEOUT,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    else:
+        raw = sqlite3.connect(path, timeout=_BUSY_TIMEOUT,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        raw.execute('PRAGMA journal_mode=WAL')
+        raw.execute('PRAGMA synchronous=NORMAL')
+    raw.execute('PRAGMA foreign_keys=ON')
+    raw.row_factory = _dict_row
+    return raw
+
+
+def connect(dsn: str) -> SQLiteConnection:
+    """Открыть соединение по sqlite:///... (фабрика для ConnectionPool)"""
+    global _memory_keeper
+    path = database_path(dsn)
+    if path is None:
+        with _memory_lock:
+            if _memory_keeper is None:
+                _memory_keeper = _open(None)
+    return SQLiteConnection(_open(path))
+
+
+def init_schema(conn):
+    """Создать таблицы и индексы (CREATE ... IF NOT EXISTS, повторный вызов безопасен)"""
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        conn.executescript(f.read())
@@ -0,0 +1,190 @@
+-- ============================================
+-- Схема для встроенного SQLite (DATABASE_URL=sqlite:///...)
+-- ============================================
+-- Соответствует миграциям 0001–0006. Функция campus_checkin
+-- в SQLite выполняется на стороне Python (см. database/models.py).
+-- При изменении миграций обновляйте и этот файл.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    birth_date DATE,
+    team_role TEXT,
+    phone_number TEXT,
+    is_registered BOOLEAN DEFAULT FALSE,
+    is_admin BOOLEAN DEFAULT FALSE,
+    total_checkins INTEGER DEFAULT 0,
+    current_rank TEXT DEFAULT 'Новичок',
+    geo_consent BOOLEAN DEFAULT FALSE,
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    description TEXT,
+    created_by BIGINT REFERENCES users(user_id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS presence (
+    id INTEGER PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    event_id INTEGER REFERENCES events(id),
+    check_in_time TIMESTAMP,
+    check_out_time TIMESTAMP,
+    date DATE,
+    status TEXT,
+    latitude REAL,
+    longitude REAL
+);
+
+CREATE TABLE IF NOT EXISTS geolocation (
+    id INTEGER PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    latitude REAL,
+    longitude REAL,
+    distance_to_campus REAL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_near_campus BOOLEAN
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    event_id INTEGER REFERENCES events(id),
+    text TEXT NOT NULL,
+    media_id TEXT,
+    scheduled_time TIMESTAMP NOT NULL,
+    status TEXT DEFAULT 'pending',
+    created_by BIGINT REFERENCES users(user_id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS photo_contest (
+    id INTEGER PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id),
+    photo_file_id TEXT NOT NULL,
+    description TEXT,
+    event_id INTEGER REFERENCES events(id),
+    votes INTEGER DEFAULT 0,
+    submission_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_winner BOOLEAN DEFAULT FALSE,
+    contest_date DATE DEFAULT CURRENT_DATE
+);
+
+CREATE TABLE IF NOT EXISTS photo_votes (
+    id INTEGER PRIMARY KEY,
+    photo_id INTEGER REFERENCES photo_contest(id),
+    voter_id BIGINT REFERENCES users(user_id),
+    vote_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(photo_id, voter_id)
+);
+
+CREATE TABLE IF NOT EXISTS photo_contest_schedule (
+    contest_date DATE PRIMARY KEY,
+    end_time TIMESTAMP,
+    is_closed BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS knowledge_base (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_type TEXT,
+    uploaded_by BIGINT REFERENCES users(user_id),
+    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ranks (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    min_checkins INTEGER NOT NULL,
+    emoji TEXT DEFAULT '⭐'
+);
+
+WITH seed(name, min_checkins, emoji) AS (
+    VALUES
+        ('Новичок', 0, '🌱'),
+        ('Идеолог', 5, '💡'),
+        ('Реформатор', 15, '🔥'),
+        ('Философ', 30, '🧠')
+)
+INSERT INTO ranks (name, min_checkins, emoji)
+SELECT name, min_checkins, emoji
+FROM seed
+WHERE NOT EXISTS (SELECT 1 FROM ranks);
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    post_id INTEGER REFERENCES posts(id) ON DELETE SET NULL,
+    text TEXT NOT NULL,
+    media_id TEXT,
+    reply_markup TEXT,
+    status TEXT NOT NULL DEFAULT 'sending',
+    created_by BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL REFERENCES broadcasts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TIMESTAMP,
+    lease_until TIMESTAMP,
+    next_attempt_at TIMESTAMP,
+    PRIMARY KEY (broadcast_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индексы (0002, 0004, 0006, 0007)
+CREATE INDEX IF NOT EXISTS idx_presence_open_by_date
+    ON presence (date, check_in_time)
+    WHERE status = 'in_campus';
+CREATE INDEX IF NOT EXISTS idx_presence_user_date
+    ON presence (user_id, date, check_in_time DESC);
+CREATE INDEX IF NOT EXISTS idx_presence_event
+    ON presence (event_id)
+    WHERE event_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_geolocation_user_ts
+    ON geolocation (user_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_posts_pending_scheduled
+    ON posts (scheduled_time)
+    WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_photo_contest_date_votes
+    ON photo_contest (contest_date, votes DESC);
+CREATE INDEX IF NOT EXISTS idx_photo_contest_user_date
+    ON photo_contest (user_id, contest_date);
+CREATE INDEX IF NOT EXISTS idx_events_start_end
+    ON events (start_time DESC, end_time);
+CREATE INDEX IF NOT EXISTS idx_events_end
+    ON events (end_time);
+CREATE INDEX IF NOT EXISTS idx_users_leaderboard
+    ON users (total_checkins DESC, registration_date)
+    WHERE is_registered = TRUE;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_presence_open_session
+    ON presence (user_id, date)
+    WHERE status = 'in_campus';
+CREATE INDEX IF NOT EXISTS idx_broadcasts_sending
+    ON broadcasts (id)
+    WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS idx_broadcasts_post
+    ON broadcasts (post_id)
+    WHERE post_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_claimable
+    ON broadcast_deliveries (broadcast_id, user_id)
+    WHERE status IN ('pending', 'sending');
@@ -0,0 +1,197 @@
+# ============================================
+# FILE: database/unit_of_work.py
+# ============================================
+# Единица работы (unit of work) на один апдейт: одно соединение и одна
+# транзакция на все запросы handler'а и хелперов database.models.
+#
+# Активная единица работы хранится в contextvar; get_db() внутри неё
+# не берёт новое соединение из пула, а присоединяется к общему.
+
+import contextvars
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+current_unit_of_work = contextvars.ContextVar('current_unit_of_work', default=None)
+
+
+class UnitOfWorkConnection:
+    """
+    Соединение внутри единицы работы
+
+    commit() откладывается до конца единицы работы; остальное
+    делегируется настоящему соединению psycopg2
+    """
+
+    def __init__(self, uow, conn):
+        self._uow = uow
+        self._conn = conn
+
+    def commit(self):
+        self._uow.commit_requests += 1
+
+    def rollback(self):
+        self._uow.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class UnitOfWork:
+    """Счётчики и соединение одной единицы работы"""
+
+    def __init__(self, acquire, release):
+        # acquire() -> соединение, release(conn, close) — см. database.db_manager
+        self._acquire = acquire
+        self._release = release
+        self._lock = threading.Lock()
+        self.conn = None
+        self.failed = False
+        self.workload = None  # класс нагрузки, выставленный в транзакции (None — умолчание)
+        self.quotas = set()  # классы, чьи слоты квоты держат открытые блоки get_db()
+        self.started = time.perf_counter()
+
+        # Слот checkout'а асинхронного слоя (см. database.async_db)
+        self.slot_lock = None
+        self.holds_slot = False
+        # Открытых блоков get_db(): пока они есть, checkpoint() откладывается
+        self.open_blocks = 0
+
+        # Вызываются после COMMIT/ROLLBACK (например, инвалидация кэшей)
+        self._on_finish = []
+        # Вызываются только после успешного COMMIT (например, обновление данных в памяти)
+        self._on_commit = []
+        # Незакоммиченные записи кэшей (write-through): видны только этой единице работы
+        self.cache_writes = {}
+
+        # Счётчики обращений к БД (round trips)
+        self.checkouts = 0
+        self.statements = 0
+        self.commits = 0
+        self.commit_requests = 0
+        self.checkpoints = 0
+
+    def connection(self):
+        """Соединение единицы работы (берётся из пула при первом обращении)"""
+        with self._lock:
+            if self.conn is None:
+                self.conn = self._acquire()
+                self.workload = None
+                self.checkouts += 1
+            return UnitOfWorkConnection(self, self.conn)
+
+    def rollback(self):
+        """Откатить транзакцию; закоммитить её уже не получится"""
+        self.failed = True
+        # SET LOCAL откатывается вместе с транзакцией
+        self.workload = None
+        if self.conn is not None and not self.conn.closed:
+            self.conn.rollback()
+
+    def discard(self, close: bool = False):
+        """Вернуть соединение без COMMIT и начать заново (для повтора первой операции)"""
+        with self._lock:
+            conn, self.conn = self.conn, None
+            self.failed = False
+            self._on_commit = []
+            self.cache_writes = {}
+        if conn is not None:
+            self._release(conn, close or conn.closed)
+
+    def on_finish(self, callback):
+        """Вызвать callback() после завершения транзакции (COMMIT или ROLLBACK)"""
+        self._on_finish.append(callback)
+
+    def on_commit(self, callback):
+        """Вызвать callback() после успешного COMMIT (при ROLLBACK — не вызывается)"""
+        self._on_commit.append(callback)
+
+    def _run_on_finish(self, committed: bool):
+        callbacks, self._on_finish = self._on_finish, []
+        if committed:
+            callbacks = self._on_commit + callbacks
+        self._on_commit = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика завершения единицы работы: {e}")
+
+    def finish(self, success: bool = True):
+        """Завершить: один COMMIT (или ROLLBACK) и возврат соединения в пул"""
+        with self._lock:
+            conn, self.conn = self.conn, None
+        if conn is None:
+            self._run_on_finish(committed=success and not self.failed)
+            return
+
+        broken = False
+        committed = False
+        try:
+            if success and not self.failed:
+                conn.commit()
+                self.commits += 1
+                committed = True
+            elif not conn.closed:
+                conn.rollback()
+        except Exception as e:
+            broken = True
+            logger.error(f"Ошибка завершения единицы работы: {e}")
+            if success:
+                raise
+        finally:
+            self._release(conn, broken or conn.closed)
+            self._run_on_finish(committed)
+
+    def checkpoint(self):
+        """
+        Завершить текущую транзакцию, не завершая единицу работы
+
+        COMMIT (или ROLLBACK, если транзакция в ошибке) и возврат
+        соединения в пул; следующий get_db() начнёт новую транзакцию.
+        Вызывается перед запросом к Telegram (см. bot.CampusBot): ответ
+        пользователю уходит после COMMIT, а соединение не занято на время
+        сетевого запроса.
+
+        Внутри открытого блока get_db() соединение ещё используется —
+        тогда транзакция остаётся до конца единицы работы
+
+        Returns:
+            True, если транзакция завершена
+        """
+        if self.open_blocks:
+            return False
+        try:
+            self.finish(success=True)
+        finally:
+            self.failed = False
+            self.cache_writes = {}
+            self.checkpoints += 1
+        return True
+
+    def stats(self) -> dict:
+        """Сколько раз единица работы обращалась к БД"""
+        return {
+            'checkouts': self.checkouts,
+            'statements': self.statements,
+            'commits': self.commits,
+            'commit_requests': self.commit_requests,
+            'checkpoints': self.checkpoints,
+            'failed': self.failed,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+        }
+
+
+def after_commit(callback):
+    """
+    Вызвать callback() после COMMIT текущей единицы работы
+
+    Вне единицы работы COMMIT уже выполнен вызывающим — вызывается сразу
+    """
+    uow = current_unit_of_work.get()
+    if uow is None:
+        callback()
+    else:
+        uow.on_commit(callback)
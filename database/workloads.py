@@ -0,0 +1,167 @@
+# ============================================
+# FILE: database/workloads.py
+# ============================================
+# Классы нагрузки на БД: у каждого свои statement_timeout, lock_timeout
+# и квота соединений. Класс выбирается вызывающим кодом через
+# contextvar (with workload('export'): ... или @workload_class(...))
+# и применяется get_db() автоматически.
+#
+# interactive задаётся при подключении (options), поэтому обычные
+# запросы не тратят лишний round trip; остальные классы выставляют
+# свои значения через set_config().
+
+import asyncio
+import contextvars
+import functools
+import threading
+import logging
+from contextlib import contextmanager
+
+from config import DB_WORKLOADS
+from database.dialect import is_sqlite
+from database.query_stats import current_caller, caller_label
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+ADMIN = 'admin'
+EXPORT = 'export'
+MAINTENANCE = 'maintenance'
+
+current_workload = contextvars.ContextVar('current_workload', default=INTERACTIVE)
+
+# SQLSTATE: 57014 — отмена по statement_timeout, 55P03 — lock_timeout
+_BUDGET_EXCEEDED = ('57014', '55P03')
+
+
+class Workload:
+    """Бюджет класса нагрузки и его счётчики"""
+
+    def __init__(self, name, statement_timeout, lock_timeout, quota):
+        self.name = name
+        self.statement_timeout = statement_timeout
+        self.lock_timeout = lock_timeout
+        self.quota = quota
+        self.quota_slots = threading.BoundedSemaphore(quota) if quota else None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.quota_timeouts = 0
+        self.cancelled = 0
+
+    def count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        return {
+            'statement_timeout_ms': self.statement_timeout,
+            'lock_timeout_ms': self.lock_timeout,
+            'quota': self.quota,
+            'checkouts': self.checkouts,
+            'quota_timeouts': self.quota_timeouts,
+            'cancelled': self.cancelled,
+        }
+
+
+WORKLOADS = {
+    name: Workload(name, budget['statement_timeout'], budget['lock_timeout'], budget['quota'])
+    for name, budget in DB_WORKLOADS.items()
+}
+
+
+def get_workload(name: str = None) -> Workload:
+    """Класс нагрузки по имени (по умолчанию — текущий из контекста)"""
+    name = name or current_workload.get()
+    try:
+        return WORKLOADS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный класс нагрузки: {name}")
+
+
+@contextmanager
+def workload(name: str):
+    """Выполнять запросы внутри блока в указанном классе нагрузки"""
+    get_workload(name)
+    token = current_workload.set(name)
+    try:
+        yield
+    finally:
+        current_workload.reset(token)
+
+
+def workload_class(name: str):
+    """Декоратор: функция (обычная или async) работает в указанном классе нагрузки"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with workload(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with workload(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def connection_options() -> str:
+    """libpq options: бюджет interactive как значение по умолчанию для соединения"""
+    default = WORKLOADS[INTERACTIVE]
+    return (
+        f"-c statement_timeout={default.statement_timeout} "
+        f"-c lock_timeout={default.lock_timeout}"
+    )
+
+
+def is_default(wl: Workload) -> bool:
+    """Бюджет совпадает с умолчанием соединения — применять ничего не нужно"""
+    if is_sqlite():
+        # В SQLite нет statement_timeout / lock_timeout — бюджеты не применяются
+        return True
+    default = WORKLOADS[INTERACTIVE]
+    return (wl.statement_timeout, wl.lock_timeout) == (default.statement_timeout, default.lock_timeout)
+
+
+def same_budget(a: Workload, b: Workload) -> bool:
+    """Таймауты классов совпадают — переключаться между ними не нужно"""
+    if is_sqlite():
+        return True
+    return (a.statement_timeout, a.lock_timeout) == (b.statement_timeout, b.lock_timeout)
+
+
+def apply_workload(conn, wl: Workload, local: bool):
+    """Выставить таймауты класса (local — только до конца текущей транзакции)"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT set_config('statement_timeout', %s, %s), set_config('lock_timeout', %s, %s)",
+        (str(wl.statement_timeout), local, str(wl.lock_timeout), local)
+    )
+
+
+def reset_workload(conn):
+    """Вернуть таймауты соединения к умолчанию (значения из options)"""
+    cursor = conn.cursor()
+    cursor.execute('RESET statement_timeout; RESET lock_timeout')
+
+
+def is_budget_exceeded(error) -> bool:
+    """Запрос отменён по statement_timeout / lock_timeout"""
+    return getattr(error, 'pgcode', None) in _BUDGET_EXCEEDED
+
+
+def record_cancelled(wl: Workload, error):
+    """Учесть и залогировать запрос, превысивший бюджет класса"""
+    wl.count('cancelled')
+    reason = 'statement_timeout' if error.pgcode == '57014' else 'lock_timeout'
+    logger.warning(
+        f"⏱ Запрос отменён ({reason}) в классе '{wl.name}' "
+        f"из {current_caller.get() or caller_label()}: {str(error).strip()}"
+    )
+
+
+def get_workload_stats() -> dict:
+    """Бюджеты и счётчики по классам нагрузки"""
+    return {name: wl.stats() for name, wl in WORKLOADS.items()}
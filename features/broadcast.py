@@ -0,0 +1,249 @@
+# ============================================
+# FILE: features/broadcast.py
+# ============================================
+# Массовые рассылки (автопосты, объявления фотоконкурса).
+#
+# Сообщения отправляются BROADCAST_CONCURRENCY воркерами одновременно, но
+# не быстрее общего для всех рассылок лимита (token bucket, BROADCAST_RATE
+# сообщений в секунду на бота) и не чаще одного сообщения в
+# BROADCAST_CHAT_INTERVAL секунд в один чат — лимиты Telegram Bot API.
+# RetryAfter (flood control) приостанавливает все рассылки на указанное
+# Telegram время; сетевые ошибки повторяются, Forbidden (бот
+# заблокирован) и BadRequest — нет.
+
+import asyncio
+import time
+import logging
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import (
+    BROADCAST_CONCURRENCY, BROADCAST_RATE, BROADCAST_CHAT_INTERVAL,
+    BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL,
+)
+from database.unit_of_work import current_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Предел записей о последней отправке в чат (старые удаляются)
+CHAT_THROTTLE_MAX_SIZE = 10000
+
+
+class TokenBucket:
+    """Не больше rate отправок в секунду (rate <= 0 — без ограничения)"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (flood control Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Дождаться токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatThrottle:
+    """Не чаще одного сообщения в interval секунд в один чат"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = {}  # chat_id -> когда можно отправить следующее
+
+    async def wait(self, chat_id: int):
+        """Дождаться своей очереди в чат (место занимается сразу)"""
+        if self.interval <= 0:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+        if len(self._next) > CHAT_THROTTLE_MAX_SIZE:
+            self._next = {k: v for k, v in self._next.items() if v > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Broadcaster:
+    """Рассылки с ограничением параллельности и общими лимитами Telegram"""
+
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 chat_interval: float = BROADCAST_CHAT_INTERVAL, max_retries: int = BROADCAST_MAX_RETRIES):
+        self.concurrency = max(concurrency, 1)
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatThrottle(chat_interval)
+
+        self.runs = 0
+        self.active = 0
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.last = None
+
+    async def _deliver(self, chat_id: int, send) -> tuple:
+        """Одно сообщение с повторами: ('sent' | 'blocked' | 'failed', последняя ошибка)"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+            await self.chats.wait(chat_id)
+            await self.bucket.acquire()
+            try:
+                await send(chat_id)
+                return 'sent', None
+            except RetryAfter as e:
+                error = e
+                self.flood_waits += 1
+                # PTB отдаёт int или timedelta (в зависимости от версии)
+                retry_after = e.retry_after
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"⚠️ Flood control Telegram: пауза рассылок {retry_after}с")
+                self.bucket.pause(retry_after)
+            except Forbidden as e:
+                return 'blocked', e
+            except BadRequest as e:
+                logger.error(f"Ошибка рассылки в чат {chat_id}: {e}")
+                return 'failed', e
+            except NetworkError as e:
+                error = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 5.0))
+                else:
+                    logger.error(f"Ошибка рассылки в чат {chat_id}: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка рассылки в чат {chat_id}: {e}")
+                return 'failed', e
+        return 'failed', error
+
+    async def run(self, chat_ids, send, progress=None, on_result=None, name: str = 'рассылка',
+                  log: bool = True) -> dict:
+        """
+        Отправить send(chat_id) в каждый чат
+
+        progress — async callback(result) раз в BROADCAST_PROGRESS_INTERVAL секунд;
+        on_result — callback(chat_id, status, error) после каждого получателя;
+        log=False — итог только в debug (рассылка пачками, см. features/broadcast_queue.py)
+
+        Returns:
+            {'total', 'sent', 'failed', 'blocked', 'elapsed', 'rate'}
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        result = {'total': len(chat_ids), 'sent': 0, 'failed': 0, 'blocked': 0}
+        started = time.perf_counter()
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        def snapshot() -> dict:
+            elapsed = time.perf_counter() - started
+            return dict(result, elapsed=round(elapsed, 2),
+                        rate=round(result['sent'] / elapsed, 1) if elapsed > 0 else 0.0)
+
+        async def worker():
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                status, error = await self._deliver(chat_id, send)
+                result[status] += 1
+                if on_result:
+                    on_result(chat_id, status, error)
+                setattr(self, status, getattr(self, status) + 1)
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+                try:
+                    await progress(snapshot())
+                except Exception as e:
+                    logger.warning(f"⚠️ Ошибка отчёта о ходе рассылки: {e}")
+
+        self.runs += 1
+        self.active += 1
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(chat_ids)))]
+        progress_task = asyncio.create_task(reporter()) if progress else None
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            self.active -= 1
+            for task in workers:
+                task.cancel()
+            if progress_task:
+                progress_task.cancel()
+
+        self.last = snapshot()
+        summary = (
+            f"📢 {name}: отправлено {result['sent']}/{result['total']} за {self.last['elapsed']}с "
+            f"({self.last['rate']} сообщ./с), ошибок {result['failed']}, заблокировали бота {result['blocked']}"
+        )
+        if log:
+            logger.info(summary)
+        else:
+            logger.debug(summary)
+        return self.last
+
+    def stats(self) -> dict:
+        return {
+            'runs': self.runs,
+            'active': self.active,
+            'sent': self.sent,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'retries': self.retries,
+            'flood_waits': self.flood_waits,
+            'last': self.last,
+        }
+
+
+# Один на процесс: лимиты Telegram общие для всех рассылок бота
+broadcaster = Broadcaster()
+
+
+async def broadcast(chat_ids, send, progress=None, name: str = 'рассылка') -> dict:
+    """Разослать send(chat_id) по chat_ids (см. Broadcaster.run)"""
+    return await broadcaster.run(chat_ids, send, progress=progress, name=name)
+
+
+def run_in_background(application, coroutine, name: str = 'broadcast'):
+    """
+    Выполнить рассылку фоном: handler не ждёт её окончания
+
+    Задача выполняется вне единицы работы апдейта — её COMMIT и
+    соединение не ждут конца рассылки
+    """
+    async def runner():
+        current_unit_of_work.set(None)
+        try:
+            await coroutine
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой рассылки {name}: {e}", exc_info=True)
+
+    return application.create_task(runner(), name=name)
+
+
+def get_broadcast_stats() -> dict:
+    """Счётчики рассылок и результат последней"""
+    return broadcaster.stats()
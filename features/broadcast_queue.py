@@ -0,0 +1,324 @@
+# ============================================
+# FILE: features/broadcast_queue.py
+# ============================================
+# Очередь доставки рассылок (таблицы broadcasts / broadcast_deliveries).
+#
+# Рассылка создаётся вместе со строкой pending на каждого
+# зарегистрированного пользователя. deliver_broadcast обрабатывает
+# пачки по BROADCAST_BATCH_SIZE в три шага:
+#   1. короткая транзакция закрепляет пачку за процессом: status =
+#      'sending', lease_until = сейчас + BROADCAST_LEASE (SELECT ...
+#      FOR UPDATE SKIP LOCKED — параллельные процессы берут разные строки);
+#   2. отправка движком features.broadcast — без транзакции, соединения
+#      и блокировок строк;
+#   3. вторая короткая транзакция записывает результат.
+# Если процесс упал посреди пачки, её строки снова забираются после
+# lease_until: повторно могут уйти только сообщения этой пачки.
+#
+# Временные ошибки (сеть, flood control) возвращают получателя в pending
+# не раньше next_attempt_at (BROADCAST_RETRY_DELAY, удваивается с каждой
+# попыткой), пока attempts < BROADCAST_DELIVERY_ATTEMPTS. Отложенные
+# повторы и истёкшие аренды подбирает следующий запуск
+# start_pending_broadcasts (раз в минуту из check_scheduled_posts).
+
+import json
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from config import (
+    TIMEZONE, BROADCAST_BATCH_SIZE, BROADCAST_DELIVERY_ATTEMPTS, BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_LEASE, BROADCAST_RETRY_DELAY,
+)
+from database.async_db import get_db_async
+from database.dialect import skip_locked
+from features.broadcast import broadcaster, run_in_background
+
+logger = logging.getLogger(__name__)
+
+# 'sending' (пачка в работе) в статистике считается вместе с pending
+DELIVERY_STATUSES = ('pending', 'sent', 'failed', 'blocked')
+
+# Рассылки, которые доставляет этот процесс (второй воркер в процессе не нужен)
+_delivering = set()
+
+
+async def enqueue_broadcast(cursor, kind: str, text: str, media_id: str = None, reply_markup=None,
+                            post_id: int = None, created_by: int = None) -> int:
+    """
+    Создать рассылку всем зарегистрированным пользователям
+
+    Выполняется в транзакции вызывающего (COMMIT — за ним), чтобы
+    рассылка появлялась вместе с изменением, которое её вызвало
+    """
+    await cursor.execute('''
+        INSERT INTO broadcasts (kind, post_id, text, media_id, reply_markup, created_by)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
+    ''', (kind, post_id, text, media_id, reply_markup.to_json() if reply_markup else None, created_by))
+    broadcast_id = (await cursor.fetchone())['id']
+    await cursor.execute('''
+        INSERT INTO broadcast_deliveries (broadcast_id, user_id)
+        SELECT %s, user_id FROM users WHERE is_registered = TRUE
+    ''', (broadcast_id,))
+    return broadcast_id
+
+
+async def create_broadcast(kind: str, text: str, media_id: str = None, reply_markup=None,
+                           created_by: int = None) -> int:
+    """Создать рассылку в отдельной транзакции"""
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        broadcast_id = await enqueue_broadcast(
+            cursor, kind, text, media_id=media_id, reply_markup=reply_markup, created_by=created_by
+        )
+        await conn.commit()
+    return broadcast_id
+
+
+def _sender(bot, broadcast: dict):
+    """send(chat_id) для рассылки: фото с подписью или текст, с клавиатурой"""
+    markup = None
+    if broadcast['reply_markup']:
+        markup = InlineKeyboardMarkup.de_json(json.loads(broadcast['reply_markup']), bot)
+
+    if broadcast['media_id']:
+        async def send(chat_id):
+            await bot.send_photo(
+                chat_id=chat_id, photo=broadcast['media_id'], caption=broadcast['text'], reply_markup=markup
+            )
+    else:
+        async def send(chat_id):
+            await bot.send_message(chat_id=chat_id, text=broadcast['text'], reply_markup=markup)
+    return send
+
+
+def _is_transient(error) -> bool:
+    """Ошибку можно повторить позже (сеть, flood control), а не отказ Telegram"""
+    return isinstance(error, (RetryAfter, NetworkError)) and not isinstance(error, BadRequest)
+
+
+def _retry_delay(error, attempts: int) -> float:
+    """Пауза до повтора: экспонента от BROADCAST_RETRY_DELAY, не меньше RetryAfter Telegram"""
+    delay = BROADCAST_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    if isinstance(error, RetryAfter):
+        delay = max(delay, getattr(error.retry_after, 'total_seconds', lambda: error.retry_after)())
+    return delay
+
+
+async def _claim_batch(broadcast_id: int, now: datetime, lease_until: datetime) -> dict:
+    """Закрепить пачку получателей за процессом: {user_id: номер попытки}"""
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        await cursor.execute(f'''
+            UPDATE broadcast_deliveries
+            SET status = 'sending', lease_until = %s, attempts = attempts + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE broadcast_id = %s AND user_id IN (
+                SELECT user_id
+                FROM broadcast_deliveries
+                WHERE broadcast_id = %s
+                  AND attempts < %s
+                  AND (
+                      (status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= %s))
+                      OR (status = 'sending' AND lease_until < %s)
+                  )
+                ORDER BY user_id
+                LIMIT %s
+                {skip_locked()}
+            )
+            RETURNING user_id, attempts
+        ''', (lease_until, broadcast_id, broadcast_id, BROADCAST_DELIVERY_ATTEMPTS, now, now,
+              BROADCAST_BATCH_SIZE))
+        claimed = {row['user_id']: row['attempts'] for row in await cursor.fetchall()}
+        await conn.commit()
+    return claimed
+
+
+async def _deliver_batch(broadcast_id: int, send) -> int:
+    """Забрать, отправить и отметить одну пачку; 0 — свободных получателей нет"""
+    now = datetime.now(timezone.utc)
+    lease_until = now + timedelta(seconds=BROADCAST_LEASE)
+    claimed = await _claim_batch(broadcast_id, now, lease_until)
+    if not claimed:
+        return 0
+
+    results = []
+
+    def on_result(chat_id, status, error):
+        attempts = claimed[chat_id]
+        next_attempt_at = None
+        if status == 'failed' and _is_transient(error) and attempts < BROADCAST_DELIVERY_ATTEMPTS:
+            status = 'pending'
+            next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=_retry_delay(error, attempts))
+        results.append((status, str(error)[:500] if error else None, next_attempt_at,
+                        broadcast_id, chat_id, lease_until))
+
+    # Соединение и блокировки на время отправки не держатся: строки пачки
+    # защищены арендой до lease_until
+    await broadcaster.run(list(claimed), send, on_result=on_result, name=f"Рассылка {broadcast_id}", log=False)
+
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        # lease_until = своя аренда: строки, которые после её истечения забрал
+        # другой процесс, не перезаписываются
+        await cursor.executemany('''
+            UPDATE broadcast_deliveries
+            SET status = %s, error = %s, next_attempt_at = %s, lease_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE broadcast_id = %s AND user_id = %s AND status = 'sending' AND lease_until = %s
+        ''', results)
+        await conn.commit()
+    return len(claimed)
+
+
+async def _finish_broadcast(broadcast_id: int):
+    """Закрыть рассылку, если недоставленных получателей не осталось (и отметить пост отправленным)"""
+    now = datetime.now(timezone.utc)
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        # Аренда истекла, а попытки исчерпаны — получатель больше не будет забран
+        await cursor.execute('''
+            UPDATE broadcast_deliveries
+            SET status = 'failed', error = 'lease expired', lease_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE broadcast_id = %s AND status = 'sending' AND lease_until < %s AND attempts >= %s
+        ''', (broadcast_id, now, BROADCAST_DELIVERY_ATTEMPTS))
+        await cursor.execute('''
+            UPDATE broadcasts
+            SET status = 'done', finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+              AND status = 'sending'
+              AND NOT EXISTS (
+                  SELECT 1 FROM broadcast_deliveries
+                  WHERE broadcast_id = %s AND status IN ('pending', 'sending')
+              )
+            RETURNING post_id
+        ''', (broadcast_id, broadcast_id))
+        row = await cursor.fetchone()
+        if row and row['post_id']:
+            await cursor.execute('''
+                UPDATE posts
+                SET status = 'sent', sent_at = %s
+                WHERE id = %s
+            ''', (datetime.now(TIMEZONE), row['post_id']))
+        await conn.commit()
+
+
+async def deliver_broadcast(bot, broadcast_id: int, progress=None) -> dict:
+    """
+    Доставить рассылку (с неотправленных получателей)
+
+    progress — async callback(stats) не чаще раза в BROADCAST_PROGRESS_INTERVAL секунд
+
+    Returns:
+        get_delivery_stats(broadcast_id) или None, если рассылку уже доставляет этот процесс
+    """
+    if broadcast_id in _delivering:
+        return None
+    _delivering.add(broadcast_id)
+    try:
+        async with get_db_async() as conn:
+            cursor = conn.cursor()
+            await cursor.execute('''
+                SELECT id, kind, text, media_id, reply_markup, status
+                FROM broadcasts
+                WHERE id = %s
+            ''', (broadcast_id,))
+            broadcast = await cursor.fetchone()
+        if broadcast is None:
+            return None
+
+        if broadcast['status'] == 'sending':
+            send = _sender(bot, broadcast)
+            reported = time.monotonic()
+            while await _deliver_batch(broadcast_id, send):
+                if progress and time.monotonic() - reported >= BROADCAST_PROGRESS_INTERVAL:
+                    reported = time.monotonic()
+                    try:
+                        await progress(await get_delivery_stats(broadcast_id))
+                    except Exception as e:
+                        logger.warning(f"⚠️ Ошибка отчёта о ходе рассылки {broadcast_id}: {e}")
+            await _finish_broadcast(broadcast_id)
+    finally:
+        _delivering.discard(broadcast_id)
+
+    stats = await get_delivery_stats(broadcast_id)
+    logger.info(
+        f"📢 Рассылка {broadcast_id} ({broadcast['kind']}): отправлено {stats['sent']}/{stats['total']}, "
+        f"ошибок {stats['failed']}, заблокировали бота {stats['blocked']}, в очереди {stats['pending']}"
+    )
+    return stats
+
+
+async def start_pending_broadcasts(application) -> int:
+    """
+    Запустить фоном доставку незавершённых рассылок (новых и прерванных
+    рестартом); возвращает число запущенных
+
+    Вызывающий (job автопостов) не ждёт доставки: большая рассылка не
+    задерживает следующие запуски job. Рассылки доставляются параллельно,
+    общий лимит Telegram соблюдает broadcaster
+    """
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        await cursor.execute("SELECT id FROM broadcasts WHERE status = 'sending' ORDER BY id")
+        rows = await cursor.fetchall()
+
+    started = 0
+    for row in rows:
+        if row['id'] in _delivering:
+            continue
+        run_in_background(
+            application, deliver_broadcast(application.bot, row['id']), name=f"broadcast_{row['id']}"
+        )
+        started += 1
+    return started
+
+
+def _count_statuses(rows) -> dict:
+    stats = {status: 0 for status in DELIVERY_STATUSES}
+    for row in rows:
+        status = 'pending' if row['status'] == 'sending' else row['status']
+        stats[status] = stats.get(status, 0) + row['n']
+    stats['total'] = sum(stats[status] for status in DELIVERY_STATUSES)
+    return stats
+
+
+async def get_delivery_stats(broadcast_id: int) -> dict:
+    """Число получателей рассылки по статусам: total, pending, sent, failed, blocked"""
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        await cursor.execute('''
+            SELECT status, COUNT(*) AS n
+            FROM broadcast_deliveries
+            WHERE broadcast_id = %s
+            GROUP BY status
+        ''', (broadcast_id,))
+        return _count_statuses(await cursor.fetchall())
+
+
+async def get_post_delivery_stats(post_ids) -> dict:
+    """Статистика доставки постов: {post_id: get_delivery_stats}"""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    async with get_db_async() as conn:
+        cursor = conn.cursor()
+        await cursor.execute(f'''
+            SELECT b.post_id, d.status, COUNT(*) AS n
+            FROM broadcasts b
+            JOIN broadcast_deliveries d ON d.broadcast_id = b.id
+            WHERE b.post_id IN ({placeholders})
+            GROUP BY b.post_id, d.status
+        ''', tuple(post_ids))
+        rows = await cursor.fetchall()
+
+    by_post = {}
+    for row in rows:
+        by_post.setdefault(row['post_id'], []).append(row)
+    return {post_id: _count_statuses(post_rows) for post_id, post_rows in by_post.items()}
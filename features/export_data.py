@@ -9,7 +9,8 @@ import io
 import logging
 
 from config import TIMEZONE
-from database.db_manager import get_db
+from database.async_db import get_db_async
+from database.workloads import workload_class, EXPORT
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ def get_local_time():
     return datetime.now(TIMEZONE)
 
 
+@workload_class(EXPORT)
 async def export_presence_data(update, context, period='today', event_id=None):
     """Экспорт данных о присутствии в Excel"""
     query = update.callback_query
@@ -41,14 +43,14 @@ async def export_presence_data(update, context, period='today', event_id=None):
         period_name = "За месяц"
     elif period == 'event' and event_id:
         # Экспорт по мероприятию
-        with get_db() as conn:
+        async with get_db_async(readonly=True) as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            await cursor.execute('''
                 SELECT name, start_time, end_time
                 FROM events
                 WHERE id = %s
             ''', (event_id,))
-            event = cursor.fetchone()
+            event = await cursor.fetchone()
             
             if not event:
                 await query.message.reply_text("❌ Мероприятие не найдено.")
@@ -57,11 +59,11 @@ async def export_presence_data(update, context, period='today', event_id=None):
             period_name = event['name']
     
     # Получаем данные
-    with get_db() as conn:
+    async with get_db_async(readonly=True) as conn:
         cursor = conn.cursor()
         
         if event_id:
-            cursor.execute('''
+            await cursor.execute('''
                 SELECT 
                     u.first_name,
                     u.last_name,
@@ -78,7 +80,7 @@ async def export_presence_data(update, context, period='today', event_id=None):
                 ORDER BY p.check_in_time
             ''', (event_id,))
         else:
-            cursor.execute('''
+            await cursor.execute('''
                 SELECT 
                     u.first_name,
                     u.last_name,
@@ -96,7 +98,7 @@ async def export_presence_data(update, context, period='today', event_id=None):
                 ORDER BY p.check_in_time DESC
             ''', (start_date, end_date))
         
-        data = cursor.fetchall()
+        data = await cursor.fetchall()
     
     if not data:
         await query.message.reply_text(
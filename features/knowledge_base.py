@@ -6,22 +6,22 @@ from telegram import Update
 from telegram.ext import ContextTypes
 import logging
 
-from database.db_manager import get_db
+from database.async_db import get_db_async
 
 logger = logging.getLogger(__name__)
 
 
 async def upload_to_kb(user_id: int, title: str, file_id: str, file_type: str = 'document'):
     """Загрузить файл в базу знаний"""
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO knowledge_base (title, file_id, file_type, uploaded_by)
             VALUES (%s, %s, %s, %s)
             RETURNING id
         ''', (title, file_id, file_type, user_id))
-        kb_id = cursor.fetchone()['id']
-        conn.commit()
+        kb_id = (await cursor.fetchone())['id']
+        await conn.commit()
     
     return kb_id
 
@@ -35,14 +35,14 @@ async def handle_kb_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     file_id = int(query.data.replace('kb_file_', ''))
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT file_id, title, file_type
             FROM knowledge_base
             WHERE id = %s
         ''', (file_id,))
-        file = cursor.fetchone()
+        file = await cursor.fetchone()
     
     if not file:
         await query.answer("❌ Файл не найден", show_alert=True)
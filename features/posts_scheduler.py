@@ -7,7 +7,8 @@ from datetime import datetime
 import logging
 
 from config import TIMEZONE
-from database.db_manager import get_db
+from database.async_db import get_db_async
+from features.broadcast_queue import enqueue_broadcast, start_pending_broadcasts
 
 logger = logging.getLogger(__name__)
 
@@ -16,72 +17,45 @@ async def check_scheduled_posts(context: ContextTypes.DEFAULT_TYPE):
     """Проверка и отправка запланированных постов"""
     now = datetime.now(TIMEZONE)
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT id, text, media_id, event_id
-            FROM posts
+        # Пост забирается одним UPDATE вместе с созданием рассылки:
+        # другой процесс бота и следующий запуск его уже не возьмут
+        await cursor.execute('''
+            UPDATE posts
+            SET status = 'sending'
             WHERE status = 'pending'
               AND scheduled_time <= %s
+            RETURNING id, text, media_id, created_by
         ''', (now,))
-        
-        posts = cursor.fetchall()
-        
-        if not posts:
-            return
-        
-        cursor.execute('''
-            SELECT user_id
-            FROM users
-            WHERE is_registered = TRUE
-        ''')
-        users = cursor.fetchall()
-        
-        bot = context.bot
+        posts = await cursor.fetchall()
         
         for post in posts:
-            success_count = 0
-            fail_count = 0
-            
-            for user in users:
-                try:
-                    if post['media_id']:
-                        await bot.send_photo(
-                            chat_id=user['user_id'],
-                            photo=post['media_id'],
-                            caption=post['text']
-                        )
-                    else:
-                        await bot.send_message(
-                            chat_id=user['user_id'],
-                            text=post['text']
-                        )
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Ошибка отправки поста пользователю {user['user_id']}: {e}")
-                    fail_count += 1
-            
-            cursor.execute('''
-                UPDATE posts
-                SET status = 'sent', sent_at = %s
-                WHERE id = %s
-            ''', (now, post['id']))
-            conn.commit()
-            
-            logger.info(f"Пост {post['id']} отправлен: успешно {success_count}, ошибок {fail_count}")
+            await enqueue_broadcast(
+                cursor, 'post', post['text'], media_id=post['media_id'],
+                post_id=post['id'], created_by=post['created_by']
+            )
+        await conn.commit()
+    
+    for post in posts:
+        logger.info(f"Пост {post['id']} поставлен в очередь рассылки")
+    
+    # Новые посты и рассылки, прерванные рестартом или деплоем, — фоном:
+    # job заканчивается сразу и не пропускает следующие запуски
+    await start_pending_broadcasts(context.application)
 
 
 async def create_post(user_id: int, text: str, media_id: str, scheduled_time: datetime, event_id: int = None):
     """Создать новый пост"""
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO posts (created_by, text, media_id, scheduled_time, event_id)
             VALUES (%s, %s, %s, %s, %s)
             RETURNING id
         ''', (user_id, text, media_id, scheduled_time, event_id))
-        post_id = cursor.fetchone()['id']
-        conn.commit()
+        post_id = (await cursor.fetchone())['id']
+        await conn.commit()
     
     return post_id
@@ -8,12 +8,17 @@ from datetime import datetime, timezone
 import logging
 
 from config import TIMEZONE, States
-from database.db_manager import get_db
-from database.models import get_user_profile
+from database.async_db import get_db_async
+from database.dialect import latest_row_join
+from database.geo_buffer import apply_pending_geolocation
+from database.async_models import get_user_profile
+from database.models import invalidate_active_event
 from utils.keyboards import get_admin_keyboard, get_export_keyboard, get_main_keyboard
 from utils.decorators import admin_only, admin_callback_only
 from features.posts_scheduler import create_post
 from features.knowledge_base import upload_to_kb
+from features.broadcast import run_in_background
+from features.broadcast_queue import get_post_delivery_stats
 from handlers.contests import start_photo_contest, view_contest_photos, end_photo_contest
 
 logger = logging.getLogger(__name__)
@@ -62,15 +67,24 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await view_contest_photos(update, context)
     elif data in ('admin_contest_end', 'admin_contest_delete'):
         if data == 'admin_contest_end':
-            # Завершение конкурса вручную (с безопасной обработкой)
-            try:
-                await end_photo_contest(context)
-                await query.message.reply_text("🏁 Конкурс завершён. Итоги отправлены участникам (если были фото).")
-            except Exception as e:
+            # Завершение конкурса вручную (с безопасной обработкой);
+            # фоном — рассылка итогов не держит транзакцию апдейта
+            async def finish_contest():
                 try:
-                    await query.message.reply_text(f"❌ Ошибка завершения конкурса: {e}")
-                except Exception:
-                    pass
+                    result = await end_photo_contest(context)
+                    if result:
+                        await query.message.reply_text(
+                            f"🏁 Конкурс завершён. Итоги отправлены участникам: {result['sent']}/{result['total']}."
+                        )
+                    else:
+                        await query.message.reply_text("🏁 Конкурс завершён (фото не было или он уже закрыт).")
+                except Exception as e:
+                    try:
+                        await query.message.reply_text(f"❌ Ошибка завершения конкурса: {e}")
+                    except Exception:
+                        pass
+            
+            run_in_background(context.application, finish_contest(), name='contest_end')
         else:
             from handlers.contests import admin_contest_delete
             await admin_contest_delete(update, context)
@@ -91,10 +105,10 @@ async def show_monitoring(query, context):
     """Мониторинг присутствия"""
     today = get_local_time().date()
     
-    with get_db() as conn:
+    async with get_db_async(readonly=True) as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
+        await cursor.execute('''
             SELECT 
                 u.user_id,
                 u.first_name,
@@ -111,7 +125,7 @@ async def show_monitoring(query, context):
             ORDER BY p.check_in_time DESC
         ''', (today,))
         
-        active_users = cursor.fetchall()
+        active_users = await cursor.fetchall()
     
     if not active_users:
         text = "📊 **Мониторинг присутствия**\n\nСейчас никого нет в кампусе."
@@ -155,13 +169,13 @@ async def show_photo_contest_menu(query):
     """Подменю конкурса фото"""
     # Проверим, есть ли активный конкурс на сегодня
     end_info = None
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT end_time, is_closed FROM photo_contest_schedule
             WHERE contest_date = CURRENT_DATE
         ''')
-        end_info = cursor.fetchone()
+        end_info = await cursor.fetchone()
     keyboard = [
         [InlineKeyboardButton("🚀 Запустить конкурс", callback_data='admin_contest_start')],
         [InlineKeyboardButton("🖼 Посмотреть фото", callback_data='admin_contest_view')],
@@ -186,10 +200,10 @@ async def show_photo_contest_menu(query):
 
 async def show_events_archive(query, context):
     """Архив мероприятий"""
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id, name, start_time, end_time
             FROM events
             WHERE end_time < CURRENT_TIMESTAMP
@@ -197,7 +211,7 @@ async def show_events_archive(query, context):
             LIMIT 20
         ''')
         
-        events = cursor.fetchall()
+        events = await cursor.fetchall()
     
     if not events:
         text = "📋 **Архив мероприятий**\n\nПока нет завершенных мероприятий."
@@ -251,19 +265,19 @@ async def handle_profile_view(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     user_id = int(query.data.replace('admin_profile_', ''))
     
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
+        await cursor.execute('''
             SELECT check_in_time, check_out_time, latitude, longitude
             FROM presence
             WHERE user_id = %s
             ORDER BY check_in_time DESC
             LIMIT 1
         ''', (user_id,))
-        last_presence = cursor.fetchone()
+        last_presence = await cursor.fetchone()
     
     text = f"""
 👤 **Профиль участника**
@@ -318,17 +332,17 @@ async def handle_event_details(update: Update, context: ContextTypes.DEFAULT_TYP
     
     event_id = int(query.data.replace('admin_event_', ''))
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
+        await cursor.execute('''
             SELECT name, start_time, end_time, description
             FROM events
             WHERE id = %s
         ''', (event_id,))
-        event = cursor.fetchone()
+        event = await cursor.fetchone()
         
-        cursor.execute('''
+        await cursor.execute('''
             SELECT 
                 u.first_name,
                 u.last_name,
@@ -340,7 +354,7 @@ async def handle_event_details(update: Update, context: ContextTypes.DEFAULT_TYP
             WHERE p.event_id = %s
             ORDER BY p.check_in_time
         ''', (event_id,))
-        participants = cursor.fetchall()
+        participants = await cursor.fetchall()
     
     start = event['start_time']
     end = event['end_time']
@@ -402,10 +416,10 @@ async def handle_event_details(update: Update, context: ContextTypes.DEFAULT_TYP
 # ===============================
 async def show_all_registered_users(query):
     """Показать всех зарегистрированных пользователей с ключевой информацией и координатами."""
-    from database.db_manager import get_db
-    with get_db() as conn:
+    from database.async_db import get_db_async
+    async with get_db_async(readonly=True) as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute(f'''
             SELECT 
                 u.user_id,
                 u.first_name,
@@ -421,15 +435,16 @@ async def show_all_registered_users(query):
                 g.longitude,
                 g.timestamp as geo_ts
             FROM users u
-            LEFT JOIN (
-                SELECT DISTINCT ON (user_id) user_id, latitude, longitude, timestamp
-                FROM geolocation
-                ORDER BY user_id, timestamp DESC
-            ) g ON u.user_id = g.user_id
+            {latest_row_join(
+                'g', 'geolocation', 'latitude, longitude, timestamp',
+                where='user_id = u.user_id',
+                order_by='timestamp DESC'
+            )}
             WHERE u.is_registered = TRUE
             ORDER BY u.first_name, u.last_name
         ''')
-        rows = cursor.fetchall()
+        rows = await cursor.fetchall()
+    apply_pending_geolocation(rows, latitude='latitude', longitude='longitude', timestamp='geo_ts')
     if not rows:
         await query.edit_message_text(
             "📝 Зарегистрированных пользователей пока нет.",
@@ -607,15 +622,16 @@ async def admin_event_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if desc.lower() in ('пропустить', 'skip', 'нет'):
         desc = None
     data = context.user_data['admin_event']
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO events (name, start_time, end_time, description, created_by)
             VALUES (%s, %s, %s, %s, %s)
             RETURNING id
         ''', (data['name'], data['start'], data['end'], desc, update.effective_user.id))
-        event_id = cursor.fetchone()['id']
-        conn.commit()
+        event_id = (await cursor.fetchone())['id']
+        await conn.commit()
+        invalidate_active_event()
     # Планируем уведомление всем пользователям через 5 минут
     try:
         if context.job_queue:
@@ -640,15 +656,15 @@ async def admin_posts_manage_start(update: Update, context: ContextTypes.DEFAULT
     return await _render_posts_list(query, context)
 
 async def _render_posts_list(query, context):
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id, text, scheduled_time, status
             FROM posts
             ORDER BY scheduled_time DESC
             LIMIT 20
         ''')
-        posts = cursor.fetchall()
+        posts = await cursor.fetchall()
     if not posts:
         await query.edit_message_text(
             "🗂 Постов пока нет.",
@@ -657,6 +673,8 @@ async def _render_posts_list(query, context):
         return States.ADMIN_POST_MANAGE
     text = "🗂 Управление постами (последние 20):\n\n"
     keyboard = []
+    # Доставка по получателям (очередь рассылки, см. features/broadcast_queue.py)
+    delivery = await get_post_delivery_stats(p['id'] for p in posts)
     from config import TIMEZONE
     from datetime import timezone as dt_tz
     for p in posts:
@@ -669,6 +687,13 @@ async def _render_posts_list(query, context):
         keyboard.append([
             InlineKeyboardButton(f"#{p['id']} • {when} • {status}", callback_data='noop')
         ])
+        stats = delivery.get(p['id'])
+        if stats:
+            text += (
+                f"#{p['id']} {text_part}\n"
+                f"   ✅ {stats['sent']}/{stats['total']} • ⏳ {stats['pending']} • "
+                f"⚠️ {stats['failed']} • 🚫 {stats['blocked']}\n"
+            )
         keyboard.append([
             InlineKeyboardButton("✏️ Текст", callback_data=f"post_edit_text_{p['id']}"),
             InlineKeyboardButton("🕐 Время", callback_data=f"post_edit_time_{p['id']}"),
@@ -684,10 +709,10 @@ async def admin_posts_manage_cb(update: Update, context: ContextTypes.DEFAULT_TY
     data = query.data
     if data.startswith('post_delete_'):
         post_id = int(data.replace('post_delete_', ''))
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM posts WHERE id = %s', (post_id,))
-            conn.commit()
+            await cursor.execute('DELETE FROM posts WHERE id = %s', (post_id,))
+            await conn.commit()
         await query.answer("Удалено", show_alert=False)
         return await _render_posts_list(query, context)
     elif data.startswith('post_edit_text_'):
@@ -714,10 +739,10 @@ async def admin_post_edit_text_input(update: Update, context: ContextTypes.DEFAU
     if len(new_text) < 1:
         await update.message.reply_text("❌ Текст пуст. Введите заново:")
         return States.ADMIN_POST_EDIT_TEXT
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE posts SET text = %s WHERE id = %s', (new_text, post_id))
-        conn.commit()
+        await cursor.execute('UPDATE posts SET text = %s WHERE id = %s', (new_text, post_id))
+        await conn.commit()
     await update.message.reply_text("✅ Текст поста обновлён.")
     # Обновим список
     context.user_data.pop('edit_post_id', None)
@@ -735,10 +760,10 @@ async def admin_post_edit_time_input(update: Update, context: ContextTypes.DEFAU
     if not dt:
         await update.message.reply_text("❌ Неверный формат. ДД.ММ.ГГГГ ЧЧ:ММ:")
         return States.ADMIN_POST_EDIT_TIME
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE posts SET scheduled_time = %s, status = CASE WHEN status = \'sent\' THEN status ELSE \'pending\' END WHERE id = %s', (dt, post_id))
-        conn.commit()
+        await cursor.execute('UPDATE posts SET scheduled_time = %s, status = CASE WHEN status IN (\'sent\', \'sending\') THEN status ELSE \'pending\' END WHERE id = %s', (dt, post_id))
+        await conn.commit()
     await update.message.reply_text("✅ Время публикации обновлено.")
     context.user_data.pop('edit_post_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗂 Управление постами")
@@ -805,16 +830,16 @@ async def admin_events_manage_start(update: Update, context: ContextTypes.DEFAUL
     return await _render_events_list(query, context)
 
 async def _render_events_list(query, context):
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id, name, start_time, end_time
             FROM events
             WHERE end_time >= CURRENT_TIMESTAMP
             ORDER BY start_time
             LIMIT 20
         ''')
-        events = cursor.fetchall()
+        events = await cursor.fetchall()
     if not events:
         await query.edit_message_text(
             "🗓 Нет предстоящих мероприятий.",
@@ -850,10 +875,11 @@ async def admin_events_manage_cb(update: Update, context: ContextTypes.DEFAULT_T
     data = query.data
     if data.startswith('event_delete_'):
         event_id = int(data.replace('event_delete_', ''))
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM events WHERE id = %s', (event_id,))
-            conn.commit()
+            await cursor.execute('DELETE FROM events WHERE id = %s', (event_id,))
+            await conn.commit()
+            invalidate_active_event()
         await query.answer("Удалено", show_alert=False)
         return await _render_events_list(query, context)
     elif data.startswith('event_edit_name_'):
@@ -888,10 +914,11 @@ async def admin_event_edit_name_input(update: Update, context: ContextTypes.DEFA
     if len(name) < 3:
         await update.message.reply_text("❌ Слишком коротко. Введите снова:")
         return States.ADMIN_EVENT_EDIT_NAME
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE events SET name = %s WHERE id = %s', (name, event_id))
-        conn.commit()
+        await cursor.execute('UPDATE events SET name = %s WHERE id = %s', (name, event_id))
+        await conn.commit()
+        invalidate_active_event()
     await update.message.reply_text("✅ Название обновлено.")
     context.user_data.pop('edit_event_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗓 Управление мероприятиями")
@@ -904,10 +931,11 @@ async def admin_event_edit_desc_input(update: Update, context: ContextTypes.DEFA
     desc = update.message.text.strip()
     if desc.lower() in ('пропустить', 'skip'):
         desc = None
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE events SET description = %s WHERE id = %s', (desc, event_id))
-        conn.commit()
+        await cursor.execute('UPDATE events SET description = %s WHERE id = %s', (desc, event_id))
+        await conn.commit()
+        invalidate_active_event()
     await update.message.reply_text("✅ Описание обновлено.")
     context.user_data.pop('edit_event_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗓 Управление мероприятиями")
@@ -921,10 +949,11 @@ async def admin_event_edit_start_input(update: Update, context: ContextTypes.DEF
     if not dt:
         await update.message.reply_text("❌ Неверный формат. ДД.ММ.ГГГГ ЧЧ:ММ:")
         return States.ADMIN_EVENT_EDIT_START
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE events SET start_time = %s WHERE id = %s', (dt, event_id))
-        conn.commit()
+        await cursor.execute('UPDATE events SET start_time = %s WHERE id = %s', (dt, event_id))
+        await conn.commit()
+        invalidate_active_event()
     await update.message.reply_text("✅ Время начала обновлено.")
     context.user_data.pop('edit_event_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗓 Управление мероприятиями")
@@ -938,10 +967,11 @@ async def admin_event_edit_end_input(update: Update, context: ContextTypes.DEFAU
     if not dt:
         await update.message.reply_text("❌ Неверный формат. ДД.ММ.ГГГГ ЧЧ:ММ:")
         return States.ADMIN_EVENT_EDIT_END
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE events SET end_time = %s WHERE id = %s', (dt, event_id))
-        conn.commit()
+        await cursor.execute('UPDATE events SET end_time = %s WHERE id = %s', (dt, event_id))
+        await conn.commit()
+        invalidate_active_event()
     await update.message.reply_text("✅ Время окончания обновлено.")
     context.user_data.pop('edit_event_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗓 Управление мероприятиями")
@@ -956,15 +986,15 @@ async def admin_kb_manage_start(update: Update, context: ContextTypes.DEFAULT_TY
     return await _render_kb_list(query, context)
 
 async def _render_kb_list(query, context):
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id, title, file_type
             FROM knowledge_base
             ORDER BY upload_time DESC
             LIMIT 20
         ''')
-        files = cursor.fetchall()
+        files = await cursor.fetchall()
     if not files:
         await query.edit_message_text(
             "📚 База знаний пуста.",
@@ -989,10 +1019,10 @@ async def admin_kb_manage_cb(update: Update, context: ContextTypes.DEFAULT_TYPE)
     data = query.data
     if data.startswith('kb_delete_'):
         kb_id = int(data.replace('kb_delete_', ''))
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM knowledge_base WHERE id = %s', (kb_id,))
-            conn.commit()
+            await cursor.execute('DELETE FROM knowledge_base WHERE id = %s', (kb_id,))
+            await conn.commit()
         await query.answer("Удалено", show_alert=False)
         return await _render_kb_list(query, context)
     elif data.startswith('kb_rename_'):
@@ -1012,10 +1042,10 @@ async def admin_kb_rename_input(update: Update, context: ContextTypes.DEFAULT_TY
     if len(title) < 1:
         await update.message.reply_text("❌ Пустое имя. Введите снова:")
         return States.ADMIN_KB_RENAME
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('UPDATE knowledge_base SET title = %s WHERE id = %s', (title, kb_id))
-        conn.commit()
+        await cursor.execute('UPDATE knowledge_base SET title = %s WHERE id = %s', (title, kb_id))
+        await conn.commit()
     await update.message.reply_text("✅ Имя обновлено.")
     context.user_data.pop('rename_kb_id', None)
     await update.message.reply_text("Откройте снова: 🔧 Админ-панель → 🗃 Управление Базой знаний")
@@ -9,10 +9,12 @@ from geopy.distance import geodesic
 import logging
 
 from config import CAMPUS_LATITUDE, CAMPUS_LONGITUDE, PROXIMITY_RADIUS, TIMEZONE
-from database.db_manager import get_db
-from database.models import increment_checkins, get_active_event, is_user_admin
+from database.async_db import get_db_async
+from database.async_models import check_in_user, get_open_presence, get_user_profile, is_user_admin
+from database.geo_buffer import enqueue_geolocation
 from utils.keyboards import get_main_keyboard
 from utils.decorators import registered_only
+from utils.view_cache import invalidate_views
 
 logger = logging.getLogger(__name__)
 
@@ -27,37 +29,29 @@ async def request_checkin_location(update: Update, context: ContextTypes.DEFAULT
     """Запрос геолокации для check-in"""
     user_id = update.effective_user.id
     
-    # Проверяем geo_consent
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT geo_consent FROM users WHERE user_id = %s', (user_id,))
-        result = cursor.fetchone()
-        
-        if not result or not result['geo_consent']:
-            is_admin = is_user_admin(user_id)
-            await update.message.reply_text(
-                "❌ Для отметки в кампусе необходимо разрешение на использование геолокации.\n\n"
-                "Перейдите в ⚙️ Настройки и включите геолокацию.",
-                reply_markup=get_main_keyboard(is_admin)
-            )
-            return
+    # Проверяем geo_consent (профиль из кэша)
+    profile = await get_user_profile(user_id)
+    
+    if not profile or not profile['geo_consent']:
+        is_admin = await is_user_admin(user_id)
+        await update.message.reply_text(
+            "❌ Для отметки в кампусе необходимо разрешение на использование геолокации.\n\n"
+            "Перейдите в ⚙️ Настройки и включите геолокацию.",
+            reply_markup=get_main_keyboard(is_admin)
+        )
+        return
     
     # Проверяем, не отмечен ли уже сегодня
     today = get_local_time().date()
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM presence
-            WHERE user_id = %s AND date = %s AND status = 'in_campus'
-        ''', (user_id, today))
+    already_checked_in = await get_open_presence(user_id, today)
         
-        if cursor.fetchone():
-            is_admin = is_user_admin(user_id)
-            await update.message.reply_text(
-                "✅ Вы уже отмечены в кампусе сегодня!",
-                reply_markup=get_main_keyboard(is_admin)
-            )
-            return
+    if already_checked_in:
+        is_admin = await is_user_admin(user_id)
+        await update.message.reply_text(
+            "✅ Вы уже отмечены в кампусе сегодня!",
+            reply_markup=get_main_keyboard(is_admin)
+        )
+        return
     
     # Создаём кнопку для отправки геолокации
     keyboard = [
@@ -97,7 +91,7 @@ async def handle_checkin_location(update: Update, context: ContextTypes.DEFAULT_
     
     # Проверяем расстояние (должно быть <= 300м)
     if distance > PROXIMITY_RADIUS:
-        is_admin = is_user_admin(user_id)
+        is_admin = await is_user_admin(user_id)
         await update.message.reply_text(
             f"❌ Вы находитесь слишком далеко от кампуса!\n\n"
             f"📏 Расстояние: {int(distance)} метров\n"
@@ -107,39 +101,30 @@ async def handle_checkin_location(update: Update, context: ContextTypes.DEFAULT_
         )
         return
     
-    # Успешный check-in
+    # Check-in одним атомарным вызовом: согласие, дубли, запись, счётчик и ранг
     now = get_local_time()
-    today = now.date()
+    is_near = distance <= 1000  # NEAR_CAMPUS_RADIUS
+    result = await check_in_user(
+        user_id, now, now.date(),
+        location.latitude, location.longitude, distance, is_near
+    )
     
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Получаем активное мероприятие (если есть)
-        active_event = get_active_event()
-        event_id = active_event['id'] if active_event else None
-        
-        # Создаём запись о присутствии
-        cursor.execute('''
-            INSERT INTO presence (
-                user_id, event_id, check_in_time, date, status,
-                latitude, longitude
-            )
-            VALUES (%s, %s, %s, %s, 'in_campus', %s, %s)
-        ''', (user_id, event_id, now, today, location.latitude, location.longitude))
-        
-        # Сохраняем геолокацию
-        is_near = distance <= 1000  # NEAR_CAMPUS_RADIUS
-        cursor.execute('''
-            INSERT INTO geolocation (
-                user_id, latitude, longitude, distance_to_campus, is_near_campus
-            )
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (user_id, location.latitude, location.longitude, distance, is_near))
-        
-        conn.commit()
+    if result['result'] == 'no_consent':
+        await update.message.reply_text(
+            "❌ Для отметки в кампусе необходимо разрешение на использование геолокации.\n\n"
+            "Перейдите в ⚙️ Настройки и включите геолокацию.",
+            reply_markup=get_main_keyboard(result['is_admin'])
+        )
+        return
     
-    # Увеличиваем счётчик и проверяем ранг
-    new_rank = increment_checkins(user_id)
+    if result['result'] == 'already_checked_in':
+        await update.message.reply_text(
+            "✅ Вы уже отмечены в кампусе сегодня!",
+            reply_markup=get_main_keyboard(result['is_admin'])
+        )
+        return
+    
+    invalidate_views()
     
     # Формируем сообщение
     message = f"""
@@ -149,21 +134,17 @@ async def handle_checkin_location(update: Update, context: ContextTypes.DEFAULT_
 🕐 Время: {now.strftime('%H:%M')}
     """
     
-    if active_event:
-        message += f"\n🎯 Мероприятие: {active_event['name']}"
+    if result['event_name']:
+        message += f"\n🎯 Мероприятие: {result['event_name']}"
     
     # Если повысился ранг
-    if new_rank:
-        # Получаем emoji ранга
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT emoji FROM ranks WHERE name = %s', (new_rank,))
-            emoji = cursor.fetchone()['emoji']
-        
-        message += f"\n\n🎉 **Поздравляем!**\n{emoji} Вы получили новый ранг: **{new_rank}**!"
+    if result['rank_changed']:
+        message += (
+            f"\n\n🎉 **Поздравляем!**\n{result['rank_emoji']} "
+            f"Вы получили новый ранг: **{result['current_rank']}**!"
+        )
     
-    is_admin = is_user_admin(user_id)
-    await update.message.reply_text(message, reply_markup=get_main_keyboard(is_admin))
+    await update.message.reply_text(message, reply_markup=get_main_keyboard(result['is_admin']))
 
 
 @registered_only
@@ -173,43 +154,39 @@ async def checkout(update: Update, context: ContextTypes.DEFAULT_TYPE):
     now = get_local_time()
     today = now.date()
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        # Находим активную отметку
-        cursor.execute('''
-            SELECT id, check_in_time FROM presence
-            WHERE user_id = %s AND date = %s AND status = 'in_campus'
-            ORDER BY check_in_time DESC LIMIT 1
-        ''', (user_id, today))
-        
-        record = cursor.fetchone()
-        
-        if not record:
-            is_admin = is_user_admin(user_id)
-            await update.message.reply_text(
-                "❌ Вы не отмечены в кампусе!",
-                reply_markup=get_main_keyboard(is_admin)
-            )
-            return
-        
-        # Обновляем запись
-        cursor.execute('''
+        # Закрываем открытую сессию одним UPDATE: повторный вызов ничего не меняет
+        await cursor.execute('''
             UPDATE presence
             SET check_out_time = %s, status = 'left'
-            WHERE id = %s
-        ''', (now, record['id']))
-        conn.commit()
-        
-        # Рассчитываем время пребывания
-        check_in = record['check_in_time']
-        if check_in.tzinfo is None:
-            check_in = check_in.replace(tzinfo=timezone.utc)
-        duration = now - check_in.astimezone(TIMEZONE)
-        hours = int(duration.total_seconds() // 3600)
-        minutes = int((duration.total_seconds() % 3600) // 60)
+            WHERE user_id = %s AND date = %s AND status = 'in_campus'
+            RETURNING id, check_in_time
+        ''', (now, user_id, today))
         
-    is_admin = is_user_admin(user_id)
+        record = await cursor.fetchone()
+        await conn.commit()
+    
+    if not record:
+        is_admin = await is_user_admin(user_id)
+        await update.message.reply_text(
+            "❌ Вы не отмечены в кампусе!",
+            reply_markup=get_main_keyboard(is_admin)
+        )
+        return
+    
+    invalidate_views()
+    
+    # Рассчитываем время пребывания
+    check_in = record['check_in_time']
+    if check_in.tzinfo is None:
+        check_in = check_in.replace(tzinfo=timezone.utc)
+    duration = now - check_in.astimezone(TIMEZONE)
+    hours = int(duration.total_seconds() // 3600)
+    minutes = int((duration.total_seconds() % 3600) // 60)
+    
+    is_admin = await is_user_admin(user_id)
     await update.message.reply_text(
         f"👋 Вы отметились как ушедший!\n\n"
         f"🕐 Время ухода: {now.strftime('%H:%M')}\n"
@@ -223,14 +200,10 @@ async def handle_location_update(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     location = update.message.location
     
-    # Проверяем geo_consent
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT geo_consent FROM users WHERE user_id = %s', (user_id,))
-        result = cursor.fetchone()
-        
-        if not result or not result['geo_consent']:
-            return
+    # Проверяем geo_consent (профиль из кэша: обновления геолокации частые)
+    profile = await get_user_profile(user_id)
+    if not profile or not profile['geo_consent']:
+        return
     
     # Рассчитываем расстояние
     user_coords = (location.latitude, location.longitude)
@@ -238,20 +211,13 @@ async def handle_location_update(update: Update, context: ContextTypes.DEFAULT_T
     distance = geodesic(user_coords, campus_coords).meters
     is_near = distance <= 1000  # NEAR_CAMPUS_RADIUS
     
-    # Сохраняем геолокацию
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO geolocation (
-                user_id, latitude, longitude, distance_to_campus, is_near_campus
-            )
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (user_id, location.latitude, location.longitude, distance, is_near))
-        conn.commit()
+    # Сохраняем геолокацию (пакетная запись через буфер)
+    enqueue_geolocation(user_id, location.latitude, location.longitude, distance, is_near)
+    invalidate_views()
     
     status_text = f"🟡 Вы рядом с кампусом ({int(distance)}м)" if is_near else f"📍 Расстояние до кампуса: {int(distance)}м"
 
-    is_admin = is_user_admin(user_id)
+    is_admin = await is_user_admin(user_id)
     await update.message.reply_text(
         f"✅ Геолокация обновлена!\n{status_text}",
         reply_markup=get_main_keyboard(is_admin)
@@ -8,7 +8,9 @@ from datetime import datetime, time
 import logging
 
 from config import States, TIMEZONE, CONTEST_END_TIME
-from database.db_manager import get_db
+from database.async_db import get_db_async
+from features.broadcast import run_in_background
+from features.broadcast_queue import create_broadcast, enqueue_broadcast, deliver_broadcast
 from utils.keyboards import get_main_keyboard
 from utils.decorators import registered_only, admin_callback_only, admin_only
 
@@ -53,10 +55,10 @@ async def start_photo_contest(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Получаем дедлайн конкурса на сегодня (если задан)
     end_text = ""
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT end_time FROM photo_contest_schedule WHERE contest_date = CURRENT_DATE')
-        row = cursor.fetchone()
+        await cursor.execute('SELECT end_time FROM photo_contest_schedule WHERE contest_date = CURRENT_DATE')
+        row = await cursor.fetchone()
     if row and row.get('end_time'):
         from datetime import timezone as dt_tz
         end_ts = row['end_time']
@@ -64,12 +66,6 @@ async def start_photo_contest(update: Update, context: ContextTypes.DEFAULT_TYPE
             end_ts = end_ts.replace(tzinfo=dt_tz.utc)
         end_text = f"\n\n⏱ Приём фото до: {end_ts.astimezone(TIMEZONE).strftime('%d.%m.%Y %H:%M')}"
     
-    # Объявляем конкурс всем пользователям
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM users WHERE is_registered = TRUE')
-        users = cursor.fetchall()
-    
     contest_text = (
         "📸 **Конкурс \"Лучшее фото\"**\n\n"
         "🎯 Участвуйте: пришлите одно фото дня с описанием (подписью).\n\n"
@@ -82,7 +78,6 @@ async def start_photo_contest(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
     
     bot = context.bot
-    sent_count = 0
 
     from telegram import InlineKeyboardButton, InlineKeyboardMarkup
     join_kb = InlineKeyboardMarkup([
@@ -90,29 +85,41 @@ async def start_photo_contest(update: Update, context: ContextTypes.DEFAULT_TYPE
         [InlineKeyboardButton("❌ Не участвовать", callback_data='contest_decline')]
     ])
     
-    for user in users:
-        try:
-            await bot.send_message(
-                chat_id=user['user_id'],
-                text=contest_text,
-                reply_markup=join_kb
-            )
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Ошибка отправки уведомления о конкурсе: {e}")
-    
-    # Сообщение админу о результате
+    # Ход рассылки — в одном сообщении админу (редактируется)
+    status_message = None
     try:
         if query and getattr(query, 'message', None):
-            await query.message.reply_text(
-                f"✅ Конкурс запущен!\n📢 Уведомлено участников: {sent_count}"
-            )
+            status_message = await query.message.reply_text("📢 Рассылка приглашения...")
         elif getattr(update, 'message', None):
-            await update.message.reply_text(
-                f"✅ Конкурс запущен!\n📢 Уведомлено участников: {sent_count}"
-            )
+            status_message = await update.message.reply_text("📢 Рассылка приглашения...")
     except Exception:
         pass
+    
+    async def progress(result):
+        if status_message:
+            done = result['sent'] + result['failed'] + result['blocked']
+            await status_message.edit_text(f"📢 Рассылка приглашения: {done}/{result['total']}")
+    
+    # Объявляем конкурс всем пользователям
+    async def announce():
+        broadcast_id = await create_broadcast(
+            'contest_invite', contest_text, reply_markup=join_kb, created_by=update.effective_user.id
+        )
+        result = await deliver_broadcast(bot, broadcast_id, progress=progress)
+        # Сообщение админу о результате
+        if status_message and result:
+            try:
+                await status_message.edit_text(
+                    f"✅ Конкурс запущен!\n📢 Уведомлено участников: {result['sent']}"
+                    + (f"\n⚠️ Не доставлено: {result['failed'] + result['blocked']}"
+                       if result['failed'] + result['blocked'] else "")
+                )
+            except Exception:
+                pass
+    
+    # Рассылка фоном: handler и его транзакция не ждут тысяч отправок;
+    # прерванную рестартом доставку продолжит check_scheduled_posts
+    run_in_background(context.application, announce(), name='contest_announce')
 
 @registered_only
 async def upload_contest_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -129,25 +136,25 @@ async def upload_contest_photo(update: Update, context: ContextTypes.DEFAULT_TYP
     editing = context.user_data.get('contest_edit_photo')
     
     # Проверяем, не загружал ли уже
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id FROM photo_contest
             WHERE user_id = %s AND contest_date = CURRENT_DATE
         ''', (user_id,))
-        existing = cursor.fetchone()
+        existing = await cursor.fetchone()
 
         if editing:
             if not existing:
                 await update.message.reply_text("❌ У вас нет заявки сегодня. Нажмите «Участвовать».")
                 context.user_data.pop('contest_edit_photo', None)
                 return
-            cursor.execute('''
+            await cursor.execute('''
                 UPDATE photo_contest
                 SET photo_file_id = %s, description = %s, submission_time = CURRENT_TIMESTAMP
                 WHERE id = %s
             ''', (photo.file_id, caption, existing['id']))
-            conn.commit()
+            await conn.commit()
             context.user_data.pop('contest_edit_photo', None)
             
             await update.message.reply_text(
@@ -162,11 +169,11 @@ async def upload_contest_photo(update: Update, context: ContextTypes.DEFAULT_TYP
                 context.user_data.pop('contest_waiting_photo', None)
                 await send_participation_controls(update, context)
                 return
-            cursor.execute('''
+            await cursor.execute('''
                 INSERT INTO photo_contest (user_id, photo_file_id, description)
                 VALUES (%s, %s, %s)
             ''', (user_id, photo.file_id, caption))
-            conn.commit()
+            await conn.commit()
             context.user_data.pop('contest_waiting_photo', None)
             await update.message.reply_text("✅ Вы участвуете в конкурсе!")
             await send_participation_controls(update, context)
@@ -216,14 +223,14 @@ async def admin_contest_set_endtime_input(update: Update, context: ContextTypes.
         await update.message.reply_text("❌ Неверный формат. Примеры: 23:30, 09.11 23:30, 09.11.2025 23:30")
         return States.ADMIN_CONTEST_ENDTIME
     # Сохраняем/обновляем расписание в БД
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO photo_contest_schedule (contest_date, end_time, is_closed)
             VALUES (CURRENT_DATE, %s, FALSE)
             ON CONFLICT (contest_date) DO UPDATE SET end_time = EXCLUDED.end_time, is_closed = FALSE
         ''', (end_dt,))
-        conn.commit()
+        await conn.commit()
     # Планируем задачу
     if context.job_queue:
         await _schedule_contest_end(context, end_dt)
@@ -238,11 +245,11 @@ async def admin_contest_set_endtime_input(update: Update, context: ContextTypes.
 async def admin_contest_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM photo_contest_schedule WHERE contest_date = CURRENT_DATE')
-        cursor.execute('DELETE FROM photo_contest WHERE contest_date = CURRENT_DATE')
-        conn.commit()
+        await cursor.execute('DELETE FROM photo_contest_schedule WHERE contest_date = CURRENT_DATE')
+        await cursor.execute('DELETE FROM photo_contest WHERE contest_date = CURRENT_DATE')
+        await conn.commit()
     # Отмена job
     try:
         date_key = get_local_time().date().strftime('%Y%m%d')
@@ -260,9 +267,9 @@ async def view_contest_photos(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
 
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT 
                 pc.id,
                 pc.photo_file_id,
@@ -274,7 +281,7 @@ async def view_contest_photos(update: Update, context: ContextTypes.DEFAULT_TYPE
             WHERE pc.contest_date = CURRENT_DATE
             ORDER BY pc.votes DESC
         ''')
-        photos = cursor.fetchall()
+        photos = await cursor.fetchall()
 
     if not photos:
         await query.message.reply_text("📸 Пока нет фото на конкурсе.")
@@ -323,25 +330,25 @@ async def handle_contest_callback(update: Update, context: ContextTypes.DEFAULT_
     elif data == 'contest_decline':
         await query.message.reply_text("Хорошо, вы можете присоединиться позже, если передумаете.")
     elif data == 'contest_cancel':
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            await cursor.execute('''
                 DELETE FROM photo_contest
                 WHERE user_id = %s AND contest_date = CURRENT_DATE
             ''', (user_id,))
-            conn.commit()
+            await conn.commit()
         context.user_data.pop('contest_waiting_photo', None)
         context.user_data.pop('contest_edit_photo', None)
         await query.message.reply_text("❌ Вы отказались от участия сегодня.")
     elif data == 'contest_edit':
         # Проверим, что есть заявка
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            await cursor.execute('''
                 SELECT id FROM photo_contest
                 WHERE user_id = %s AND contest_date = CURRENT_DATE
             ''', (user_id,))
-            row = cursor.fetchone()
+            row = await cursor.fetchone()
         if not row:
             await query.message.reply_text("❌ У вас ещё нет фото сегодня. Нажмите «Участвовать».")
             return
@@ -352,7 +359,7 @@ async def handle_contest_callback(update: Update, context: ContextTypes.DEFAULT_
 
 
 async def end_photo_contest(context: ContextTypes.DEFAULT_TYPE):
-    """Завершение фотоконкурса по расписанию или вручную"""
+    """Завершение фотоконкурса по расписанию или вручную (итог рассылки или None)"""
     now = get_local_time()
     # Определим дату конкурса из job.data (если есть)
     target_date = now.date()
@@ -363,19 +370,19 @@ async def end_photo_contest(context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         pass
 
-    
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         # Проверка: не закрыт ли уже
-        cursor.execute('''
+        await cursor.execute('''
             SELECT is_closed FROM photo_contest_schedule WHERE contest_date = %s
         ''', (target_date,))
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if row and row.get('is_closed'):
             logger.info("Фотоконкурс уже закрыт для даты %s", target_date)
             return
             
         # Находим победителя
-        cursor.execute('''
+        await cursor.execute('''
             SELECT 
                 pc.id,
                 pc.photo_file_id,
@@ -390,36 +397,31 @@ async def end_photo_contest(context: ContextTypes.DEFAULT_TYPE):
             LIMIT 1
         ''', (target_date,))
         
-        winner = cursor.fetchone()
+        winner = await cursor.fetchone()
         
         if not winner:
             logger.info("Нет фото на конкурсе за дату %s", target_date)
-            cursor.execute('''
+            await cursor.execute('''
                 INSERT INTO photo_contest_schedule (contest_date, end_time, is_closed)
                 VALUES (%s, CURRENT_TIMESTAMP, TRUE)
                 ON CONFLICT (contest_date) DO UPDATE SET is_closed = TRUE
             ''', (target_date,))
-            conn.commit()
+            await conn.commit()
             return
         
         # Отмечаем победителя и закрываем конкурс
-        cursor.execute('''
+        await cursor.execute('''
             UPDATE photo_contest
             SET is_winner = TRUE
             WHERE id = %s
         ''', (winner['id'],))
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO photo_contest_schedule (contest_date, end_time, is_closed)
             VALUES (%s, CURRENT_TIMESTAMP, TRUE)
             ON CONFLICT (contest_date) DO UPDATE SET is_closed = TRUE
         ''', (target_date,))
-        conn.commit()
         
-        # Уведомляем всех участников
-        cursor.execute('SELECT user_id FROM users WHERE is_registered = TRUE')
-        users = cursor.fetchall()
-    
-    winner_text = f"""
+        winner_text = f"""
 🏆 **Конкурс "Лучшее фото" завершён!**
 
 Победитель: {winner['first_name']} {winner['last_name']}
@@ -427,20 +429,18 @@ async def end_photo_contest(context: ContextTypes.DEFAULT_TYPE):
 
 Поздравляем! 🎉
     """
+        
+        # Уведомляем всех участников: рассылка создаётся в одной транзакции
+        # с закрытием конкурса — итоги не потеряются при падении после COMMIT
+        broadcast_id = await enqueue_broadcast(
+            cursor, 'contest_result', winner_text, media_id=winner['photo_file_id']
+        )
+        await conn.commit()
     
-    bot = context.bot
-    
-    for user in users:
-        try:
-            await bot.send_photo(
-                chat_id=user['user_id'],
-                photo=winner['photo_file_id'],
-                caption=winner_text
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки результатов конкурса: {e}")
+    result = await deliver_broadcast(context.bot, broadcast_id)
     
     logger.info(f"Конкурс завершён. Победитель: {winner['first_name']} {winner['last_name']}")
+    return result
 
 
 async def vote_for_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -453,32 +453,32 @@ async def vote_for_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     photo_id = int(query.data.replace('vote_', ''))
     voter_id = query.from_user.id
     
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
         # Проверяем, не голосовал ли уже
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id FROM photo_votes
             WHERE photo_id = %s AND voter_id = %s
         ''', (photo_id, voter_id))
         
-        if cursor.fetchone():
+        if await cursor.fetchone():
             await query.answer("❌ Вы уже голосовали за это фото!", show_alert=True)
             return
         
         # Добавляем голос
-        cursor.execute('''
+        await cursor.execute('''
             INSERT INTO photo_votes (photo_id, voter_id)
             VALUES (%s, %s)
         ''', (photo_id, voter_id))
         
         # Увеличиваем счётчик
-        cursor.execute('''
+        await cursor.execute('''
             UPDATE photo_contest
             SET votes = votes + 1
             WHERE id = %s
         ''', (photo_id,))
         
-        conn.commit()
+        await conn.commit()
     
     await query.answer("✅ Ваш голос учтён!", show_alert=True)
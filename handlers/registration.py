@@ -9,8 +9,9 @@ import re
 import logging
 
 from config import States
-from database.models import is_user_registered, is_user_admin, complete_registration, create_user
+from database.async_models import is_user_registered, is_user_admin, complete_registration, create_user
 from utils.keyboards import get_main_keyboard
+from utils.view_cache import invalidate_views
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +23,13 @@ async def start_registration(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     # Гарантируем наличие строки пользователя до UPDATE в конце
     try:
-        create_user(user_id, user.username or "Без username", user.full_name)
+        await create_user(user_id, user.username or "Без username", user.full_name)
     except Exception:
         pass
 
     # Если уже зарегистрирован — не даём регистрироваться повторно
-    if is_user_registered(user_id):
-        is_admin = is_user_admin(user_id)
+    if await is_user_registered(user_id):
+        is_admin = await is_user_admin(user_id)
         await update.message.reply_text(
             "✅ Вы уже зарегистрированы. Используйте меню ниже.",
             reply_markup=get_main_keyboard(is_admin)
@@ -176,8 +177,10 @@ async def registration_phone(update: Update, context: ContextTypes.DEFAULT_TYPE)
     registration_data = context.user_data['registration']
     
     try:
-        complete_registration(user_id, registration_data)
-        
+        await complete_registration(user_id, registration_data)
+        # Новый участник появляется в списке «Все участники»
+        invalidate_views()
+
         # Формируем итоговое сообщение
         summary = f"""
 ✅ **Регистрация завершена успешно!**
@@ -194,8 +197,7 @@ async def registration_phone(update: Update, context: ContextTypes.DEFAULT_TYPE)
 📍 Для отметки в кампусе нажмите "Я в кампусе" и отправьте вашу геолокацию.
         """
 
-        from database.models import is_user_admin
-        is_admin = is_user_admin(user_id)
+        is_admin = await is_user_admin(user_id)
         await update.message.reply_text(
             summary,
             reply_markup=get_main_keyboard(is_admin)
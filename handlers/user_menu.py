@@ -8,11 +8,21 @@ from datetime import datetime, timezone, timedelta
 import logging
 
 from config import TIMEZONE
-from database.db_manager import get_db
-from database.models import get_user_profile, get_all_users_status, is_user_admin
+from database.async_db import get_db_async
+from database.dialect import latest_row_join
+from database.geo_buffer import apply_pending_geolocation
+from database.async_models import (
+    get_user_profile,
+    get_user_dashboard,
+    get_all_users_status,
+    is_user_admin,
+    delete_account,
+    toggle_geo_consent
+)
 from utils.keyboards import get_main_keyboard, get_settings_keyboard
 from utils.decorators import registered_only
 from utils.geo_utils import get_status_indicator
+from utils.view_cache import view_cache, invalidate_views, WHO_INSIDE, ALL_PARTICIPANTS
 
 logger = logging.getLogger(__name__)
 
@@ -28,32 +38,9 @@ async def show_my_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     today = get_local_time().date()
     
-    profile = get_user_profile(user_id)
-    
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Статус присутствия сегодня
-        cursor.execute('''
-            SELECT check_in_time, check_out_time, status
-            FROM presence
-            WHERE user_id = %s AND date = %s
-            ORDER BY check_in_time DESC LIMIT 1
-        ''', (user_id, today))
-        presence = cursor.fetchone()
-        
-        # Последняя геолокация
-        cursor.execute('''
-            SELECT distance_to_campus, is_near_campus, timestamp
-            FROM geolocation
-            WHERE user_id = %s
-            ORDER BY timestamp DESC LIMIT 1
-        ''', (user_id,))
-        geo = cursor.fetchone()
-        
-        # Получаем emoji ранга
-        cursor.execute('SELECT emoji FROM ranks WHERE name = %s', (profile['current_rank'],))
-        rank_emoji = cursor.fetchone()['emoji']
+    # Профиль, присутствие, геолокация и ранг — одним запросом
+    profile = await get_user_dashboard(user_id, today)
+    rank_emoji = profile['rank_emoji']
     
     text = f"""
 📊 **Ваш профиль**
@@ -66,9 +53,9 @@ async def show_my_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **Статус сегодня:**
 """
     
-    if presence:
-        if presence['status'] == 'in_campus':
-            check_in = presence['check_in_time']
+    if profile['presence_status']:
+        if profile['presence_status'] == 'in_campus':
+            check_in = profile['check_in_time']
             if check_in.tzinfo is None:
                 check_in = check_in.replace(tzinfo=timezone.utc)
             local_time = check_in.astimezone(TIMEZONE)
@@ -80,10 +67,10 @@ async def show_my_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     text += f"\n📍 Геолокация: {'✅ Включена' if profile['geo_consent'] else '❌ Отключена'}\n"
     
-    if geo and profile['geo_consent']:
-        distance = int(geo['distance_to_campus'])
-        is_near = geo['is_near_campus']
-        last_update = geo['timestamp']
+    if profile['geo_timestamp'] and profile['geo_consent']:
+        distance = int(profile['distance_to_campus'])
+        is_near = profile['is_near_campus']
+        last_update = profile['geo_timestamp']
         
         if last_update.tzinfo is None:
             last_update = last_update.replace(tzinfo=timezone.utc)
@@ -96,20 +83,28 @@ async def show_my_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         text += f"🕐 Обновлено: {local_update.strftime('%H:%M')}\n"
     
-    is_admin = is_user_admin(user_id)
-    await update.message.reply_text(text, reply_markup=get_main_keyboard(is_admin))
+    await update.message.reply_text(text, reply_markup=get_main_keyboard(profile['is_admin']))
 
 
 @registered_only
 async def show_who_inside(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список присутствующих в кампусе"""
     today = get_local_time().date()
+    text = await view_cache.get((WHO_INSIDE, today), lambda: _render_who_inside(today))
     
-    with get_db() as conn:
+    is_admin = await is_user_admin(update.effective_user.id)
+    await update.message.reply_text(text, reply_markup=get_main_keyboard(is_admin))
+
+
+async def _render_who_inside(today) -> str:
+    """Текст «Кто в кампусе» (общий для всех пользователей, кэшируется)"""
+    # С primary: отставание реплики закрепилось бы в кэше до следующей инвалидации
+    async with get_db_async() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
+        await cursor.execute(f'''
             SELECT 
+                u.user_id,
                 u.first_name,
                 u.last_name,
                 u.username,
@@ -120,24 +115,23 @@ async def show_who_inside(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 g.distance_to_campus
             FROM presence p
             JOIN users u ON p.user_id = u.user_id
-            LEFT JOIN (
-                SELECT DISTINCT ON (user_id) user_id, is_near_campus, distance_to_campus
-                FROM geolocation
-                ORDER BY user_id, timestamp DESC
-            ) g ON u.user_id = g.user_id
+            {latest_row_join(
+                'g', 'geolocation', 'is_near_campus, distance_to_campus',
+                where='user_id = u.user_id',
+                order_by='timestamp DESC'
+            )}
             WHERE p.date = %s AND p.status = 'in_campus'
             ORDER BY p.check_in_time
         ''', (today,))
         
-        people = cursor.fetchall()
+        people = await cursor.fetchall()
+    
+    apply_pending_geolocation(
+        people, is_near_campus='is_near_campus', distance_to_campus='distance_to_campus'
+    )
     
     if not people:
-        is_admin = is_user_admin(update.effective_user.id)
-        await update.message.reply_text(
-            "😔 Сейчас никого нет в кампусе.",
-            reply_markup=get_main_keyboard(is_admin)
-        )
-        return
+        return "😔 Сейчас никого нет в кампусе."
     
     text = f"👥 **В кампусе сейчас: {len(people)} чел.**\n\n"
     
@@ -162,22 +156,25 @@ async def show_who_inside(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text += f"{status_icon} {name}{team}{status_text}\n"
         text += f"   └ {username} • С {local_time.strftime('%H:%M')}\n\n"
     
-    is_admin = is_user_admin(update.effective_user.id)
-    await update.message.reply_text(text, reply_markup=get_main_keyboard(is_admin))
+    return text
 
 
 @registered_only
 async def show_all_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать всех участников с индикаторами статуса"""
-    users = get_all_users_status()
+    today = get_local_time().date()
+    text = await view_cache.get((ALL_PARTICIPANTS, today), _render_all_participants)
+    
+    is_admin = await is_user_admin(update.effective_user.id)
+    await update.message.reply_text(text, reply_markup=get_main_keyboard(is_admin))
+
+
+async def _render_all_participants() -> str:
+    """Текст «Все участники» (общий для всех пользователей, кэшируется)"""
+    users = await get_all_users_status(readonly=False)
     
     if not users:
-        is_admin = is_user_admin(update.effective_user.id)
-        await update.message.reply_text(
-            "📝 Пока нет зарегистрированных участников.",
-            reply_markup=get_main_keyboard(is_admin)
-        )
-        return
+        return "📝 Пока нет зарегистрированных участников."
     
     text = f"👤 **Все участники ({len(users)} чел.):**\n\n"
     
@@ -196,15 +193,14 @@ async def show_all_participants(update: Update, context: ContextTypes.DEFAULT_TY
         text += f"{emoji} {name}\n"
         text += f"   └ {team} • {username}\n\n"
     
-    is_admin = is_user_admin(update.effective_user.id)
-    await update.message.reply_text(text, reply_markup=get_main_keyboard(is_admin))
+    return text
 
 
 @registered_only
 async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать настройки"""
     user_id = update.effective_user.id
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
     
     text = f"""
 ⚙️ **Настройки**
@@ -236,19 +232,9 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
     user_id = query.from_user.id
     
     if query.data == 'toggle_geo':
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT geo_consent FROM users WHERE user_id = %s', (user_id,))
-            current = cursor.fetchone()['geo_consent']
-            new_value = not current
-            
-            cursor.execute(
-                'UPDATE users SET geo_consent = %s WHERE user_id = %s',
-                (new_value, user_id)
-            )
-            conn.commit()
-        
-        profile = get_user_profile(user_id)
+        # Переключение одним UPDATE ... RETURNING: профиль сразу обновляется и в кэше
+        profile = await toggle_geo_consent(user_id)
+        new_value = profile['geo_consent']
         
         text = f"""
 ⚙️ **Настройки**
@@ -275,7 +261,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         await query.message.reply_text(f"Геолокация {status}")
     
     elif query.data == 'edit_profile':
-        is_admin = is_user_admin(user_id)
+        is_admin = await is_user_admin(user_id)
         await query.message.reply_text(
             "✏️ **Редактирование профиля**\n\n"
             "Для изменения данных обратитесь к администратору.",
@@ -283,37 +269,11 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         )
     
     elif query.data == 'my_stats':
-        # Расширенная статистика
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Всего дней присутствия
-            cursor.execute('''
-                SELECT COUNT(DISTINCT date) as total_days
-                FROM presence
-                WHERE user_id = %s AND status = 'in_campus'
-            ''', (user_id,))
-            total_days = cursor.fetchone()['total_days']
-            
-            # Среднее время пребывания
-            cursor.execute('''
-                SELECT AVG(EXTRACT(EPOCH FROM (check_out_time - check_in_time))/3600) as avg_hours
-                FROM presence
-                WHERE user_id = %s AND check_out_time IS NOT NULL
-            ''', (user_id,))
-            avg_hours = cursor.fetchone()['avg_hours']
-            avg_hours = round(avg_hours, 1) if avg_hours else 0
-            
-            # След. ранг
-            profile = get_user_profile(user_id)
-            cursor.execute('''
-                SELECT name, min_checkins
-                FROM ranks
-                WHERE min_checkins > %s
-                ORDER BY min_checkins
-                LIMIT 1
-            ''', (profile['total_checkins'],))
-            next_rank = cursor.fetchone()
+        # Расширенная статистика (один запрос)
+        profile = await get_user_dashboard(user_id, get_local_time().date(), with_stats=True)
+        total_days = profile['total_days']
+        avg_hours = profile['avg_hours']
+        avg_hours = round(avg_hours, 1) if avg_hours else 0
         
         stats_text = f"""
 📊 **Расширенная статистика**
@@ -323,31 +283,17 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
 ⏱ Среднее время: {avg_hours} ч
         """
         
-        if next_rank:
-            needed = next_rank['min_checkins'] - profile['total_checkins']
-            stats_text += f"\n🎯 До ранга '{next_rank['name']}': {needed} отметок"
+        if profile['next_rank_name']:
+            needed = profile['next_rank_min_checkins'] - profile['total_checkins']
+            stats_text += f"\n🎯 До ранга '{profile['next_rank_name']}': {needed} отметок"
         else:
             stats_text += f"\n🏆 Вы достигли максимального ранга!"
         
-        is_admin = is_user_admin(user_id)
-        await query.message.reply_text(stats_text, reply_markup=get_main_keyboard(is_admin))
+        await query.message.reply_text(stats_text, reply_markup=get_main_keyboard(profile['is_admin']))
     
     elif query.data == 'delete_account':
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE users
-                SET is_registered = FALSE,
-                    geo_consent = FALSE,
-                    first_name = NULL,
-                    last_name = NULL,
-                    birth_date = NULL,
-                    team_role = NULL,
-                    phone_number = NULL,
-                    last_update = CURRENT_TIMESTAMP
-                WHERE user_id = %s
-            ''', (user_id,))
-            conn.commit()
+        await delete_account(user_id)
+        invalidate_views()
         await query.message.reply_text(
             "🗑 Аккаунт удалён. Чтобы зарегистрироваться снова — отправьте /start."
         )
@@ -357,17 +303,17 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
 @registered_only
 async def show_knowledge_base(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать базу знаний"""
-    with get_db() as conn:
+    async with get_db_async() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        await cursor.execute('''
             SELECT id, title, file_type
             FROM knowledge_base
             ORDER BY upload_time DESC
         ''')
-        files = cursor.fetchall()
+        files = await cursor.fetchall()
     
     if not files:
-        is_admin = is_user_admin(update.effective_user.id)
+        is_admin = await is_user_admin(update.effective_user.id)
         await update.message.reply_text(
             "📚 База знаний пока пуста.",
             reply_markup=get_main_keyboard(is_admin)
@@ -401,14 +347,14 @@ async def handle_knowledge_base_callback(update: Update, context: ContextTypes.D
         file_id_str = query.data.replace('kb_file_', '')
         file_id = int(file_id_str)
         
-        with get_db() as conn:
+        async with get_db_async() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            await cursor.execute('''
                 SELECT file_id, title, file_type
                 FROM knowledge_base
                 WHERE id = %s
             ''', (file_id,))
-            file = cursor.fetchone()
+            file = await cursor.fetchone()
         
         if file:
             await query.message.reply_document(
@@ -0,0 +1,128 @@
+# ============================================
+# FILE: tests/conftest.py
+# ============================================
+# Тесты работают только с одноразовой базой:
+#   python -m pytest -q
+#       — временный файл SQLite (удаляется в конце)
+#   TEST_DATABASE_URL=postgresql://localhost/campus_test python -m pytest -q
+#       — отдельная база PostgreSQL; в имени базы должно быть «test»
+#
+# DATABASE_URL окружения игнорируется: тесты вставляют и удаляют строки.
+# Тесты, которым нужен PostgreSQL (функции, EXPLAIN, LISTEN/NOTIFY),
+# на SQLite пропускаются (фикстура postgres).
+
+import os
+import shutil
+import tempfile
+
+import pytest
+from psycopg2.extensions import parse_dsn
+
+_tmp_dir = None
+
+
+def _test_database_url() -> str:
+    """DSN тестовой базы; рабочую базу тесты не трогают"""
+    global _tmp_dir
+    dsn = os.getenv('TEST_DATABASE_URL')
+    if not dsn:
+        _tmp_dir = tempfile.mkdtemp(prefix='campus-tests-')
+        return f"sqlite:///{os.path.join(_tmp_dir, 'campus.db')}"
+    if dsn.startswith('sqlite:'):
+        return dsn
+    try:
+        dbname = parse_dsn(dsn).get('dbname', '')
+    except Exception:
+        dbname = ''
+    if 'test' not in dbname.lower():
+        raise pytest.UsageError(
+            f"TEST_DATABASE_URL должен указывать на тестовую базу (имя с «test»), а не «{dbname}»"
+        )
+    return dsn
+
+
+def pytest_configure(config):
+    # До импорта config тестами: настройки читаются при импорте
+    os.environ['DATABASE_URL'] = _test_database_url()
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """Пул и схема тестовой базы на всю сессию"""
+    from database.db_manager import init_connection_pool, close_connection_pool
+    from database.async_db import close_async_pool
+    from database.models import init_database
+
+    init_connection_pool()
+    init_database()
+    yield
+    close_async_pool()
+    close_connection_pool()
+    if _tmp_dir:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def postgres():
+    """Тест проверяет поведение PostgreSQL — на SQLite пропускается"""
+    from config import DB_BACKEND
+    if DB_BACKEND != 'postgres':
+        pytest.skip('нужен PostgreSQL: TEST_DATABASE_URL=postgresql://.../campus_test')
+
+
+# Тестовые пользователи — в диапазоне, которого нет у Telegram
+TEST_USER_ID_BASE = 9_100_000_000_000
+_next_user_id = TEST_USER_ID_BASE
+
+
+def _delete_users(user_ids):
+    from database.db_manager import get_db
+    from database.leaderboard import invalidate_leaderboard_user
+    from database.models import invalidate_user_auth, profile_cache
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for table in ('geolocation', 'presence', 'users'):
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id BETWEEN %s AND %s',
+                (min(user_ids), max(user_ids))
+            )
+        conn.commit()
+    invalidate_user_auth(*user_ids)
+    profile_cache.invalidate(*user_ids)
+    for user_id in user_ids:
+        invalidate_leaderboard_user(user_id)
+
+
+@pytest.fixture
+def make_users():
+    """
+    Фабрика зарегистрированных пользователей с согласием на геолокацию
+
+    make_users(n) -> список user_id; строки удаляются после теста
+    """
+    from datetime import date
+    from database.models import create_user, complete_registration
+
+    created = []
+
+    def make(count: int = 1) -> list:
+        global _next_user_id
+        user_ids = list(range(_next_user_id + 1, _next_user_id + count + 1))
+        _next_user_id += count
+        for user_id in user_ids:
+            create_user(user_id, f'test_{user_id}', 'Test')
+            complete_registration(user_id, {
+                'first_name': 'Test',
+                'last_name': str(user_id),
+                'birth_date': date(2000, 1, 1),
+                'team_role': 'test',
+                'phone_number': '+70000000000',
+            })
+        created.extend(user_ids)
+        return user_ids
+
+    yield make
+    if created:
+        _delete_users(created)
@@ -0,0 +1,34 @@
+# ============================================
+# FILE: tests/invalidation_listener.py
+# ============================================
+# Второй процесс tests/test_invalidation.py (DATABASE_URL — тестовая база).
+#
+# На каждое сообщение user_auth перечитывает права пользователя (кэш
+# уже сброшен подпиской database.models) и отвечает probe_ack с
+# прочитанным is_admin. Завершается, когда закрыт stdin.
+
+import sys
+
+from database import invalidation
+from database.db_manager import init_connection_pool, close_connection_pool
+from database.invalidation import subscribe, init_invalidation_bus, close_invalidation_bus
+from database.models import get_user_auth
+
+
+def main():
+    def on_user_auth(*user_ids):
+        for user_id in user_ids:
+            invalidation.bus.publish('probe_ack', (user_id, get_user_auth(user_id)['is_admin']))
+
+    init_connection_pool()
+    subscribe('user_auth', on_user_auth)
+    init_invalidation_bus()
+    print('ready', flush=True)
+    sys.stdin.read()
+    close_invalidation_bus()
+    close_connection_pool()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# ============================================
+# FILE: tests/test_async_db.py
+# ============================================
+# Пропускная способность асинхронного слоя БД (database.async_db):
+# одновременные апдейты через пул потоков (run_sync) против старого
+# пути — синхронного get_db() прямо в корутине
+
+import asyncio
+import time
+
+from database.async_db import init_async_pool, run_sync
+from database.db_manager import get_db
+from database.dialect import is_sqlite
+
+UPDATES = 50
+QUERIES = 2
+LATENCY = 0.01  # задержка сервера на запрос, сек
+
+
+def _query(latency: float):
+    """Один запрос с задержкой сервера latency секунд (в SQLite — sleep в транзакции)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if is_sqlite():
+            cursor.execute('SELECT 1')
+            time.sleep(latency)
+        else:
+            cursor.execute('SELECT pg_sleep(%s)', (latency,))
+        cursor.fetchone()
+
+
+async def _measure(blocking: bool) -> dict:
+    """Апдейтов в секунду и наибольшая задержка event loop (тик раз в 10 мс)"""
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal lag
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - started - 0.01)
+
+    async def update():
+        for _ in range(QUERIES):
+            if blocking:
+                _query(LATENCY)
+            else:
+                await run_sync(_query, LATENCY)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(update() for _ in range(UPDATES)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    return {'rate': UPDATES / elapsed, 'max_lag_ms': lag * 1000}
+
+
+def test_thread_pool_outpaces_blocking_get_db():
+    init_async_pool()
+    old = asyncio.run(_measure(blocking=True))
+    new = asyncio.run(_measure(blocking=False))
+    print(
+        f"\nБлокирующий get_db(): {old['rate']:.0f} апдейтов/с, задержка loop {old['max_lag_ms']:.0f} мс; "
+        f"пул потоков: {new['rate']:.0f} апдейтов/с, задержка loop {new['max_lag_ms']:.0f} мс"
+    )
+    assert new['rate'] > 3 * old['rate']
+    assert new['max_lag_ms'] < old['max_lag_ms'] / 4
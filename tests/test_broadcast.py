@@ -0,0 +1,78 @@
+# ============================================
+# FILE: tests/test_broadcast.py
+# ============================================
+# Движок рассылок (features.broadcast) на фейковом боте: параллельная
+# отправка быстрее последовательного цикла, общий лимит сообщений в
+# секунду соблюдается, flood control Telegram переживается повторами
+
+import asyncio
+import random
+import time
+
+from telegram.error import Forbidden, RetryAfter
+
+from features.broadcast import Broadcaster
+
+LATENCY = 0.02  # ответ Telegram, сек
+
+
+class FakeBot:
+    """Бот без сети: задержка ответа и, с вероятностью flood, RetryAfter"""
+
+    def __init__(self, latency: float, flood: float = 0.0, blocked=()):
+        self.latency = latency
+        self.flood = flood
+        self.blocked = set(blocked)
+        self.sent_at = []  # (monotonic, chat_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        if chat_id in self.blocked:
+            raise Forbidden('bot was blocked by the user')
+        if self.flood and random.random() < self.flood:
+            raise RetryAfter(1)
+        self.sent_at.append((time.monotonic(), chat_id))
+
+
+def _max_per_second(times) -> int:
+    """Наибольшее число отправок в любом окне длиной 1 с"""
+    times = sorted(times)
+    best, start = 0, 0
+    for end, t in enumerate(times):
+        while t - times[start] >= 1.0:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def _send(bot):
+    return lambda chat_id: bot.send_message(chat_id=chat_id, text='test')
+
+
+def test_concurrent_and_rate_limited():
+    chat_ids = list(range(1, 301))
+    bot = FakeBot(LATENCY)
+    engine = Broadcaster(rate=200, concurrency=20)
+
+    result = asyncio.run(engine.run(chat_ids, _send(bot), name='тест'))
+    sequential = len(chat_ids) * LATENCY
+
+    assert result['sent'] == len(chat_ids)
+    assert result['elapsed'] < sequential / 2
+    # Token bucket ёмкостью 1: в любой секунде не больше rate (+1 на границе окна)
+    assert _max_per_second(t for t, _ in bot.sent_at) <= 201
+
+
+def test_flood_control_and_blocked_users():
+    random.seed(1)
+    chat_ids = list(range(1, 41))
+    bot = FakeBot(LATENCY, flood=0.05, blocked={7, 8})
+    engine = Broadcaster(rate=0, concurrency=10, max_retries=5)
+
+    result = asyncio.run(engine.run(chat_ids, _send(bot), name='тест'))
+
+    assert result['blocked'] == 2
+    assert result['sent'] == len(chat_ids) - 2
+    assert result['failed'] == 0
+    assert engine.flood_waits > 0
+    assert sorted(chat_id for _, chat_id in bot.sent_at) == [c for c in chat_ids if c not in (7, 8)]
@@ -0,0 +1,117 @@
+# ============================================
+# FILE: tests/test_checkin.py
+# ============================================
+# Атомарный check-in (database.models.check_in_user, миграции 0003–0005)
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config import TIMEZONE
+from database.async_db import init_async_pool, unit_of_work_async, run_sync
+from database.db_manager import get_db
+from database.models import check_in_user, invalidate_active_event
+
+# Параллельные check-in: пользователей и одновременных попыток на каждого
+CONCURRENT_USERS = 20
+CONCURRENT_ATTEMPTS = 20
+
+
+def _check_in(user_id, now):
+    return check_in_user(user_id, now, now.date(), 43.2221, 76.8513, 10.0, True)
+
+
+def test_check_in_with_local_time(make_users):
+    # handlers/checkin.py передаёт время с часовым поясом
+    user_id, = make_users(1)
+    now = datetime.now(TIMEZONE)
+
+    result = _check_in(user_id, now)
+    assert result['result'] == 'ok'
+    assert result['total_checkins'] == 1
+    assert result['current_rank']
+
+    again = _check_in(user_id, now)
+    assert again['result'] == 'already_checked_in'
+    assert again['total_checkins'] == 1
+
+
+def test_checkin_function_stores_time_like_column(postgres, make_users):
+    # campus_checkin(p_check_in_time TIMESTAMP) сохраняет то же, что
+    # присваивание timestamptz колонке TIMESTAMP в часовом поясе сессии
+    user_id, = make_users(1)
+    now = datetime.now(TIMEZONE)
+    assert _check_in(user_id, now)['result'] == 'ok'
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT %s::timestamp AS expected', (now,))
+        expected = cursor.fetchone()['expected']
+        cursor.execute('SELECT check_in_time FROM presence WHERE user_id = %s', (user_id,))
+        assert cursor.fetchone()['check_in_time'] == expected
+
+
+@pytest.fixture
+def active_event():
+    """Мероприятие, активное на время теста (окно ± сутки)"""
+    # Границы не зависят от часового пояса сессии
+    utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO events (name, start_time, end_time)
+            VALUES ('test-checkin', %s, %s)
+            RETURNING id
+        ''', (utc_now - timedelta(days=1), utc_now + timedelta(days=1)))
+        event_id = cursor.fetchone()['id']
+        conn.commit()
+    invalidate_active_event()
+    yield event_id
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE presence SET event_id = NULL WHERE event_id = %s', (event_id,))
+        cursor.execute('DELETE FROM events WHERE id = %s', (event_id,))
+        conn.commit()
+    invalidate_active_event()
+
+
+def test_parallel_check_ins_make_one_session(make_users, active_event):
+    # Дубли доставки Telegram и повторы: сотни одновременных check-in,
+    # каждый — отдельный апдейт со своей единицей работы
+    user_ids = make_users(CONCURRENT_USERS)
+    now = datetime.now(TIMEZONE)
+    init_async_pool()
+
+    async def attempt(user_id):
+        async with unit_of_work_async():
+            return await run_sync(_check_in, user_id, now)
+
+    async def burst():
+        calls = [user_id for user_id in user_ids for _ in range(CONCURRENT_ATTEMPTS)]
+        random.shuffle(calls)
+        return await asyncio.gather(*(attempt(user_id) for user_id in calls))
+
+    outcomes = [r['result'] for r in asyncio.run(burst())]
+    assert outcomes.count('ok') == CONCURRENT_USERS
+    assert outcomes.count('already_checked_in') == CONCURRENT_USERS * (CONCURRENT_ATTEMPTS - 1)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, event_id, COUNT(*) AS sessions
+            FROM presence
+            WHERE user_id BETWEEN %s AND %s AND date = %s
+            GROUP BY user_id, event_id
+        ''', (user_ids[0], user_ids[-1], now.date()))
+        sessions = cursor.fetchall()
+        cursor.execute(
+            'SELECT user_id, total_checkins FROM users WHERE user_id BETWEEN %s AND %s',
+            (user_ids[0], user_ids[-1])
+        )
+        totals = cursor.fetchall()
+
+    assert sorted(row['user_id'] for row in sessions) == user_ids
+    assert all(row['sessions'] == 1 and row['event_id'] == active_event for row in sessions)
+    assert all(row['total_checkins'] == 1 for row in totals)
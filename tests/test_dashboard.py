@@ -0,0 +1,154 @@
+# ============================================
+# FILE: tests/test_dashboard.py
+# ============================================
+# Экраны «Мой статус» и «Моя статистика» одним запросом
+# (database.models.get_user_dashboard) против прежних пяти запросов:
+# те же данные и меньшая задержка на нажатие
+
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database.db_manager import get_db
+from database.dialect import hours_between
+from database.models import USER_DASHBOARD_SQL, PROFILE_COLUMNS, get_user_dashboard
+
+HISTORY_DAYS = 120
+CALLS = 50
+RTT = 0.001  # сетевая задержка на запрос, которой у встроенной SQLite нет
+
+# Экраны до USER_DASHBOARD_SQL (handlers.user_menu): профиль, три запроса экрана
+# и проверка прав — пять обращений к БД на нажатие
+LEGACY_STATUS_SQL = [
+    f'SELECT {PROFILE_COLUMNS} FROM users WHERE user_id = %(user_id)s',
+    '''
+        SELECT check_in_time, check_out_time, status
+        FROM presence
+        WHERE user_id = %(user_id)s AND date = %(today)s
+        ORDER BY check_in_time DESC LIMIT 1
+    ''',
+    '''
+        SELECT distance_to_campus, is_near_campus, timestamp
+        FROM geolocation
+        WHERE user_id = %(user_id)s
+        ORDER BY timestamp DESC LIMIT 1
+    ''',
+    'SELECT emoji FROM ranks WHERE name = %(rank)s',
+    'SELECT is_registered, is_admin FROM users WHERE user_id = %(user_id)s',
+]
+LEGACY_STATS_SQL = [
+    f'SELECT {PROFILE_COLUMNS} FROM users WHERE user_id = %(user_id)s',
+    '''
+        SELECT COUNT(DISTINCT date) as total_days
+        FROM presence
+        WHERE user_id = %(user_id)s AND status = 'in_campus'
+    ''',
+    f'''
+        SELECT AVG({hours_between('check_in_time', 'check_out_time')}) as avg_hours
+        FROM presence
+        WHERE user_id = %(user_id)s AND check_out_time IS NOT NULL
+    ''',
+    '''
+        SELECT name, min_checkins
+        FROM ranks
+        WHERE min_checkins > %(total_checkins)s
+        ORDER BY min_checkins
+        LIMIT 1
+    ''',
+    'SELECT is_registered, is_admin FROM users WHERE user_id = %(user_id)s',
+]
+
+
+@pytest.fixture
+def user_with_history(make_users):
+    """Пользователь с историей присутствия за HISTORY_DAYS дней; сегодня — в кампусе"""
+    user_id, = make_users(1)
+    today = date.today()
+    start = datetime.combine(today, datetime.min.time())
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO presence (user_id, check_in_time, check_out_time, date, status)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', [
+            (user_id, start - timedelta(days=n, hours=-9),
+             None if n == 0 else start - timedelta(days=n, hours=-(9 + n % 8)),
+             today - timedelta(days=n), 'in_campus' if n == 0 else 'left')
+            for n in range(HISTORY_DAYS)
+        ])
+        cursor.executemany('''
+            INSERT INTO geolocation (user_id, latitude, longitude, distance_to_campus,
+                                     timestamp, is_near_campus)
+            VALUES (%s, 43.2, 76.8, %s, %s, %s)
+        ''', [
+            (user_id, n % 3000, start - timedelta(minutes=10 * n), n % 3000 <= 1000)
+            for n in range(HISTORY_DAYS * 10)
+        ])
+        cursor.execute('UPDATE users SET total_checkins = %s WHERE user_id = %s', (HISTORY_DAYS, user_id))
+        conn.commit()
+    return user_id
+
+
+def _legacy_params(user_id):
+    return {'user_id': user_id, 'today': date.today(), 'rank': 'Новичок',
+            'total_checkins': HISTORY_DAYS}
+
+
+def test_dashboard_matches_legacy_queries(user_with_history):
+    user_id = user_with_history
+    params = _legacy_params(user_id)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        legacy = []
+        for sql in LEGACY_STATUS_SQL[1:3] + LEGACY_STATS_SQL[1:3]:
+            cursor.execute(sql, params)
+            legacy.append(cursor.fetchone())
+    presence, geo, days, hours = legacy
+
+    dashboard = get_user_dashboard(user_id, date.today(), with_stats=True)
+
+    assert dashboard['presence_status'] == presence['status']
+    assert dashboard['check_in_time'] == presence['check_in_time']
+    assert dashboard['geo_timestamp'] == geo['timestamp']
+    assert dashboard['distance_to_campus'] == geo['distance_to_campus']
+    assert dashboard['total_days'] == days['total_days']
+    assert float(dashboard['avg_hours']) == pytest.approx(float(hours['avg_hours']))
+    assert dashboard['total_checkins'] == HISTORY_DAYS
+
+
+def _avg_ms(run) -> float:
+    run()  # прогрев: кэш страниц и (в PostgreSQL) планов
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        run()
+    return (time.perf_counter() - started) / CALLS * 1000
+
+
+@pytest.mark.parametrize('statements,with_stats', [
+    (LEGACY_STATUS_SQL, False),
+    (LEGACY_STATS_SQL, True),
+], ids=['status', 'stats'])
+def test_dashboard_is_faster_than_legacy(user_with_history, statements, with_stats):
+    # Оба варианта — на одном соединении: разница только в числе и
+    # стоимости запросов; каждый запрос — ещё и сетевой round trip (RTT)
+    params = _legacy_params(user_with_history)
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        def legacy():
+            for sql in statements:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                time.sleep(RTT)
+
+        def dashboard():
+            cursor.execute(USER_DASHBOARD_SQL, dict(params, with_stats=with_stats))
+            cursor.fetchall()
+            time.sleep(RTT)
+
+        legacy_ms = _avg_ms(legacy)
+        dashboard_ms = _avg_ms(dashboard)
+
+    print(f"\n{len(statements)} запросов — {legacy_ms:.2f} мс, один запрос — {dashboard_ms:.2f} мс")
+    assert dashboard_ms < legacy_ms
@@ -0,0 +1,47 @@
+# ============================================
+# FILE: tests/test_geo_buffer.py
+# ============================================
+# Наложение незаписанной геолокации (database.geo_buffer)
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import geo_buffer as geo_buffer_module
+from database.geo_buffer import GeolocationBuffer
+from database.models import get_all_users_status
+from utils.geo_utils import get_status_indicator
+
+
+@pytest.fixture
+def geo_buffer(monkeypatch):
+    # Буфер без фонового потока: сбрасываем вручную
+    buffer = GeolocationBuffer()
+    monkeypatch.setattr(geo_buffer_module, 'geo_buffer', buffer)
+    return buffer
+
+
+def _status(user_id):
+    for row in get_all_users_status():
+        if row['user_id'] == user_id:
+            return row
+    raise AssertionError(f'пользователь {user_id} не найден')
+
+
+def _indicator(row):
+    return get_status_indicator(None, row['is_near_campus'], row['last_geo_update'])
+
+
+@pytest.mark.parametrize('age_minutes, expected', [(5, '🟡'), (45, '🔴')])
+def test_overlay_matches_flushed_row(geo_buffer, make_users, age_minutes, expected):
+    user_id, = make_users(1)
+    sent = datetime.now(timezone.utc) - timedelta(minutes=age_minutes)
+    geo_buffer.add(user_id, 43.2221, 76.8513, 50.0, True, sent)
+
+    pending = _status(user_id)
+    assert geo_buffer.flush() == 1
+    flushed = _status(user_id)
+
+    # Одно и то же время в одном соглашении до и после сброса
+    assert pending['last_geo_update'] == flushed['last_geo_update']
+    assert _indicator(pending)[0] == _indicator(flushed)[0] == expected
@@ -0,0 +1,78 @@
+# ============================================
+# FILE: tests/test_invalidation.py
+# ============================================
+# Шина инвалидации между двумя процессами (database.invalidation):
+# изменение прав в одном процессе становится видно в другом.
+# Нужен PostgreSQL
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from database.db_manager import get_db
+from database.invalidation import subscribe, init_invalidation_bus, close_invalidation_bus
+from database.models import get_user_auth, invalidate_user_auth
+
+ROUNDS = 20
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _set_admin(user_id: int, is_admin: bool):
+    # Как админские CRUD handler'ы: запись, COMMIT, сброс кэша с публикацией
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET is_admin = %s WHERE user_id = %s', (is_admin, user_id))
+        conn.commit()
+    invalidate_user_auth(user_id)
+
+
+def test_change_becomes_visible_in_other_process(postgres, make_users):
+    user_id, = make_users(1)
+    acks = []
+    arrived = threading.Condition()
+
+    def on_ack(acked_user_id, is_admin):
+        with arrived:
+            acks.append((acked_user_id, is_admin, time.perf_counter()))
+            arrived.notify_all()
+
+    subscribe('probe_ack', on_ack)
+    init_invalidation_bus()
+    child = subprocess.Popen(
+        [sys.executable, '-m', 'tests.invalidation_listener'],
+        cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    samples = []
+    try:
+        assert child.stdout.readline().strip() == 'ready'
+        time.sleep(0.5)  # своя шина успевает подключиться и выполнить LISTEN
+
+        for n in range(ROUNDS):
+            is_admin = n % 2 == 0
+            with arrived:
+                acks.clear()
+            sent = time.perf_counter()
+            _set_admin(user_id, is_admin)
+            with arrived:
+                assert arrived.wait_for(lambda: acks, timeout=5), f'раунд {n}: нет ответа'
+                acked_user_id, seen, received = acks[0]
+            # Второй процесс прочитал уже новое значение
+            assert (acked_user_id, seen) == (user_id, is_admin)
+            # Половина round trip: публикация -> сброс и чтение там
+            samples.append((received - sent) * 1000 / 2)
+    finally:
+        child.stdin.close()
+        try:
+            child.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            child.kill()
+        close_invalidation_bus()
+
+    assert get_user_auth(user_id)['is_admin'] == ((ROUNDS - 1) % 2 == 0)
+    samples.sort()
+    print(
+        f"\nИзменение видно во втором процессе через p50 {samples[len(samples) // 2]:.2f} мс, "
+        f"max {samples[-1]:.2f} мс"
+    )
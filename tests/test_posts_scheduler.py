@@ -0,0 +1,90 @@
+# ============================================
+# FILE: tests/test_posts_scheduler.py
+# ============================================
+# Job автопостов (features.posts_scheduler.check_scheduled_posts):
+# ставит наступившие посты в очередь и не ждёт их доставки
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from config import TIMEZONE
+from database.async_db import init_async_pool
+from database.db_manager import get_db
+from features.posts_scheduler import check_scheduled_posts, create_post
+
+LATENCY = 0.3  # ответ Telegram, сек
+
+
+class SlowBot:
+    """Бот без сети с медленным ответом"""
+
+    def __init__(self):
+        self.sent = []  # (chat_id, text)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.sent.append((chat_id, text))
+
+
+class FakeApplication:
+    """Application для run_in_background: create_task и bot"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.tasks = []
+
+    def create_task(self, coroutine, name=None):
+        task = asyncio.get_running_loop().create_task(coroutine, name=name)
+        self.tasks.append(task)
+        return task
+
+
+@pytest.fixture
+def due_post(make_users):
+    """Пост, время которого уже наступило; рассылка и пост удаляются после теста"""
+    user_id, = make_users(1)
+    init_async_pool()
+    post_id = asyncio.run(create_post(
+        user_id, 'Тестовый пост', None, datetime.now(TIMEZONE) - timedelta(minutes=1)
+    ))
+    yield user_id, post_id
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM broadcasts WHERE post_id = %s', (post_id,))
+        for row in cursor.fetchall():
+            cursor.execute('DELETE FROM broadcast_deliveries WHERE broadcast_id = %s', (row['id'],))
+            cursor.execute('DELETE FROM broadcasts WHERE id = %s', (row['id'],))
+        cursor.execute('DELETE FROM posts WHERE id = %s', (post_id,))
+        conn.commit()
+
+
+def test_job_returns_before_delivery_finishes(due_post):
+    user_id, post_id = due_post
+    bot = SlowBot()
+    application = FakeApplication(bot)
+    context = SimpleNamespace(bot=bot, application=application)
+
+    async def scenario():
+        started = time.perf_counter()
+        await check_scheduled_posts(context)
+        job_seconds = time.perf_counter() - started
+        sent_during_job = list(bot.sent)
+        await asyncio.gather(*application.tasks)
+        return job_seconds, sent_during_job
+
+    job_seconds, sent_during_job = asyncio.run(scenario())
+
+    # Job только поставил рассылку в очередь и запустил доставку фоном
+    assert job_seconds < LATENCY
+    assert sent_during_job == []
+    assert len(application.tasks) == 1
+    # Доставка завершилась в фоне
+    assert bot.sent == [(user_id, 'Тестовый пост')]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT status FROM posts WHERE id = %s', (post_id,))
+        assert cursor.fetchone()['status'] == 'sent'
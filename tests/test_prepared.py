@@ -0,0 +1,65 @@
+# ============================================
+# FILE: tests/test_prepared.py
+# ============================================
+# Prepared statements горячих запросов (database.prepared): результат
+# совпадает с обычным запросом, PREPARE — один раз на соединение,
+# планирование не повторяется. Нужен PostgreSQL
+
+import time
+from datetime import date
+
+import pytest
+
+from database.db_manager import get_db
+from database.models import USER_AUTH, OPEN_PRESENCE
+from database.prepared import execute_prepared, get_prepared_stats
+
+STATEMENTS = [USER_AUTH, OPEN_PRESENCE]
+CALLS = 500
+
+
+def _params(statement, user_id):
+    samples = {'BIGINT': user_id, 'DATE': date.today()}
+    return tuple(samples[t] for t in statement.types)
+
+
+def _planning_ms(cursor, sql, params) -> float:
+    cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+    return cursor.fetchone()['QUERY PLAN'][0]['Planning Time']
+
+
+def _avg_call_us(cursor, sql, params) -> float:
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        cursor.execute(sql, params)
+        cursor.fetchall()
+    return (time.perf_counter() - started) / CALLS * 1_000_000
+
+
+@pytest.mark.parametrize('statement', STATEMENTS, ids=lambda s: s.name)
+def test_prepared_matches_plain_and_skips_planning(postgres, make_users, statement):
+    user_id, = make_users(1)
+    params = _params(statement, user_id)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(statement.sql, params)
+        plain = cursor.fetchall()
+
+        prepares = get_prepared_stats()['prepares']
+        for _ in range(10):  # после 5 вызовов PostgreSQL берёт общий план
+            execute_prepared(cursor, statement, params)
+            assert cursor.fetchall() == plain
+        assert get_prepared_stats()['prepares'] - prepares <= 1
+
+        plain_ms = _planning_ms(cursor, statement.sql, params)
+        prepared_ms = _planning_ms(cursor, statement.execute_sql, params)
+        plain_us = _avg_call_us(cursor, statement.sql, params)
+        prepared_us = _avg_call_us(cursor, statement.execute_sql, params)
+        conn.rollback()
+
+    print(
+        f"\n{statement.name}: планирование {plain_ms:.3f} → {prepared_ms:.3f} мс, "
+        f"вызов {plain_us:.0f} → {prepared_us:.0f} мкс"
+    )
+    assert prepared_ms < plain_ms
@@ -0,0 +1,23 @@
+# ============================================
+# FILE: tests/test_query_plans.py
+# ============================================
+# Планы горячих запросов на синтетическом наборе данных
+# (database.plan_check): ни одного Seq Scan по большим таблицам.
+# Нужен PostgreSQL; данные засеваются в транзакции и откатываются
+
+import pytest
+
+from database.plan_check import HOT_QUERIES, check_query_plans
+
+
+@pytest.fixture(scope='module')
+def plans():
+    from config import DB_BACKEND
+    if DB_BACKEND != 'postgres':
+        pytest.skip('нужен PostgreSQL: TEST_DATABASE_URL=postgresql://.../campus_test')
+    return {r['name']: r for r in check_query_plans(seed=True)}
+
+
+@pytest.mark.parametrize('name', [query['name'] for query in HOT_QUERIES])
+def test_hot_query_uses_index(plans, name):
+    assert plans[name]['seq_scans'] == [], plans[name]['source']
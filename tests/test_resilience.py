@@ -0,0 +1,75 @@
+# ============================================
+# FILE: tests/test_resilience.py
+# ============================================
+# Circuit breaker (database.resilience.CircuitBreaker): размыкается на
+# ошибках соединения, замыкается только по ответу БД
+
+import time
+
+import psycopg2
+import pytest
+
+from database.pool import PoolTimeout
+from database.resilience import CircuitBreaker, DatabaseUnavailable
+
+
+class UniqueViolation(psycopg2.errors.UniqueViolation):
+    """Ошибка, пришедшая от сервера (pgcode задаёт libpq)"""
+    pgcode = '23505'
+
+
+def _connection_error():
+    return psycopg2.OperationalError('server closed the connection unexpectedly')
+
+
+@pytest.fixture
+def breaker():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(_connection_error())
+    assert breaker.state == 'open'
+    return breaker
+
+
+def _half_open(breaker):
+    time.sleep(0.06)
+    breaker.before_call()  # пробный запрос
+    assert breaker.state == 'half_open'
+
+
+def test_open_breaker_rejects_calls(breaker):
+    with pytest.raises(DatabaseUnavailable):
+        breaker.before_call()
+
+
+@pytest.mark.parametrize('error', [
+    ValueError('ошибка handler\'а'),
+    PoolTimeout('нет свободного соединения'),
+    psycopg2.IntegrityError('без pgcode: не от сервера'),
+], ids=['handler', 'pool_timeout', 'no_pgcode'])
+def test_error_without_db_response_keeps_state(breaker, error):
+    breaker.record_failure(error)
+    assert breaker.state == 'open'
+    assert breaker.stats()['consecutive_failures'] == 2
+
+    _half_open(breaker)
+    breaker.record_failure(error)
+    assert breaker.state == 'half_open'
+    # Проба освобождена: следующий запрос снова пропускается пробным
+    breaker.before_call()
+
+
+def test_server_error_closes_half_open(breaker):
+    _half_open(breaker)
+    breaker.record_failure(UniqueViolation('duplicate key'))
+    assert breaker.state == 'closed'
+    assert breaker.stats()['consecutive_failures'] == 0
+
+
+def test_failed_probe_reopens(breaker):
+    _half_open(breaker)
+    breaker.record_failure(_connection_error())
+    assert breaker.state == 'open'
+    with pytest.raises(DatabaseUnavailable):
+        breaker.before_call()
@@ -0,0 +1,92 @@
+# ============================================
+# FILE: tests/test_round_trips.py
+# ============================================
+# Обращения к БД на апдейт: один checkout и один COMMIT единицы работы,
+# ответ пользователю — только после COMMIT (bot.CampusBot)
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+from bot import CampusBot
+from config import CAMPUS_LATITUDE, CAMPUS_LONGITUDE
+from database.async_db import init_async_pool, unit_of_work_async
+from database.unit_of_work import current_unit_of_work
+from handlers.checkin import handle_checkin_location, checkout
+from handlers.user_menu import show_my_status
+
+# handler -> (checkout'ов, COMMIT'ов) на апдейт
+ROUND_TRIP_BUDGET = {
+    'status': (1, 1),
+    'checkin': (1, 1),
+    'checkin_again': (1, 1),
+    'checkout': (1, 1),
+}
+
+
+class FakeTelegram(BaseRequest):
+    """Telegram без сети: запоминает, была ли транзакция апдейта открыта при запросе"""
+
+    def __init__(self):
+        self.replies = []  # (метод API, транзакция открыта)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        uow = current_unit_of_work.get()
+        self.replies.append((endpoint, uow is not None and uow.conn is not None))
+        result = {
+            'message_id': len(self.replies), 'date': 0,
+            'chat': {'id': 1, 'type': 'private'}, 'text': '',
+        }
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def _scenarios(user_id):
+    message = {
+        'message_id': 1, 'date': 0,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Test'},
+    }
+    location = dict(message, location={'latitude': CAMPUS_LATITUDE, 'longitude': CAMPUS_LONGITUDE})
+    return [
+        ('status', show_my_status, dict(message, text='📊 Мой статус'), {}),
+        ('checkin', handle_checkin_location, location, {'awaiting_checkin_location': True}),
+        ('checkin_again', handle_checkin_location, location, {'awaiting_checkin_location': True}),
+        ('checkout', checkout, dict(message, text='🚪 Отметить уход'), {}),
+    ]
+
+
+def test_one_checkout_and_commit_per_update(make_users):
+    user_id, = make_users(1)
+    telegram = FakeTelegram()
+    bot = CampusBot('1:fake', request=telegram, get_updates_request=telegram)
+    init_async_pool()
+
+    async def run():
+        results = {}
+        for name, handler, data, user_data in _scenarios(user_id):
+            update = Update.de_json({'update_id': 1, 'message': data}, bot)
+            context = SimpleNamespace(bot=bot, user_data=user_data)
+            telegram.replies = []
+            async with unit_of_work_async() as uow:
+                await handler(update, context)
+            results[name] = dict(uow.stats(), replies=list(telegram.replies))
+        return results
+
+    results = asyncio.run(run())
+
+    for name, (max_checkouts, max_commits) in ROUND_TRIP_BUDGET.items():
+        r = results[name]
+        assert r['checkouts'] <= max_checkouts, name
+        assert r['commits'] <= max_commits, name
+        assert r['replies'], name
+        assert not [endpoint for endpoint, in_transaction in r['replies'] if in_transaction], name
@@ -0,0 +1,51 @@
+# ============================================
+# FILE: tests/test_update_order.py
+# ============================================
+# Порядок обработки апдейтов (bot.PerChatUpdateProcessor)
+
+import asyncio
+
+from telegram import Update
+
+from bot import PerChatUpdateProcessor
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': 'x',
+        },
+    }, None)
+
+
+def test_same_chat_in_order_other_chats_in_parallel():
+    log = []
+
+    async def handle(tag: str, delay: float):
+        log.append(('start', tag))
+        await asyncio.sleep(delay)
+        log.append(('end', tag))
+
+    async def scenario():
+        processor = PerChatUpdateProcessor(16)
+        await asyncio.gather(
+            processor.process_update(_update(1, 10), handle('a1', 0.05)),
+            processor.process_update(_update(2, 10), handle('a2', 0)),
+            processor.process_update(_update(3, 10), handle('a3', 0)),
+            processor.process_update(_update(4, 20), handle('b1', 0)),
+        )
+        return processor
+
+    processor = asyncio.run(scenario())
+
+    # Чат 10 — по одному и по порядку
+    assert log.index(('end', 'a1')) < log.index(('start', 'a2'))
+    assert log.index(('end', 'a2')) < log.index(('start', 'a3'))
+    # Чат 20 не ждёт медленный апдейт чата 10
+    assert log.index(('end', 'b1')) < log.index(('end', 'a1'))
+    assert not processor._chats
@@ -0,0 +1,76 @@
+# ============================================
+# FILE: tests/test_view_cache.py
+# ============================================
+# Кэш экранов (utils.view_cache): single-flight и отсутствие
+# взаимоблокировки ожидающих со слотами checkout'а
+
+import asyncio
+
+from database import async_db
+from database.async_db import unit_of_work_async, run_sync
+from utils.view_cache import ViewCache
+
+
+def test_concurrent_misses_share_one_rebuild():
+    cache = ViewCache(60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return 'text'
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get('k', build) for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ['text'] * 10
+    assert len(builds) == 1
+    assert cache.stats()['coalesced'] == 9
+
+    cache.invalidate()
+    assert asyncio.run(cache.get('k', build)) == 'text'
+    assert len(builds) == 2
+
+
+def test_waiters_holding_slots_do_not_deadlock(monkeypatch):
+    # Два ожидающих держат оба слота checkout'а, пересборке нужен третий:
+    # ожидающие должны построить экран сами
+    monkeypatch.setattr(async_db, 'max_db_workers', 2)
+    monkeypatch.setattr(async_db, '_checkout_slots', None)
+    cache = ViewCache(60)
+
+    async def scenario():
+        slots_taken = asyncio.Event()
+
+        async def build():
+            await slots_taken.wait()
+            return await run_sync(lambda: 'text')  # нужен слот checkout'а
+
+        async def builder():
+            async with unit_of_work_async():
+                return await cache.get('k', build)
+
+        async def waiter(ready):
+            async with unit_of_work_async():
+                await run_sync(lambda: None)  # единица работы держит слот
+                ready.set()
+                await asyncio.sleep(0.05)  # builder уже в _inflight
+                return await cache.get('k', build)
+
+        ready = [asyncio.Event(), asyncio.Event()]
+        tasks = [asyncio.create_task(builder())]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(waiter(event)) for event in ready]
+        for event in ready:
+            await event.wait()
+        slots_taken.set()
+
+        done, pending = await asyncio.wait(tasks, timeout=10)
+        for task in pending:
+            task.cancel()
+        return [task.result() for task in done], pending
+
+    results, pending = asyncio.run(scenario())
+    assert not pending
+    assert results == ['text'] * 3
+    assert cache.wait_fallbacks == 2
@@ -7,7 +7,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 import logging
 
-from database.models import is_user_registered, is_user_admin
+from database.async_models import is_user_registered, is_user_admin
+from database.workloads import workload_class, ADMIN
 from utils.keyboards import get_main_keyboard
 
 logger = logging.getLogger(__name__)
@@ -19,7 +20,7 @@ def registered_only(func):
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         
-        if not is_user_registered(user_id):
+        if not await is_user_registered(user_id):
             await update.message.reply_text(
                 "❌ Для использования этой функции необходимо пройти регистрацию.\n\n"
                 "Отправьте /start для начала регистрации."
@@ -32,13 +33,14 @@ def registered_only(func):
 
 
 def admin_only(func):
-    """Декоратор: доступ только для администраторов"""
+    """Декоратор: доступ только для администраторов (запросы — в классе нагрузки admin)"""
     @wraps(func)
+    @workload_class(ADMIN)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         
         # Проверяем регистрацию
-        if not is_user_registered(user_id):
+        if not await is_user_registered(user_id):
             await update.message.reply_text(
                 "❌ Для использования этой функции необходимо пройти регистрацию.\n\n"
                 "Отправьте /start для начала регистрации."
@@ -46,7 +48,7 @@ def admin_only(func):
             return
         
         # Проверяем права администратора
-        if not is_user_admin(user_id):
+        if not await is_user_admin(user_id):
             await update.message.reply_text(
                 "❌ У вас нет прав администратора.",
                 reply_markup=get_main_keyboard()
@@ -59,13 +61,14 @@ def admin_only(func):
 
 
 def admin_callback_only(func):
-    """Декоратор для callback-запросов: доступ только для администраторов"""
+    """Декоратор для callback-запросов: доступ только для администраторов (класс нагрузки admin)"""
     @wraps(func)
+    @workload_class(ADMIN)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         query = update.callback_query
         user_id = query.from_user.id
         
-        if not is_user_admin(user_id):
+        if not await is_user_admin(user_id):
             await query.answer("❌ У вас нет прав администратора.", show_alert=True)
             return
         
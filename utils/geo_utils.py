@@ -4,7 +4,7 @@
 # ============================================
 
 from geopy.distance import geodesic
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import TIMEZONE, NEAR_CAMPUS_RADIUS
 
 
@@ -31,8 +31,9 @@ def get_status_indicator(presence_status, is_near_campus, last_geo_update):
         if isinstance(last_geo_update, str):
             last_geo_update = datetime.fromisoformat(last_geo_update)
         
+        # TIMESTAMP из БД — naive UTC (как в show_my_status)
         if last_geo_update.tzinfo is None:
-            last_geo_update = last_geo_update.replace(tzinfo=TIMEZONE)
+            last_geo_update = last_geo_update.replace(tzinfo=timezone.utc)
         
         time_diff = datetime.now(TIMEZONE) - last_geo_update
         if time_diff < timedelta(minutes=30):
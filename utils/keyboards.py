@@ -64,3 +64,13 @@ def get_export_keyboard():
         [InlineKeyboardButton("◀️ Назад", callback_data='admin_panel')]
     ]
     return InlineKeyboardMarkup(keyboard)
+
+
+def get_leaderboard_keyboard(page, pages):
+    """Листание таблицы лидеров (None — страница одна)"""
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f'leaderboard_page_{page - 1}'))
+    if page + 1 < pages:
+        buttons.append(InlineKeyboardButton("Далее ▶️", callback_data=f'leaderboard_page_{page + 1}'))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
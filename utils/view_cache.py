@@ -0,0 +1,144 @@
+# ============================================
+# FILE: utils/view_cache.py
+# ============================================
+# Кэш готового текста общих экранов («Кто в кампусе», «Все участники»).
+#
+# Текст одинаков для всех пользователей, поэтому строится один раз на
+# (экран, день) и сбрасывается событиями, которые его меняют: check-in,
+# check-out, обновление геолокации, изменение профиля. VIEW_CACHE_TTL
+# ограничивает устаревание признаков, зависящих от времени (🟡 «Рядом»
+# гаснет через 30 минут без обновления геолокации).
+#
+# Одновременные промахи по одному ключу ждут одну пересборку (single-flight).
+# Ожидающий со слотом БД не ждёт бесконечно: слоты могут оказаться
+# только у ожидающих, и пересборке не достанется ни одного (см. _wait).
+
+import asyncio
+import time
+import logging
+
+from config import VIEW_CACHE_TTL, VIEW_CACHE_WAIT_TIMEOUT
+from database.async_db import holds_checkout_slot, checkout_slots_exhausted
+from database.cache import TTLCache, invalidate_on_finish
+from database.invalidation import subscribe
+
+logger = logging.getLogger(__name__)
+
+WHO_INSIDE = 'who_inside'
+ALL_PARTICIPANTS = 'all_participants'
+
+
+class ViewCache:
+    """Кэш отрендеренных экранов с single-flight пересборкой"""
+
+    def __init__(self, ttl: float, max_size: int = 64):
+        self.cache = TTLCache(max_size, ttl)
+        self._inflight = {}  # key -> (epoch, Future); только из event loop
+
+        self.rebuilds = 0
+        self.coalesced = 0
+        self.wait_fallbacks = 0  # ожидающие, построившие экран сами (см. _wait)
+        self.rebuild_total_ms = 0.0
+        self.rebuild_max_ms = 0.0
+        self.rebuild_last_ms = 0.0
+
+    async def get(self, key, build):
+        """Текст экрана из кэша или результат await build()"""
+        text = self.cache.get(key)
+        if text is not None:
+            return text
+
+        epoch = self.cache.epoch()
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == epoch:
+            # Пересборка уже идёт и после её начала инвалидаций не было
+            text = await self._wait(inflight[1])
+            if text is not None:
+                return text
+            # Не дождались — строим сами на своём слоте (без регистрации в _inflight)
+            return await self._build(key, build, epoch)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = self._inflight[key] = (epoch, future)
+        try:
+            text = await self._build(key, build, epoch)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ожидающих может не быть — без предупреждения asyncio
+            raise
+        finally:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+
+        future.set_result(text)
+        return text
+
+    async def _wait(self, future):
+        """
+        Результат чужой пересборки (None — строить самому)
+
+        Ожидающий, который держит слот checkout'а своей единицы работы,
+        мог занять слот, нужный пересборке: когда слоты держат только
+        ожидающие, никто не продвинется. Поэтому при исчерпанных слотах
+        он строит сам сразу, иначе ждёт не дольше VIEW_CACHE_WAIT_TIMEOUT
+        """
+        if not holds_checkout_slot():
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        if checkout_slots_exhausted():
+            self.wait_fallbacks += 1
+            return None
+        try:
+            text = await asyncio.wait_for(asyncio.shield(future), VIEW_CACHE_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.wait_fallbacks += 1
+            return None
+        self.coalesced += 1
+        return text
+
+    async def _build(self, key, build, epoch):
+        started = time.perf_counter()
+        text = await build()
+        self._record_rebuild((time.perf_counter() - started) * 1000)
+        self.cache.set(key, text, epoch)
+        return text
+
+    def _record_rebuild(self, elapsed_ms: float):
+        self.rebuilds += 1
+        self.rebuild_total_ms += elapsed_ms
+        self.rebuild_last_ms = elapsed_ms
+        self.rebuild_max_ms = max(self.rebuild_max_ms, elapsed_ms)
+
+    def invalidate(self):
+        """Сбросить все экраны (и ещё раз после COMMIT текущей единицы работы)"""
+        invalidate_on_finish(self.cache, kind='views')
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats.update({
+            'rebuilds': self.rebuilds,
+            'coalesced': self.coalesced,
+            'wait_fallbacks': self.wait_fallbacks,
+            'inflight': len(self._inflight),
+            'rebuild_avg_ms': round(self.rebuild_total_ms / self.rebuilds, 2) if self.rebuilds else 0.0,
+            'rebuild_max_ms': round(self.rebuild_max_ms, 2),
+            'rebuild_last_ms': round(self.rebuild_last_ms, 2),
+        })
+        return stats
+
+
+view_cache = ViewCache(VIEW_CACHE_TTL)
+subscribe('views', view_cache.cache.invalidate)
+
+
+def invalidate_views():
+    """Присутствие, геолокация или профиль изменились — пересобрать экраны"""
+    view_cache.invalidate()
+
+
+def get_view_cache_stats() -> dict:
+    """Попадания/промахи и стоимость пересборки экранов"""
+    return view_cache.stats()